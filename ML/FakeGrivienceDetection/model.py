@@ -1,51 +1,109 @@
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from transformers import pipeline
 import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+import os
 import re
+import time
+import tracemalloc
+from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
-from nltk.tokenize import word_tokenize
-import nltk
-
-# Download correct NLTK resources
-try:
-    print("Downloading required NLTK resources...")
-    nltk.download('punkt')
-    nltk.download('averaged_perceptron_tagger')  # Use this instead of averaged_perceptron_tagger_eng
-    nltk.download('universal_tagset')
-    print("NLTK resources downloaded successfully.")
-except Exception as e:
-    print(f"Error downloading NLTK resources: {str(e)}")
-    print("Please run python and execute:")
-    print("import nltk")
-    print("nltk.download('punkt')")
-    print("nltk.download('averaged_perceptron_tagger')")
-    print("nltk.download('universal_tagset')")
+
+# Local NLTK data cache; nothing is downloaded on import (run: python model.py --setup-nltk)
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',  # Use this instead of averaged_perceptron_tagger_eng
+    'universal_tagset': 'taggers/universal_tagset',
+}
+
+# Handcrafted feature columns, in matrix order
+FEATURE_NAMES = ['length', 'word_count', 'avg_word_length', 'noun_count', 'verb_count', 'special_chars', 'numbers']
+
+# Light tagger: regex tokens and suffix rules, no model to load; only NN*/VB* matter here
+LIGHT_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+LIGHT_TAGGER_PATTERNS = [
+    (r'^\d+([.,]\d+)?$', 'CD'),
+    (r'(?i)^(the|a|an|this|that|these|those|my|our|your|his|her|their|its)$', 'DT'),
+    (r'(?i)^(i|we|you|he|she|it|they|me|us|him|them)$', 'PRP'),
+    (r'(?i)^(of|in|on|at|to|for|with|by|from|about|into|over|under|since|near|and|or|but|not|no)$', 'IN'),
+    (r'(?i)^(is|are|was|were|be|been|being|am|has|have|had|do|does|did|can|could|will|would|should|must|may)$', 'VB'),
+    (r'(?i).*(ing|ed|ize|ise|ify)$', 'VB'),
+    (r'(?i).*(ly)$', 'RB'),
+    (r'(?i).*(ous|ful|ive|able|ible|less|ical)$', 'JJ'),
+    (r'^\w+$', 'NN'),
+    (r'.*', 'SYM'),
+]
+
+@lru_cache(maxsize=None)
+def _light_tagger():
+    import nltk
+    return nltk.RegexpTagger(LIGHT_TAGGER_PATTERNS)
+
+@lru_cache(maxsize=None)
+def nltk_available():
+    """Check once whether the tokenizer and tagger are in the local cache"""
+    try:
+        import nltk
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        for path in NLTK_RESOURCES.values():
+            nltk.data.find(path)
+        return True
+    except (ImportError, LookupError) as e:
+        print(f"NLTK resources not available ({type(e).__name__}). Simplified features will be used.")
+        print("Download them once using: python model.py --setup-nltk")
+        return False
+
+def download_nltk_resources():
+    """Download required NLTK resources into the local cache"""
+    import nltk
+    try:
+        print("Downloading required NLTK resources...")
+        os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+        for resource in NLTK_RESOURCES:
+            nltk.download(resource, download_dir=NLTK_DATA_DIR)
+        print("NLTK resources downloaded successfully.")
+    except Exception as e:
+        print(f"Error downloading NLTK resources: {str(e)}")
+    nltk_available.cache_clear()
 
 class ImprovedGrievanceVerifier:
-    def __init__(self):
-        # Initialize models
-        self.toxic_detector = pipeline(
-            "text-classification",
-            model="unitary/toxic-bert",
-            tokenizer="unitary/toxic-bert"
-        )
-        
-        self.hate_detector = pipeline(
-            "text-classification",
-            model="Hate-speech-CNERG/dehatebert-mono-english",
-            tokenizer="Hate-speech-CNERG/dehatebert-mono-english"
-        )
-        
-        self.fake_detector = pipeline(
-            "text-classification",
-            model="roberta-base-openai-detector",
-            tokenizer="roberta-base-openai-detector"
-        )
+    def __init__(self, pos_tagger='perceptron', pos_cache_size=100_000, load_detectors=True):
+        # Initialize models; load_detectors=False gives a feature-only verifier
+        self.toxic_detector = self.hate_detector = self.fake_detector = None
+        if load_detectors:
+            self.toxic_detector = pipeline(
+                "text-classification",
+                model="unitary/toxic-bert",
+                tokenizer="unitary/toxic-bert"
+            )
+            
+            self.hate_detector = pipeline(
+                "text-classification",
+                model="Hate-speech-CNERG/dehatebert-mono-english",
+                tokenizer="Hate-speech-CNERG/dehatebert-mono-english"
+            )
+            
+            self.fake_detector = pipeline(
+                "text-classification",
+                model="roberta-base-openai-detector",
+                tokenizer="roberta-base-openai-detector"
+            )
         
         # Initialize additional classifiers
         self.tfidf = TfidfVectorizer(max_features=1000)
-        self.rf_classifier = RandomForestClassifier(n_estimators=100)
+        self.rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
+        # Optional incremental model (see online_learning.py) used instead of TF-IDF + RF
+        self.incremental_model = None
+        
+        # POS tagging: 'perceptron' (NLTK default, matches extract_features) or 'light'
+        self.pos_tagger = pos_tagger
+        self.pos_cache_size = pos_cache_size
+        self._pos_cache = OrderedDict()
         
     def extract_features(self, text):
         """Extract linguistic features from text"""
@@ -57,15 +115,17 @@ class ImprovedGrievanceVerifier:
             features['avg_word_length'] = sum(len(word) for word in text.split()) / len(text.split()) if text else 0
             
             # Linguistic features - simplified POS tagging
-            try:
-                tokens = word_tokenize(text)
-                pos_tags = nltk.pos_tag(tokens)  # Using default English tagger
-                features['noun_count'] = sum(1 for _, tag in pos_tags if tag.startswith('NN'))
-                features['verb_count'] = sum(1 for _, tag in pos_tags if tag.startswith('VB'))
-            except Exception as e:
-                print(f"Warning: Simplified POS tagging used due to error: {str(e)}")
-                features['noun_count'] = 0
-                features['verb_count'] = 0
+            features['noun_count'] = 0
+            features['verb_count'] = 0
+            if nltk_available():
+                try:
+                    import nltk
+                    tokens = nltk.word_tokenize(text)
+                    pos_tags = nltk.pos_tag(tokens)  # Using default English tagger
+                    features['noun_count'] = sum(1 for _, tag in pos_tags if tag.startswith('NN'))
+                    features['verb_count'] = sum(1 for _, tag in pos_tags if tag.startswith('VB'))
+                except Exception as e:
+                    print(f"Warning: Simplified POS tagging used due to error: {str(e)}")
             
             # Pattern features
             features['special_chars'] = len(re.findall(r'[!@#$%^&*(),.?":{}|<>]', text))
@@ -86,6 +146,84 @@ class ImprovedGrievanceVerifier:
             
         return features
 
+    def _tag_batch(self, texts, tagger):
+        """POS tags for each text, tagged in one call where possible"""
+        if tagger == 'light':
+            light = _light_tagger()
+            return [[tag for _, tag in light.tag(LIGHT_TOKEN_RE.findall(text))] for text in texts]
+        if not nltk_available():
+            return [[] for _ in texts]
+        
+        import nltk
+        try:
+            sentences = [nltk.word_tokenize(text) for text in texts]
+            return [[tag for _, tag in tagged] for tagged in nltk.pos_tag_sents(sentences)]
+        except Exception:
+            # Fall back to one text at a time so a bad text only zeroes its own counts
+            tags = []
+            for text in texts:
+                try:
+                    tags.append([tag for _, tag in nltk.pos_tag(nltk.word_tokenize(text))])
+                except Exception as e:
+                    print(f"Warning: Simplified POS tagging used due to error: {str(e)}")
+                    tags.append([])
+            return tags
+
+    def pos_counts_batch(self, texts, tagger=None):
+        """(noun_count, verb_count) per text, memoized by text and tagger"""
+        tagger = tagger or self.pos_tagger
+        counts = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            key = (tagger, text)
+            if key in self._pos_cache:
+                self._pos_cache.move_to_end(key)
+                counts[i] = self._pos_cache[key]
+            else:
+                pending.setdefault(text, []).append(i)
+        
+        if pending:
+            unique = list(pending)
+            for text, tags in zip(unique, self._tag_batch(unique, tagger)):
+                value = (sum(1 for tag in tags if tag.startswith('NN')), sum(1 for tag in tags if tag.startswith('VB')))
+                self._pos_cache[(tagger, text)] = value
+                for i in pending[text]:
+                    counts[i] = value
+            while len(self._pos_cache) > self.pos_cache_size:
+                self._pos_cache.popitem(last=False)
+        return counts
+
+    def extract_features_batch(self, texts, tagger=None):
+        """``extract_features`` for a list of texts as an (n, 7) array in FEATURE_NAMES order.
+
+        Length and regex counts are vectorized with pandas string methods and
+        POS tags come from ``pos_counts_batch``. With the default tagger the
+        values equal the per-text features, including the all-zero rows for
+        texts that make ``extract_features`` fail.
+        """
+        n = len(texts)
+        valid = np.array([isinstance(text, str) for text in texts], dtype=bool)
+        series = pd.Series([text if isinstance(text, str) else '' for text in texts], dtype=object)
+        
+        length = series.str.len().to_numpy(dtype=np.float64)
+        word_count = series.str.split().str.len().to_numpy(dtype=np.float64)
+        non_space = length - series.str.count(r'\s').to_numpy(dtype=np.float64)
+        # Whitespace-only texts divide by zero in extract_features and get all-zero features
+        valid &= ~((length > 0) & (word_count == 0))
+        
+        features = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+        features[:, 0] = length
+        features[:, 1] = word_count
+        np.divide(non_space, word_count, out=features[:, 2], where=word_count > 0)
+        features[:, 5] = series.str.count(r'[!@#$%^&*(),.?":{}|<>]').to_numpy(dtype=np.float64)
+        features[:, 6] = series.str.count(r'\d+').to_numpy(dtype=np.float64)
+        
+        rows = np.flatnonzero(valid)
+        if len(rows):
+            features[rows, 3:5] = self.pos_counts_batch([texts[i] for i in rows], tagger)
+        features[~valid] = 0
+        return features
+
     def preprocess_text(self, text):
         """Clean and normalize text"""
         # Convert to lowercase
@@ -126,6 +264,42 @@ class ImprovedGrievanceVerifier:
                 
         return red_flags >= 2
 
+    def build_feature_matrix(self, texts, tfidf_texts=None, fit=False):
+        """Handcrafted + TF-IDF features for a list of texts as one sparse matrix.
+
+        Columns are ``FEATURE_NAMES`` followed by the TF-IDF vocabulary, the
+        same order the DataFrame path used. ``tfidf_texts`` defaults to
+        ``texts``; training passes the preprocessed texts there while the
+        handcrafted features use the raw ones.
+        """
+        tfidf_texts = texts if tfidf_texts is None else tfidf_texts
+        
+        handcrafted = self.extract_features_batch(texts)
+        
+        # Add TF-IDF features
+        if fit:
+            tfidf_features = self.tfidf.fit_transform(tfidf_texts)
+        else:
+            tfidf_features = self.tfidf.transform(tfidf_texts)
+        
+        # Combine features without densifying the vocabulary
+        return sp.hstack([sp.csr_matrix(handcrafted), tfidf_features], format='csr')
+
+    def rf_proba(self, clean_texts):
+        """[P(fake), P(authentic)] per preprocessed text from the feature classifier"""
+        if self.incremental_model is not None:
+            return self.incremental_model.predict_proba(clean_texts)
+        return self.rf_classifier.predict_proba(self.build_feature_matrix(clean_texts))
+
+    def fit(self, texts, labels):
+        """Fit TF-IDF and the RF classifier on raw texts (1 = authentic, 0 = fake)"""
+        # Extract features
+        X = self.build_feature_matrix(texts, [self.preprocess_text(text) for text in texts], fit=True)
+        
+        # Train classifier
+        self.rf_classifier.fit(X, labels)
+        return X.shape
+
     def train_model(self, authentic_path, fake_path):
         """Enhanced training with multiple features"""
         print("\nLoading and processing datasets...")
@@ -138,30 +312,7 @@ class ImprovedGrievanceVerifier:
         all_texts = authentic_df['complaint'].tolist() + fake_df['complaint'].tolist()
         all_labels = [1] * len(authentic_df) + [0] * len(fake_df)
         
-        # Extract features
-        feature_list = []
-        for text in all_texts:
-            features = self.extract_features(text)
-            feature_list.append(features)
-            
-        # Convert to DataFrame with string column names
-        feature_df = pd.DataFrame(feature_list)
-        feature_df.columns = feature_df.columns.astype(str)  # Convert column names to strings
-        
-        # Add TF-IDF features
-        tfidf_features = self.tfidf.fit_transform([self.preprocess_text(text) for text in all_texts])
-        tfidf_df = pd.DataFrame(
-            tfidf_features.toarray(),
-            columns=[f'tfidf_{i}' for i in range(tfidf_features.shape[1])]
-        )
-        
-        # Combine features
-        X = pd.concat([feature_df, tfidf_df], axis=1)
-        # Ensure all column names are strings
-        X.columns = X.columns.astype(str)
-        
-        # Train classifier
-        self.rf_classifier.fit(X, all_labels)
+        self.fit(all_texts, all_labels)
         
         print(f"\nTraining completed with {len(authentic_df)} authentic and {len(fake_df)} fake samples")
         
@@ -170,66 +321,43 @@ class ImprovedGrievanceVerifier:
             'fake_samples': len(fake_df)
         }
 
-    def verify_grievance(self, text):
-        """Improved verification with multiple checks"""
-        # Basic validation
+    def _validate(self, text):
+        """Basic validation; returns a rejection or None"""
         if not text or len(text.strip()) < 10:
             return {
                 'status': 'rejected',
                 'reason': 'Grievance text too short or empty',
                 'score': 0.0
             }
+        return None
 
-        # Preprocess text
-        clean_text = self.preprocess_text(text)
-        
-        # Check for toxic content
-        toxic_result = self.toxic_detector(clean_text)[0]
-        hate_result = self.hate_detector(clean_text)[0]
-        
+    def _screen_toxic(self, toxic_result):
         if toxic_result['label'] == 'LABEL_1' and toxic_result['score'] > 0.8:
             return {
                 'status': 'rejected',
                 'reason': 'Contains toxic content',
                 'score': toxic_result['score']
             }
-            
+        return None
+
+    def _screen_hate(self, hate_result):
         if hate_result['label'] == 'LABEL_1' and hate_result['score'] > 0.8:
             return {
                 'status': 'rejected',
                 'reason': 'Contains hate speech',
                 'score': hate_result['score']
             }
-        
-        # Extract features
-        features = self.extract_features(clean_text)
-        feature_df = pd.DataFrame([features])
-        feature_df.columns = feature_df.columns.astype(str)  # Convert column names to strings
-        
-        # Get TF-IDF features
-        tfidf_features = self.tfidf.transform([clean_text])
-        tfidf_df = pd.DataFrame(
-            tfidf_features.toarray(),
-            columns=[f'tfidf_{i}' for i in range(tfidf_features.shape[1])]
-        )
-        
-        # Combine features
-        X = pd.concat([
-            feature_df,
-            tfidf_df
-        ], axis=1)
-        X.columns = X.columns.astype(str)  # Ensure all column names are strings
-        
-        # Get prediction from RF classifier
-        rf_pred = self.rf_classifier.predict_proba(X)[0]
-        
-        # Get prediction from fake detector
-        fake_result = self.fake_detector(clean_text)[0]
-        
+        return None
+
+    def _screen_content(self, toxic_result, hate_result):
+        """Reject toxic or hateful content; returns a rejection or None"""
+        return self._screen_toxic(toxic_result) or self._screen_hate(hate_result)
+
+    def _decide(self, clean_text, rf_pred, fake_result):
+        """Combined decision logic"""
         # Check linguistic patterns
         has_suspicious_patterns = self.check_linguistic_patterns(clean_text)
         
-        # Combined decision logic
         fake_score = (rf_pred[0] + fake_result['score']) / 2
         
         is_fake = (
@@ -245,27 +373,162 @@ class ImprovedGrievanceVerifier:
             'confidence': min(fake_score * 100, 100)
         }
 
-def process_grievance_dataset(file_path, verifier=None):
+    def verify_grievance(self, text):
+        """Improved verification with multiple checks"""
+        # Basic validation
+        rejection = self._validate(text)
+        if rejection:
+            return rejection
+
+        # Preprocess text
+        clean_text = self.preprocess_text(text)
+        
+        # Check for toxic content
+        toxic_result = self.toxic_detector(clean_text)[0]
+        hate_result = self.hate_detector(clean_text)[0]
+        rejection = self._screen_content(toxic_result, hate_result)
+        if rejection:
+            return rejection
+        
+        # Get prediction from RF classifier
+        rf_pred = self.rf_proba([clean_text])[0]
+        
+        # Get prediction from fake detector
+        fake_result = self.fake_detector(clean_text)[0]
+        
+        return self._decide(clean_text, rf_pred, fake_result)
+
+    def verify_many(self, texts, batch_size=32):
+        """Verify a list of grievances; same results as calling verify_grievance on each.
+
+        The three detectors run over the whole list with pipeline batching,
+        concurrently in a thread pool (torch releases the GIL). The RF
+        features are built for all remaining texts in one matrix.
+        """
+        results = [self._validate(text) for text in texts]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        clean_texts = [self.preprocess_text(texts[i]) for i in pending]
+        detectors = [self.toxic_detector, self.hate_detector, self.fake_detector]
+        with ThreadPoolExecutor(max_workers=len(detectors)) as executor:
+            futures = [executor.submit(detector, clean_texts, batch_size=batch_size) for detector in detectors]
+            toxic_results, hate_results, fake_results = [future.result() for future in futures]
+
+        remaining = []
+        for j, i in enumerate(pending):
+            results[i] = self._screen_content(toxic_results[j], hate_results[j])
+            if results[i] is None:
+                remaining.append(j)
+
+        if remaining:
+            rf_preds = self.rf_proba([clean_texts[j] for j in remaining])
+            for rf_pred, j in zip(rf_preds, remaining):
+                results[pending[j]] = self._decide(clean_texts[j], rf_pred, fake_results[j])
+
+        return results
+
+def process_grievance_dataset(file_path, verifier=None, batch_size=32):
     """Process a dataset of grievances"""
     if verifier is None:
         verifier = ImprovedGrievanceVerifier()
     
     df = pd.read_csv(file_path)
-    results = []
+    start_time = time.perf_counter()
+    verified = verifier.verify_many(df['complaint'].astype(str).tolist(), batch_size=batch_size)
+    elapsed = time.perf_counter() - start_time
+    print(f"Verified {len(df)} grievances in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):.1f} rows/sec)")
     
-    for idx, row in df.iterrows():
-        result = verifier.verify_grievance(str(row['complaint']))
-        results.append({
-            'id': row['id'],
-            'status': result['status'],
-            'reason': result['reason'],
-            'confidence': result['confidence']
-        })
+    return pd.DataFrame({
+        'id': df['id'].values,
+        'status': [result['status'] for result in verified],
+        'reason': [result['reason'] for result in verified],
+        # Early rejections carry no confidence
+        'confidence': [result.get('confidence') for result in verified],
+    })
+
+def report_training_memory(verifier, texts, labels, n_rows=1_000_000):
+    """Peak memory of a training run on ``texts`` repeated to ``n_rows`` rows.
+
+    Measured with tracemalloc (Python, numpy and scipy allocations). The
+    size the old dense path needed for ``toarray()`` alone is printed for
+    comparison.
+    """
+    repeats = -(-n_rows // len(texts))
+    texts = (list(texts) * repeats)[:n_rows]
+    labels = (list(labels) * repeats)[:n_rows]
+    
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    n, n_features = verifier.fit(texts, labels)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    dense_bytes = n * n_features * 8
+    print(f"Training rows: {n}, features: {n_features}, time: {elapsed:.1f}s")
+    print(f"Peak traced memory (sparse path): {peak / 2**20:.1f} MB")
+    print(f"Dense toarray() alone would need: {dense_bytes / 2**20:.1f} MB")
+    return {'rows': n, 'features': n_features, 'peak_mb': peak / 2**20, 'dense_mb': dense_bytes / 2**20}
+
+def benchmark_feature_extraction(verifier, texts, n_rows=100_000):
+    """Per-text ``extract_features`` vs the batch extractor (both taggers) on ``n_rows`` rows"""
+    repeats = -(-n_rows // len(texts))
+    texts = (list(texts) * repeats)[:n_rows]
+    
+    def per_text():
+        return np.array([[f[name] for name in FEATURE_NAMES] for f in map(verifier.extract_features, texts)],
+                        dtype=np.float64).reshape(len(texts), len(FEATURE_NAMES))
     
-    return pd.DataFrame(results)
+    runs = {
+        'per_text': per_text,
+        'batch_perceptron': lambda: verifier.extract_features_batch(texts, tagger='perceptron'),
+        'batch_light': lambda: verifier.extract_features_batch(texts, tagger='light'),
+    }
+    rows = []
+    outputs = {}
+    for name, run in runs.items():
+        verifier._pos_cache.clear()
+        start_time = time.perf_counter()
+        outputs[name] = run()
+        elapsed = time.perf_counter() - start_time
+        rows.append({
+            'method': name,
+            'seconds': elapsed,
+            'rows_per_sec': len(texts) / max(elapsed, 1e-9),
+            'matches_per_text': bool(np.array_equal(outputs[name], outputs['per_text'])),
+        })
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    return results
 
 if __name__ == "__main__":
+    import sys
+    if '--setup-nltk' in sys.argv:
+        download_nltk_resources()
+        sys.exit(0)
+
+    if '--feature-benchmark' in sys.argv:
+        authentic_df = pd.read_csv('E:\\ML\\Data\\combined_data.csv')
+        benchmark_feature_extraction(ImprovedGrievanceVerifier(), authentic_df['complaint'].dropna().astype(str).tolist())
+        sys.exit(0)
+
+    if '--memory-report' in sys.argv:
+        authentic_df = pd.read_csv('E:\\ML\\Data\\combined_data.csv')
+        fake_df = pd.read_csv('E:\\ML\\Data\\fake_grivance.csv')
+        report_training_memory(
+            ImprovedGrievanceVerifier(),
+            authentic_df['complaint'].tolist() + fake_df['complaint'].tolist(),
+            [1] * len(authentic_df) + [0] * len(fake_df)
+        )
+        sys.exit(0)
+
     try:
+        # Training is an explicit entry point, so fetch missing resources here
+        if not nltk_available():
+            download_nltk_resources()
+
         print("\nInitializing Grievance Verifier...")
         verifier = ImprovedGrievanceVerifier()
         
@@ -0,0 +1,317 @@
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import unicodedata
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = 'E:\\ML\\Data\\near_duplicate_index'
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+def normalize_text(text):
+    """NFKC, casefold, keep letters/marks/numbers (Devanagari matras and virama
+    are marks), collapse everything else to single spaces"""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    text = ''.join(ch if unicodedata.category(ch)[0] in 'LMN' else ' ' for ch in text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+
+class NearDuplicateIndex:
+    """MinHash/LSH index over normalized complaint text with an on-disk log.
+
+    Texts are shingled into character n-grams (script independent, so Hindi
+    and English behave the same), hashed into ``num_perm`` MinHash values and
+    banded into LSH buckets. Candidates from the buckets are confirmed by
+    their estimated Jaccard similarity. Every insert and result update is
+    appended to ``index.jsonl``, so inserts are incremental and the index is
+    rebuilt in memory on load.
+
+    Each entry belongs to a cluster (the cluster of the entry it matched, or
+    a new one); a cluster with ``flood_size`` or more entries inside
+    ``flood_window`` seconds is flagged as a possible flood. Cached results
+    are only reused from matches newer than ``reuse_window`` seconds.
+    """
+
+    def __init__(self, store_dir=INDEX_DIR, num_perm=128, bands=16, threshold=0.8, shingle_size=5,
+                 flood_size=5, flood_window=24 * 3600, reuse_window=7 * 24 * 3600, seed=42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.store_dir = store_dir
+        self.config = {'num_perm': num_perm, 'bands': bands, 'shingle_size': shingle_size, 'seed': seed}
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.flood_size = flood_size
+        self.flood_window = flood_window
+        self.reuse_window = reuse_window
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2**31 - 1, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 2**31 - 1, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+        self.entries = {}
+        self.signatures = {}
+        self.exact = {}
+        self.clusters = {}
+        self.buckets = [dict() for _ in range(bands)]
+        self._next_cluster = 0
+        self._load()
+
+    # Hashing
+    def shingles(self, normalized):
+        k = self.shingle_size
+        if len(normalized) <= k:
+            return {normalized}
+        return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+    def signature(self, text):
+        """MinHash signature (uint32, ``num_perm`` values) of a text"""
+        normalized = normalize_text(text)
+        hashes = np.fromiter((_hash32(s) for s in self.shingles(normalized)), dtype=np.uint64)
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [signature[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    # Persistence
+    def _log_path(self):
+        return os.path.join(self.store_dir, 'index.jsonl')
+
+    def _load(self):
+        meta_path = os.path.join(self.store_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)
+            if stored != self.config:
+                raise ValueError(f"Index at {self.store_dir} was built with {stored}, not {self.config}")
+        if not os.path.exists(self._log_path()):
+            return
+        with open(self._log_path(), encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._apply(json.loads(line))
+        print(f"Loaded {len(self.entries)} entries in {len(self.clusters)} clusters from {self.store_dir}")
+
+    def _append(self, records):
+        os.makedirs(self.store_dir, exist_ok=True)
+        meta_path = os.path.join(self.store_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump(self.config, f, indent=2)
+        with open(self._log_path(), 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _apply(self, record):
+        if record['op'] == 'results':
+            self.entries[record['id']]['results'] = record['results']
+            return
+
+        entry_id = record['id']
+        signature = np.frombuffer(bytes.fromhex(record['signature']), dtype=np.uint32)
+        self.entries[entry_id] = {
+            'cluster': record['cluster'],
+            'timestamp': record['timestamp'],
+            'text_hash': record['text_hash'],
+            'results': record.get('results'),
+        }
+        self.signatures[entry_id] = signature
+        self.exact[record['text_hash']] = entry_id  # Newest copy, the most likely to have fresh results
+        self.clusters.setdefault(record['cluster'], []).append(record['timestamp'])
+        self._next_cluster = max(self._next_cluster, record['cluster'] + 1)
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(key, []).append(entry_id)
+
+    # Queries
+    def query(self, text, signature=None):
+        """Entries with estimated Jaccard >= threshold, best first: ``[(id, similarity)]``"""
+        if signature is None:
+            signature = self.signature(text)
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        matches = []
+        for entry_id in candidates:
+            similarity = float(np.mean(self.signatures[entry_id] == signature))
+            if similarity >= self.threshold:
+                matches.append((entry_id, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def cluster_activity(self, cluster, now=None):
+        """Number of entries in ``cluster`` within the flood window"""
+        now = time.time() if now is None else now
+        return sum(1 for ts in self.clusters.get(cluster, ()) if now - ts <= self.flood_window)
+
+    def _reusable(self, entry_id, now):
+        entry = self.entries[entry_id]
+        return bool(entry['results']) and now - entry['timestamp'] <= self.reuse_window
+
+    def check(self, text, now=None):
+        """Look up a text without inserting it.
+
+        Returns the best match, its cluster, cached results (if any entry in
+        the match list has them) and whether the cluster is flooding.
+        """
+        text_hash = hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+        signature = self.signature(text)
+        now = time.time() if now is None else now
+        exact = self.exact.get(text_hash)
+        if exact is not None and self._reusable(exact, now):
+            matches = [(exact, 1.0)]
+        else:
+            # No usable exact hit: other copies or near-copies may still have results
+            matches = self.query(text, signature)
+
+        result = {'signature': signature, 'text_hash': text_hash, 'match': None, 'similarity': 0.0,
+                  'cluster': None, 'cluster_size': 0, 'flood': False, 'cached_results': None}
+        if matches:
+            entry_id, similarity = matches[0]
+            cluster = self.entries[entry_id]['cluster']
+            activity = self.cluster_activity(cluster, now)
+            cached = next((self.entries[e]['results'] for e, _ in matches if self._reusable(e, now)), None)
+            result.update({
+                'match': entry_id, 'similarity': similarity, 'cluster': cluster,
+                'cluster_size': activity + 1, 'flood': activity + 1 >= self.flood_size,
+                'cached_results': cached,
+            })
+        return result
+
+    def insert(self, text, entry_id=None, timestamp=None, results=None, checked=None):
+        """Add a text (reusing a ``check`` result if given); returns the check result"""
+        if checked is None or checked['match'] is None:
+            # Recheck: earlier inserts (e.g. in the same batch) may match now
+            checked = self.check(text, timestamp)
+        else:
+            # Count entries inserted since the check (e.g. earlier rows of the same batch)
+            activity = self.cluster_activity(checked['cluster'], timestamp)
+            checked['cluster_size'] = activity + 1
+            checked['flood'] = activity + 1 >= self.flood_size
+        entry_id = str(entry_id) if entry_id is not None else f"entry-{len(self.entries)}"
+        cluster = checked['cluster']
+        if cluster is None:
+            cluster = self._next_cluster
+        record = {
+            'op': 'insert',
+            'id': entry_id,
+            'cluster': cluster,
+            'timestamp': time.time() if timestamp is None else float(timestamp),
+            'text_hash': checked['text_hash'],
+            'signature': checked['signature'].tobytes().hex(),
+            'results': results,
+        }
+        self._apply(record)
+        self._append([record])
+        checked['id'] = entry_id
+        checked['cluster'] = cluster
+        return checked
+
+    def set_results(self, entry_id, results):
+        """Attach verification/classification results to an entry for reuse"""
+        record = {'op': 'results', 'id': str(entry_id), 'results': results}
+        self._apply(record)
+        self._append([record])
+
+    def bulk_build(self, csv_path, text_column='complaint', id_column='id', time_column='CreatedAt'):
+        """Insert every row of a CSV (e.g. combined_data.csv) with one log write"""
+        df = pd.read_csv(csv_path)
+        timestamps = None
+        if time_column in df.columns:
+            parsed = pd.to_datetime(df[time_column], errors='coerce')
+            timestamps = ((parsed - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).fillna(time.time()).values
+
+        start_time = time.perf_counter()
+        records = []
+        for row, text in enumerate(df[text_column].fillna('').astype(str)):
+            if not text.strip():
+                continue
+            checked = self.check(text)
+            entry_id = str(df[id_column].iloc[row]) if id_column in df.columns else f"entry-{len(self.entries)}"
+            record = {
+                'op': 'insert',
+                'id': entry_id,
+                'cluster': self._next_cluster if checked['cluster'] is None else checked['cluster'],
+                'timestamp': float(timestamps[row]) if timestamps is not None else time.time(),
+                'text_hash': checked['text_hash'],
+                'signature': checked['signature'].tobytes().hex(),
+                'results': None,
+            }
+            self._apply(record)
+            records.append(record)
+        self._append(records)
+
+        elapsed = time.perf_counter() - start_time
+        print(f"Indexed {len(records)} texts into {len(self.clusters)} clusters in {elapsed:.1f}s")
+        return len(records)
+
+class DeduplicatingVerifier:
+    """Routes near-duplicates to cached results before running any model.
+
+    ``verifier`` is an ImprovedGrievanceVerifier (or StagedGrievanceVerifier)
+    and ``classify_fn(texts)`` optionally returns one classification dict per
+    text (e.g. ``unified_model.predict_many``). New texts are verified and
+    classified in one batch, then inserted with their results.
+    """
+
+    def __init__(self, verifier, index, classify_fn=None):
+        self.verifier = verifier
+        self.index = index
+        self.classify_fn = classify_fn
+        self.stats = {'rows': 0, 'reused': 0, 'flood_flags': 0}
+
+    def process_many(self, texts, ids=None, batch_size=32):
+        texts = [str(text) for text in texts]
+        ids = ids if ids is not None else [None] * len(texts)
+        checks = [self.index.check(text) for text in texts]
+        outputs = [None] * len(texts)
+
+        fresh = [i for i, checked in enumerate(checks) if checked['cached_results'] is None]
+        if fresh:
+            verified = self.verifier.verify_many([texts[i] for i in fresh], batch_size=batch_size)
+            classified = self.classify_fn([texts[i] for i in fresh]) if self.classify_fn else [None] * len(fresh)
+            for i, verification, classification in zip(fresh, verified, classified):
+                outputs[i] = {'verification': verification, 'classification': classification}
+
+        for i, checked in enumerate(checks):
+            reused = outputs[i] is None
+            results = checked['cached_results'] if reused else outputs[i]
+            checked = self.index.insert(texts[i], ids[i], results=results, checked=checked)
+            outputs[i] = {
+                **results,
+                'reused': reused,
+                'duplicate_of': checked['match'],
+                'similarity': checked['similarity'],
+                'cluster': checked['cluster'],
+                'possible_flood': checked['flood'],
+            }
+            self.stats['reused'] += int(reused)
+            self.stats['flood_flags'] += int(checked['flood'])
+        self.stats['rows'] += len(texts)
+        return outputs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Near-duplicate / flood index for grievances")
+    parser.add_argument('--build', help='Bulk-build the index from a CSV (e.g. combined_data.csv)')
+    parser.add_argument('--index', default=INDEX_DIR)
+    parser.add_argument('--query', help='Text to look up')
+    args = parser.parse_args()
+
+    index = NearDuplicateIndex(args.index)
+    if args.build:
+        index.bulk_build(args.build)
+    if args.query:
+        start_time = time.perf_counter()
+        checked = index.check(args.query)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        print(f"Match: {checked['match']} (similarity {checked['similarity']:.2f}), "
+              f"cluster size {checked['cluster_size']}, flood: {checked['flood']} [{elapsed:.2f} ms]")
@@ -0,0 +1,172 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import joblib
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from model import ImprovedGrievanceVerifier, nltk_available, download_nltk_resources
+
+CHECKPOINT_PATH = 'online_fake_detector.joblib'
+CLASSES = np.array([0, 1])  # 0 = fake, 1 = authentic, same columns as rf_classifier
+
+class IncrementalFakeDetector:
+    """Online replacement for the TF-IDF + RandomForest stage of the verifier.
+
+    Handcrafted features (log1p-scaled) are stacked with a HashingVectorizer
+    over the preprocessed text, and a logistic SGDClassifier is updated with
+    ``partial_fit``, so new labelled grievances never force a full refit.
+    Attach it with ``verifier.incremental_model = detector``; ``rf_proba``
+    then uses it in ``verify_grievance``, ``verify_many`` and the staged
+    verifier.
+    """
+
+    def __init__(self, n_features=2**18):
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+        self.classifier = SGDClassifier(loss='log_loss', random_state=42)
+        self.rows_seen = 0
+        self._features = None
+
+    @property
+    def features(self):
+        # Feature-only verifier (no transformer pipelines), rebuilt after loading
+        if self._features is None:
+            self._features = ImprovedGrievanceVerifier(load_detectors=False)
+        return self._features
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def build_feature_matrix(self, clean_texts):
+        handcrafted = np.log1p(self.features.extract_features_batch(clean_texts))
+        return sp.hstack([sp.csr_matrix(handcrafted), self.vectorizer.transform(clean_texts)], format='csr')
+
+    def partial_fit(self, texts, labels):
+        """Update on raw texts with labels 1 = authentic, 0 = fake"""
+        texts = [str(text) for text in texts]
+        if not texts:
+            return self
+        clean_texts = [self.features.preprocess_text(text) for text in texts]
+        self.classifier.partial_fit(self.build_feature_matrix(clean_texts), np.asarray(labels, dtype=int), classes=CLASSES)
+        self.rows_seen += len(texts)
+        return self
+
+    def predict_proba(self, clean_texts):
+        """[P(fake), P(authentic)] per preprocessed text"""
+        return self.classifier.predict_proba(self.build_feature_matrix(list(clean_texts)))
+
+    def save(self, path=CHECKPOINT_PATH):
+        """Atomic checkpoint of the full model state"""
+        tmp_path = path + '.tmp'
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_PATH):
+        return joblib.load(path)
+
+class MiniBatchUpdater:
+    """Buffers labelled texts as they arrive and applies ``partial_fit`` per mini-batch.
+
+    A checkpoint is written every ``checkpoint_every`` updates and on ``close``.
+    """
+
+    def __init__(self, model, batch_size=1000, checkpoint_path=CHECKPOINT_PATH, checkpoint_every=10):
+        self.model = model
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.texts = []
+        self.labels = []
+        self.updates = 0
+
+    def add(self, texts, labels):
+        self.texts.extend(texts)
+        self.labels.extend(labels)
+        while len(self.texts) >= self.batch_size:
+            self._update(self.texts[:self.batch_size], self.labels[:self.batch_size])
+            self.texts = self.texts[self.batch_size:]
+            self.labels = self.labels[self.batch_size:]
+
+    def _update(self, texts, labels):
+        self.model.partial_fit(texts, labels)
+        self.updates += 1
+        if self.checkpoint_path and self.updates % self.checkpoint_every == 0:
+            self.model.save(self.checkpoint_path)
+
+    def flush(self):
+        if self.texts:
+            self._update(self.texts, self.labels)
+            self.texts, self.labels = [], []
+
+    def close(self):
+        self.flush()
+        if self.checkpoint_path:
+            self.model.save(self.checkpoint_path)
+            print(f"Checkpoint saved to {self.checkpoint_path} ({self.model.rows_seen} rows seen)")
+
+def _chunks(csv_path, label, chunksize):
+    for chunk in pd.read_csv(csv_path, usecols=['complaint'], chunksize=chunksize):
+        texts = chunk['complaint'].dropna().astype(str).tolist()
+        yield texts, [label] * len(texts)
+
+def replay_csv(model, authentic_path=None, fake_path=None, chunksize=10000, batch_size=1000,
+               checkpoint_path=CHECKPOINT_PATH, checkpoint_every=10):
+    """Stream authentic (label 1) and fake (label 0) CSVs through the updater.
+
+    Each step reads one chunk per file and shuffles them together, so every
+    mini-batch sees both classes; memory stays bounded by ``chunksize`` per file.
+    """
+    streams = []
+    if authentic_path:
+        streams.append(_chunks(authentic_path, 1, chunksize))
+    if fake_path:
+        streams.append(_chunks(fake_path, 0, chunksize))
+
+    updater = MiniBatchUpdater(model, batch_size, checkpoint_path, checkpoint_every)
+    start_time = time.perf_counter()
+    rows = 0
+    while streams:
+        # One chunk from every stream, shuffled together so each mini-batch mixes both labels
+        texts, labels = [], []
+        for stream in list(streams):
+            chunk = next(stream, None)
+            if chunk is None:
+                streams.remove(stream)
+                continue
+            texts.extend(chunk[0])
+            labels.extend(chunk[1])
+        if not texts:
+            continue
+        order = np.random.RandomState(rows).permutation(len(texts))
+        updater.add([texts[i] for i in order], [labels[i] for i in order])
+        rows += len(texts)
+    updater.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"Replayed {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/sec)")
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental updates for the fake grievance classifier")
+    parser.add_argument('--authentic', help='CSV of authentic grievances (complaint column)')
+    parser.add_argument('--fake', help='CSV of fake grievances (complaint column)')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if not args.authentic and not args.fake:
+        parser.error('pass --authentic and/or --fake')
+    if not nltk_available():
+        download_nltk_resources()
+
+    if os.path.exists(args.checkpoint):
+        print(f"Resuming from {args.checkpoint}")
+        model = IncrementalFakeDetector.load(args.checkpoint)
+    else:
+        model = IncrementalFakeDetector()
+    replay_csv(model, args.authentic, args.fake, args.chunksize, args.batch_size, args.checkpoint)
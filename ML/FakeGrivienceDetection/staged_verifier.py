@@ -0,0 +1,206 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from model import ImprovedGrievanceVerifier, nltk_available, download_nltk_resources
+
+# Ordered by cost; transformers last
+STAGES = ['length', 'patterns', 'random_forest', 'toxic', 'hate', 'fake']
+TRANSFORMER_STAGES = ['toxic', 'hate', 'fake']
+
+class StagedGrievanceVerifier:
+    """Cheap-first verification that stops as soon as the outcome is settled.
+
+    Stages run in ``STAGES`` order over the texts still undecided, so each
+    transformer only sees the survivors of the cheaper stages. The status
+    (accepted/rejected) matches ``ImprovedGrievanceVerifier.verify_grievance``:
+
+    - length and pattern rejections are rejections in the full path too;
+    - ``rf_reject_above`` defaults to 0.9: the fake detector's top score is
+      at least 0.5, so the combined fake score is then always above 0.7;
+    - ``rf_accept_below`` (disabled by default) accepts without running the
+      transformers and is only safe once ``calibrate_bounds``/``validate``
+      confirm it on held-out data.
+
+    Reasons and scores of early exits come from the stage that decided.
+    """
+
+    def __init__(self, verifier, rf_reject_above=0.9, rf_accept_below=None):
+        self.verifier = verifier
+        self.rf_reject_above = rf_reject_above
+        self.rf_accept_below = rf_accept_below
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {stage: {'reached': 0, 'accepted': 0, 'rejected': 0, 'seconds': 0.0} for stage in STAGES}
+        self.rows = 0
+
+    def _record(self, stage, reached, decided, results, start_time):
+        stats = self.stats[stage]
+        stats['reached'] += reached
+        stats['seconds'] += time.perf_counter() - start_time
+        for i in decided:
+            stats[results[i]['status']] += 1
+            results[i]['stage'] = stage
+
+    def _screen_stage(self, stage, detector, screen, active, clean_texts, results, batch_size):
+        start_time = time.perf_counter()
+        outputs = detector([clean_texts[i] for i in active], batch_size=batch_size) if active else []
+        decided = []
+        for i, output in zip(active, outputs):
+            results[i] = screen(output)
+            if results[i] is not None:
+                decided.append(i)
+        self._record(stage, len(active), decided, results, start_time)
+        return [i for i in active if results[i] is None], dict(zip(active, outputs))
+
+    def verify_many(self, texts, batch_size=32):
+        verifier = self.verifier
+        results = [None] * len(texts)
+        self.rows += len(texts)
+
+        # Length check
+        start_time = time.perf_counter()
+        for i, text in enumerate(texts):
+            results[i] = verifier._validate(text)
+        decided = [i for i, result in enumerate(results) if result is not None]
+        self._record('length', len(texts), decided, results, start_time)
+        active = [i for i, result in enumerate(results) if result is None]
+
+        # Regex patterns
+        start_time = time.perf_counter()
+        clean_texts = {i: verifier.preprocess_text(texts[i]) for i in active}
+        decided = []
+        for i in active:
+            if verifier.check_linguistic_patterns(clean_texts[i]):
+                results[i] = {
+                    'status': 'rejected',
+                    'reason': 'Likely AI-generated or suspicious',
+                    'score': 1.0,
+                    'confidence': 100.0
+                }
+                decided.append(i)
+        self._record('patterns', len(active), decided, results, start_time)
+        active = [i for i in active if results[i] is None]
+
+        # Random forest on handcrafted + TF-IDF features
+        start_time = time.perf_counter()
+        rf_preds = {}
+        decided = []
+        if active:
+            for i, rf_pred in zip(active, verifier.rf_proba([clean_texts[i] for i in active])):
+                rf_preds[i] = rf_pred
+                status = None
+                if self.rf_reject_above is not None and rf_pred[0] > self.rf_reject_above:
+                    status = 'rejected'
+                elif self.rf_accept_below is not None and rf_pred[0] < self.rf_accept_below:
+                    status = 'accepted'
+                if status:
+                    results[i] = {
+                        'status': status,
+                        'reason': 'Likely AI-generated or suspicious' if status == 'rejected' else 'Authentic grievance',
+                        'score': rf_pred[0],
+                        'confidence': min(rf_pred[0] * 100, 100)
+                    }
+                    decided.append(i)
+        self._record('random_forest', len(active), decided, results, start_time)
+        active = [i for i in active if results[i] is None]
+
+        # Transformers, cheapest screens first
+        active, _ = self._screen_stage('toxic', verifier.toxic_detector, verifier._screen_toxic,
+                                       active, clean_texts, results, batch_size)
+        active, _ = self._screen_stage('hate', verifier.hate_detector, verifier._screen_hate,
+                                       active, clean_texts, results, batch_size)
+        _, fake_results = self._screen_stage('fake', verifier.fake_detector, lambda output: None,
+                                             active, clean_texts, results, batch_size)
+
+        start_time = time.perf_counter()
+        for i in active:
+            results[i] = verifier._decide(clean_texts[i], rf_preds[i], fake_results[i])
+        self._record('fake', 0, active, results, start_time)
+        return results
+
+    def verify(self, text):
+        return self.verify_many([text])[0]
+
+    def stage_report(self):
+        """Per-stage traffic, hit rate and time, plus transformer calls skipped"""
+        rows = []
+        for stage in STAGES:
+            stats = self.stats[stage]
+            decided = stats['accepted'] + stats['rejected']
+            rows.append({
+                'stage': stage,
+                'reached': stats['reached'],
+                'accepted': stats['accepted'],
+                'rejected': stats['rejected'],
+                'hit_rate': decided / stats['reached'] if stats['reached'] else 0.0,
+                'seconds': stats['seconds'],
+            })
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+        full_calls = self.rows * len(TRANSFORMER_STAGES)
+        calls = sum(self.stats[stage]['reached'] for stage in TRANSFORMER_STAGES)
+        skipped = 1 - calls / full_calls if full_calls else 0.0
+        print(f"Transformer calls: {calls} of {full_calls} ({skipped:.1%} skipped)")
+        return report
+
+    def calibrate_bounds(self, texts, batch_size=32):
+        """Widest RF bounds that leave every decision on ``texts`` unchanged.
+
+        Rows that reach the RF stage are scored; the accept bound sits below
+        every reference rejection and the reject bound above every reference
+        acceptance. The exact 0.9 reject bound is never loosened upwards.
+        """
+        verifier = self.verifier
+        reference = verifier.verify_many(texts, batch_size=batch_size)
+        rows = [
+            i for i, text in enumerate(texts)
+            if verifier._validate(text) is None
+            and not verifier.check_linguistic_patterns(verifier.preprocess_text(text))
+        ]
+        if not rows:
+            return self.rf_reject_above, self.rf_accept_below
+
+        rf_fake = verifier.rf_proba([verifier.preprocess_text(texts[i]) for i in rows])[:, 0]
+        rejected = np.array([reference[i]['status'] == 'rejected' for i in rows])
+
+        self.rf_accept_below = float(rf_fake[rejected].min()) if rejected.any() else None
+        max_accepted = float(rf_fake[~rejected].max()) if (~rejected).any() else 0.0
+        self.rf_reject_above = min(0.9, max_accepted)
+        print(f"Calibrated bounds: accept below {self.rf_accept_below}, reject above {self.rf_reject_above:.3f}")
+        return self.rf_reject_above, self.rf_accept_below
+
+    def validate(self, texts, batch_size=32):
+        """Compare statuses with the full verifier; raises RuntimeError on any change"""
+        reference = self.verifier.verify_many(texts, batch_size=batch_size)
+        staged = self.verify_many(texts, batch_size=batch_size)
+        mismatches = [i for i, (a, b) in enumerate(zip(reference, staged)) if a['status'] != b['status']]
+        print(f"Decision agreement: {1 - len(mismatches) / max(len(texts), 1):.4f} on {len(texts)} texts")
+        if mismatches:
+            raise RuntimeError(f"Staged bounds change {len(mismatches)} decisions, e.g. rows {mismatches[:10]}")
+        return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cheap-first staged grievance verification")
+    parser.add_argument('--authentic', default='E:\\ML\\Data\\combined_data.csv')
+    parser.add_argument('--fake', default='E:\\ML\\Data\\fake_grivance.csv')
+    parser.add_argument('--heldout', default='E:\\ML\\Data\\fakedata.csv')
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    if not nltk_available():
+        download_nltk_resources()
+
+    verifier = ImprovedGrievanceVerifier()
+    verifier.train_model(args.authentic, args.fake)
+
+    # Calibrate on one half of the held-out data, validate on the other
+    texts = pd.read_csv(args.heldout)['complaint'].astype(str).tolist()
+    calibration, validation = texts[::2], texts[1::2]
+
+    staged = StagedGrievanceVerifier(verifier)
+    staged.calibrate_bounds(calibration, args.batch_size)
+    staged.validate(validation, args.batch_size)
+    staged.stage_report()
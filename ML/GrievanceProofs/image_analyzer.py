@@ -1,10 +1,25 @@
+import time
 import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
+from model_registry import load_blip
 import os
 from tqdm import tqdm
 import pandas as pd
 import json
+from image_pipeline import run_pipeline
+from image_manifest import ImageManifest, MANIFEST_PATH, parse_since
+from image_hashes import PerceptualHashIndex, HASH_INDEX_DIR
+
+# Beam search settings shared by single and batched captioning
+CAPTION_KWARGS = {
+    'max_length': 50,
+    'num_beams': 5,
+    'min_length': 5,
+    'top_p': 0.9,
+    'repetition_penalty': 1.5,
+    'length_penalty': 1.0,
+    'temperature': 1.0
+}
 
 def setup_env():
     """Setup environment variables to use E drive"""
@@ -40,34 +55,19 @@ def ensure_directories():
     return dirs
 
 class GrievanceImageAnalyzer:
-    def __init__(self, model_name="Salesforce/blip-image-captioning-base", cache_dir=None):
+    def __init__(self, model_name="Salesforce/blip-image-captioning-base", cache_dir=None, hash_index=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"Using device: {self.device}")
         
+        # Optional PerceptualHashIndex; copies of indexed images skip captioning
+        self.hash_index = hash_index
+        
         if cache_dir is None:
             cache_dir = 'E:/ML/ModelCache'
         
-        # Load BLIP model and processor
+        # Load BLIP model and processor; the local snapshot is written once and shared per process
         print("Loading BLIP model and processor...")
-        self.processor = BlipProcessor.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            local_files_only=False
-        )
-        
-        self.model = BlipForConditionalGeneration.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            local_files_only=False
-        ).to(self.device)
-        
-        # Save models locally to E drive
-        save_dir = 'E:/ML/GrievanceProofs/saved_models'
-        os.makedirs(save_dir, exist_ok=True)
-        
-        print("Saving models locally...")
-        self.model.save_pretrained(os.path.join(save_dir, 'blip_model'))
-        self.processor.save_pretrained(os.path.join(save_dir, 'blip_processor'))
+        self.processor, self.model = load_blip(model_name, cache_dir, self.device)
         
         # Severity keywords and their weights
         self.severity_keywords = {
@@ -192,29 +192,24 @@ class GrievanceImageAnalyzer:
             return recommendations[severity]
         return ""
 
-    def predict_caption(self, image):
-        if isinstance(image, str):
-            image = Image.open(image).convert('RGB')
+    def predict_captions(self, images):
+        """Caption a list of images (paths or PIL images) with one ``generate`` call"""
+        images = [Image.open(image).convert('RGB') if isinstance(image, str) else image for image in images]
         
-        # Process image
-        inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-        
-        # Generate caption
+        # Process the whole batch; pixel values share one size, so no padding is needed
+        inputs = self.processor(images=images, return_tensors="pt")
+        return self.caption_pixel_values(inputs['pixel_values'])
+
+    def caption_pixel_values(self, pixel_values):
+        """Captions for an already preprocessed (batch, 3, H, W) tensor"""
         with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_length=50,
-                num_beams=5,
-                min_length=5,
-                top_p=0.9,
-                repetition_penalty=1.5,
-                length_penalty=1.0,
-                temperature=1.0
-            )
+            outputs = self.model.generate(pixel_values=pixel_values.to(self.device), **CAPTION_KWARGS)
         
-        # Decode caption
-        caption = self.processor.decode(outputs[0], skip_special_tokens=True)
-        return caption
+        # Decode captions
+        return self.processor.batch_decode(outputs, skip_special_tokens=True)
+
+    def predict_caption(self, image):
+        return self.predict_captions([image])[0]
 
     def analyze_severity(self, caption):
         caption = caption.lower()
@@ -243,26 +238,91 @@ class GrievanceImageAnalyzer:
             return 'Medium'
         return 'Low'
     
-    def analyze_image(self, image_path):
-        """Analyze a single image and return detailed analysis"""
-        try:
-            # Generate basic caption with more detail
-            caption = self.predict_caption(image_path)
-            severity = self.analyze_severity(caption)
+    def _build_result(self, image_path, caption, severity=None):
+        severity = severity or self.analyze_severity(caption)
+        
+        # Generate detailed description
+        detailed_description = self.generate_detailed_description(caption, severity)
+        
+        return {
+            'image_path': image_path,
+            'caption': caption,
+            'severity': severity,
+            'detailed_description': detailed_description,
+            'analysis_date': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def analyze_images(self, image_paths, batch_size=8):
+        """Analyze images in batches; returns one result (or None on error) per path"""
+        results = [None] * len(image_paths)
+        for start in range(0, len(image_paths), batch_size):
+            batch = list(range(start, min(start + batch_size, len(image_paths))))
+            
+            # Decode the batch; unreadable images are reported and skipped
+            images, indices = [], []
+            for i in batch:
+                try:
+                    images.append(Image.open(image_paths[i]).convert('RGB'))
+                    indices.append(i)
+                except Exception as e:
+                    print(f"Error analyzing image {image_paths[i]}: {str(e)}")
             
-            # Generate detailed description
-            detailed_description = self.generate_detailed_description(caption, severity)
+            # Copies of indexed images reuse the stored caption and severity
+            hashes, matches = {}, {}
+            if self.hash_index is not None:
+                for i, image in zip(indices, images):
+                    try:
+                        hashes[i] = self.hash_index.hashes(image)
+                        matches[i] = self.hash_index.find_match(hashes[i])
+                        results[i] = self._reuse_duplicate(image_paths[i], hashes[i], matches[i])
+                    except Exception as e:
+                        print(f"Error hashing image {image_paths[i]}: {str(e)}")
+                remaining = [k for k, i in enumerate(indices) if results[i] is None]
+                images = [images[k] for k in remaining]
+                indices = [indices[k] for k in remaining]
+            if not images:
+                continue
+            
+            try:
+                captions = self.predict_captions(images)
+            except Exception as e:
+                print(f"Error captioning batch starting at {image_paths[indices[0]]}: {str(e)}")
+                continue
             
-            return {
-                'image_path': image_path,
-                'caption': caption,
-                'severity': severity,
-                'detailed_description': detailed_description,
-                'analysis_date': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        except Exception as e:
-            print(f"Error analyzing image {image_path}: {str(e)}")
+            for i, caption in zip(indices, captions):
+                try:
+                    results[i] = self._build_result(image_paths[i], caption)
+                    if i in hashes:
+                        match = matches.get(i)
+                        # An entry for this same path (e.g. from bulk_build) is not a duplicate
+                        copy = match if match and match[2]['image_path'] != image_paths[i] else None
+                        results[i].update({
+                            'duplicate_of': copy[2]['image_path'] if copy else None,
+                            'hash_distance': copy[1] if copy else None
+                        })
+                        self.hash_index.record_analysis(image_paths[i], hashes[i], match,
+                                                        {'caption': caption, 'severity': results[i]['severity']})
+                except Exception as e:
+                    print(f"Error analyzing image {image_paths[i]}: {str(e)}")
+        return results
+
+    def _reuse_duplicate(self, image_path, hashes, match):
+        """Result built from an indexed copy's stored analysis, or None if there is none"""
+        if match is None or match[2]['result'] is None:
             return None
+        entry_id, distance, entry = match
+        stored = entry['result']
+        result = self._build_result(image_path, stored['caption'], stored['severity'])
+        if entry['image_path'] != image_path:
+            result.update({'duplicate_of': entry['image_path'], 'hash_distance': distance})
+            self.hash_index.insert(image_path, hashes, stored)
+        else:
+            result.update({'duplicate_of': None, 'hash_distance': None})
+        return result
+
+    def analyze_image(self, image_path):
+        """Analyze a single image and return detailed analysis"""
+        return self.analyze_images([image_path], batch_size=1)[0]
 
 def save_detailed_analysis(result, output_dir):
     """Save detailed analysis for a single image"""
@@ -317,6 +377,22 @@ def extract_severity_factors(caption):
     
     return factors
 
+def benchmark_batch_sizes(analyzer, image_paths, batch_sizes=(1, 2, 4, 8, 16)):
+    """Images/sec of ``analyze_images`` at several batch sizes"""
+    rows = []
+    for batch_size in batch_sizes:
+        start_time = time.perf_counter()
+        results = analyzer.analyze_images(image_paths, batch_size=batch_size)
+        elapsed = time.perf_counter() - start_time
+        rows.append({
+            'batch_size': batch_size,
+            'images': sum(result is not None for result in results),
+            'seconds': elapsed,
+            'images_per_sec': len(image_paths) / max(elapsed, 1e-9)
+        })
+        print(f"batch_size={batch_size}: {rows[-1]['images_per_sec']:.2f} images/sec on {analyzer.device}")
+    return pd.DataFrame(rows)
+
 def get_image_files(folder_path):
     """Recursively get all image files from folder and subfolders"""
     image_files = []
@@ -369,8 +445,19 @@ def get_image_files(folder_path):
     
     return image_files
 
-def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_folder="E:/ML/GrievanceProofs/Images/Test"):
-    """Process entire dataset and create analysis results"""
+def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_folder="E:/ML/GrievanceProofs/Images/Test", batch_size=8,
+                    decode_workers=0, queue_size=32, manifest_path=MANIFEST_PATH, since=None, scan_workers=8,
+                    hash_index_dir=HASH_INDEX_DIR):
+    """Process entire dataset and create analysis results
+
+    With ``decode_workers > 0`` images go through the pipelined
+    decode -> infer -> persist workers in ``image_pipeline.py``. With a
+    ``manifest_path`` only new or changed images are verified and analyzed
+    (``since`` further limits analysis to files modified after that point);
+    pass ``manifest_path=None`` to reprocess everything. Images matching the
+    perceptual-hash index at ``hash_index_dir`` reuse the stored caption and
+    severity (serial mode; ``None`` disables it).
+    """
     print("\nStarting dataset processing...")
     print(f"Current working directory: {os.getcwd()}")
     
@@ -385,6 +472,9 @@ def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_fold
     # Ensure directories exist
     dirs = ensure_directories()
     
+    manifest = ImageManifest(manifest_path) if manifest_path else None
+    since = parse_since(since, manifest)
+    
     # Create sample image if no images exist
     def create_sample_image(folder):
         if not os.listdir(folder):
@@ -397,13 +487,54 @@ def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_fold
     create_sample_image(train_folder)
     create_sample_image(test_folder)
     
-    analyzer = GrievanceImageAnalyzer()
+    # BLIP is only loaded once there is something to analyze
+    analyzers = []
+    def get_analyzer():
+        if not analyzers:
+            hash_index = PerceptualHashIndex(hash_index_dir) if hash_index_dir else None
+            analyzers.append(GrievanceImageAnalyzer(hash_index=hash_index))
+        return analyzers[0]
     results = []
     
     # Create results directory for detailed analyses
     details_dir = os.path.join(dirs['results'], 'detailed_analyses')
     os.makedirs(details_dir, exist_ok=True)
     
+    def analyze(image_files, dataset_type):
+        """Analyze and persist ``image_files``; returns {path: result}"""
+        analyzed = {}
+        if not image_files:
+            return analyzed
+        analyzer = get_analyzer()
+        
+        if decode_workers > 0:
+            pipeline_results, stats = run_pipeline(
+                analyzer, image_files,
+                lambda img_path, result: save_detailed_analysis(result, details_dir),
+                batch_size=batch_size, decode_workers=decode_workers, queue_size=queue_size
+            )
+            analyzed = {img_path: result for img_path, result in zip(image_files, pipeline_results) if result}
+            print(f"\nPipeline stages for {dataset_type} images:")
+            stats.report()
+            return analyzed
+        
+        start_time = time.perf_counter()
+        for start in tqdm(range(0, len(image_files), batch_size)):
+            batch_paths = image_files[start:start + batch_size]
+            batch_results = analyzer.analyze_images(batch_paths, batch_size=batch_size)
+            for img_path, result in zip(batch_paths, batch_results):
+                try:
+                    if result:
+                        analyzed[img_path] = result
+                        # Save detailed analysis
+                        save_detailed_analysis(result, details_dir)
+                except Exception as e:
+                    print(f"Error processing {img_path}: {str(e)}")
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"Analyzed {len(image_files)} {dataset_type} images at {len(image_files) / max(elapsed, 1e-9):.2f} images/sec")
+        return analyzed
+    
     def process_folder(folder_path, dataset_type):
         if not os.path.exists(folder_path):
             print(f"Warning: {dataset_type} folder not found: {folder_path}")
@@ -412,30 +543,31 @@ def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_fold
         folder_results = []
         print(f"\nProcessing {dataset_type} images...")
         
-        # Get all image files including those in subfolders
-        image_files = get_image_files(folder_path)
+        # Get all image files including those in subfolders; the manifest only verifies new or changed files
+        image_files = manifest.scan(folder_path, scan_workers) if manifest else get_image_files(folder_path)
         
         if not image_files:
             print(f"No images found in {folder_path} or its subfolders")
             return []
         
-        print(f"Found {len(image_files)} images in {dataset_type} folder")
+        to_analyze = manifest.pending(image_files, since) if manifest else image_files
+        print(f"Found {len(image_files)} images in {dataset_type} folder, {len(to_analyze)} to analyze")
         
-        for img_path in tqdm(image_files):
-            try:
+        analyzed = analyze(to_analyze, dataset_type)
+        if manifest:
+            for img_path, result in analyzed.items():
+                manifest.record(img_path, result)
+            manifest.save()
+        
+        for img_path in image_files:
+            result = analyzed.get(img_path) or (manifest.result(img_path) if manifest else None)
+            if result:
                 # Get relative category from subfolder name
                 relative_path = os.path.relpath(img_path, folder_path)
                 category = os.path.dirname(relative_path).replace('\\', '/').split('/')[0]
-                
-                result = analyzer.analyze_image(img_path)
-                if result:
-                    result['dataset'] = dataset_type
-                    result['category'] = category if category else 'uncategorized'
-                    folder_results.append(result)
-                    # Save detailed analysis
-                    save_detailed_analysis(result, details_dir)
-            except Exception as e:
-                print(f"Error processing {img_path}: {str(e)}")
+                result['dataset'] = dataset_type
+                result['category'] = category if category else 'uncategorized'
+                folder_results.append(result)
         
         return folder_results
     
@@ -480,12 +612,35 @@ def process_dataset(train_folder="E:/ML/GrievanceProofs/Images/Train", test_fold
     return df
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Grievance proof image analysis")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--decode-workers', type=int, default=0,
+                        help='Decode processes for the pipelined mode (0 runs batches serially)')
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help='Decoded images allowed to wait for inference (backpressure)')
+    parser.add_argument('--since', help="Only analyze files modified after this point (ISO date, unix time or 'last')")
+    parser.add_argument('--no-manifest', action='store_true', help='Ignore the manifest and reprocess every image')
+    parser.add_argument('--scan-workers', type=int, default=8)
+    parser.add_argument('--no-dedup', action='store_true', help='Caption every image, even known copies')
+    parser.add_argument('--benchmark', metavar='FOLDER', help='Report images/sec at several batch sizes and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        setup_env()
+        print(benchmark_batch_sizes(GrievanceImageAnalyzer(), get_image_files(args.benchmark)).to_string(index=False))
+        raise SystemExit(0)
+
     try:
         # Setup environment
         cache_dir = setup_env()
         
         # Process images
-        results_df = process_dataset()
+        results_df = process_dataset(batch_size=args.batch_size, decode_workers=args.decode_workers,
+                                     queue_size=args.queue_size,
+                                     manifest_path=None if args.no_manifest else MANIFEST_PATH,
+                                     since=args.since, scan_workers=args.scan_workers,
+                                     hash_index_dir=None if args.no_dedup else HASH_INDEX_DIR)
         
         if results_df is not None:
             print("\nAnalysis completed successfully!")
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+HASH_INDEX_DIR = 'E:/ML/GrievanceProofs/results/phash_index'
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def dhash(image, hash_size=8):
+    """Difference hash: sign of horizontal gradients on a (hash_size+1) x hash_size thumbnail"""
+    pixels = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.float64)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+_DCT_CACHE = {}
+
+def _dct_matrix(n):
+    if n not in _DCT_CACHE:
+        k = np.arange(n)[:, np.newaxis]
+        _DCT_CACHE[n] = np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n))
+    return _DCT_CACHE[n]
+
+def phash(image, hash_size=8, highfreq_factor=4):
+    """Perceptual hash: low-frequency 2D DCT coefficients of a small thumbnail above their median"""
+    size = hash_size * highfreq_factor
+    pixels = np.asarray(image.convert('L').resize((size, size), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(size)
+    low = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+def image_hashes(image, hash_size=8):
+    """``(phash, dhash)`` of a PIL image or path"""
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            return image_hashes(img.convert('RGB'), hash_size)
+    return phash(image, hash_size), dhash(image, hash_size)
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance.
+
+    Nodes are ``[hash, ids, children]`` with children keyed by distance, so a
+    query only descends into children within ``max_distance`` of the parent
+    distance (triangle inequality).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = node[2][distance]
+
+    def query(self, value, max_distance):
+        """``[(distance, item)]`` for every hash within ``max_distance``, nearest first"""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches, key=lambda match: match[0])
+
+class PerceptualHashIndex:
+    """pHash/dHash index of proof images with an append-only log on disk.
+
+    Candidates come from a BK-tree over pHash (within ``max_distance`` bits)
+    and are confirmed by dHash (within ``dhash_distance`` bits), which keeps
+    re-encodes, resizes and light crops while rejecting chance pHash hits.
+    Entries store the analysis (caption, severity, ...) so copies can reuse
+    it instead of running the captioning model again.
+    """
+
+    def __init__(self, store_dir=HASH_INDEX_DIR, max_distance=10, dhash_distance=12, hash_size=8):
+        self.store_dir = store_dir
+        self.config = {'hash_size': hash_size}
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.dhash_distance = dhash_distance
+        self.entries = {}
+        self.tree = BKTree()
+        self._load()
+
+    # Persistence
+    def _log_path(self):
+        return os.path.join(self.store_dir, 'index.jsonl')
+
+    def _load(self):
+        meta_path = os.path.join(self.store_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                stored = json.load(f)
+            if stored != self.config:
+                raise ValueError(f"Index at {self.store_dir} was built with {stored}, not {self.config}")
+        if not os.path.exists(self._log_path()):
+            return
+        with open(self._log_path(), encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._apply(json.loads(line))
+        print(f"Loaded {len(self.entries)} image hashes from {self.store_dir}")
+
+    def _append(self, records):
+        os.makedirs(self.store_dir, exist_ok=True)
+        meta_path = os.path.join(self.store_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump(self.config, f, indent=2)
+        with open(self._log_path(), 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _apply(self, record):
+        if record['op'] == 'result':
+            self.entries[record['id']]['result'] = record['result']
+            return
+        entry_id = record['id']
+        self.entries[entry_id] = {
+            'image_path': record['image_path'],
+            'phash': int(record['phash'], 16),
+            'dhash': int(record['dhash'], 16),
+            'timestamp': record['timestamp'],
+            'result': record.get('result'),
+        }
+        self.tree.add(self.entries[entry_id]['phash'], entry_id)
+
+    # Queries
+    def hashes(self, image):
+        return image_hashes(image, self.hash_size)
+
+    def query(self, image=None, hashes=None):
+        """Matching entries, nearest first: ``[(id, phash_distance)]``"""
+        phash_value, dhash_value = hashes if hashes is not None else self.hashes(image)
+        return [
+            (entry_id, distance)
+            for distance, entry_id in self.tree.query(phash_value, self.max_distance)
+            if hamming(dhash_value, self.entries[entry_id]['dhash']) <= self.dhash_distance
+        ]
+
+    def find_match(self, hashes):
+        """Nearest match as ``(id, distance, entry)``, preferring entries with a stored result; None if new"""
+        matches = self.query(hashes=hashes)
+        if not matches:
+            return None
+        entry_id, distance = next(
+            ((e, d) for e, d in matches if self.entries[e]['result'] is not None), matches[0]
+        )
+        return entry_id, distance, self.entries[entry_id]
+
+    def record_analysis(self, image_path, hashes, match, result):
+        """Store a fresh analysis on a result-less match (e.g. bulk-built) and index new paths"""
+        if match is not None and match[2]['result'] is None:
+            self.set_result(match[0], result)
+        if match is None or match[2]['image_path'] != image_path:
+            self.insert(image_path, hashes, result)
+
+    # Updates
+    def _record(self, image_path, hashes, result):
+        entry_id = len(self.entries)
+        record = {
+            'op': 'insert',
+            'id': entry_id,
+            'image_path': image_path,
+            'phash': format(hashes[0], 'x'),
+            'dhash': format(hashes[1], 'x'),
+            'timestamp': time.time(),
+            'result': result,
+        }
+        self._apply(record)
+        return record
+
+    def insert(self, image_path, hashes=None, result=None):
+        """Add one image; returns its entry id"""
+        hashes = hashes if hashes is not None else self.hashes(image_path)
+        record = self._record(image_path, hashes, result)
+        self._append([record])
+        return record['id']
+
+    def set_result(self, entry_id, result):
+        record = {'op': 'result', 'id': entry_id, 'result': result}
+        self._apply(record)
+        self._append([record])
+
+    def bulk_build(self, image_paths, workers=8):
+        """Hash many images on a thread pool and append them in one write"""
+        start_time = time.perf_counter()
+
+        def safe_hashes(path):
+            try:
+                return self.hashes(path)
+            except Exception as e:
+                print(f"Could not hash {path}: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashed = list(pool.map(safe_hashes, image_paths))
+        records = [self._record(path, hashes, None) for path, hashes in zip(image_paths, hashed) if hashes]
+        self._append(records)
+        elapsed = time.perf_counter() - start_time
+        print(f"Indexed {len(records)} images in {elapsed:.1f}s ({len(records) / max(elapsed, 1e-9):.0f} images/sec)")
+        return len(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perceptual-hash index for duplicate proof images")
+    parser.add_argument('--index', default=HASH_INDEX_DIR)
+    parser.add_argument('--build', metavar='FOLDER', help='Hash every image under FOLDER into the index')
+    parser.add_argument('--query', metavar='IMAGE', help='List indexed images matching IMAGE')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    index = PerceptualHashIndex(args.index)
+    if args.build:
+        paths = sorted(
+            os.path.join(root, file)
+            for root, _, files in os.walk(args.build)
+            for file in files if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
+        )
+        index.bulk_build(paths, args.workers)
+    if args.query:
+        for entry_id, distance in index.query(args.query):
+            print(f"{distance:2d} bits  {index.entries[entry_id]['image_path']}")
@@ -0,0 +1,127 @@
+import io
+import os
+import json
+import time
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+MANIFEST_PATH = 'E:/ML/GrievanceProofs/results/image_manifest.json'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+def parse_since(value, manifest=None):
+    """Unix time from an ISO date/datetime, a number, or 'last' (start of the previous run)"""
+    if value is None:
+        return None
+    if value == 'last':
+        return manifest.last_run if manifest is not None else None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def _inspect(path, entry):
+    """Stat a file and, if it changed since ``entry``, hash and verify it"""
+    try:
+        stat = os.stat(path)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return path, entry, False
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        # Keep the failure but no size/mtime, so the next scan inspects the file again
+        return path, {'size': None, 'mtime': None, 'valid': False, 'error': str(e), 'result': None}, True
+    sha256 = hashlib.sha256(data).hexdigest()
+    if entry and entry.get('sha256') == sha256:
+        # Touched but identical: keep verification and stored result
+        return path, dict(entry, size=stat.st_size, mtime=stat.st_mtime), True
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+        valid, error = True, None
+    except Exception as e:
+        valid, error = False, str(e)
+    return path, {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': sha256,
+        'valid': valid,
+        'error': error,
+        'result': None,
+    }, True
+
+class ImageManifest:
+    """Persistent record of proof images keyed by path.
+
+    Each entry keeps size, mtime, SHA-256, verification status and the stored
+    analysis result. Unchanged files (same size and mtime) are neither
+    re-opened nor re-analyzed; changed files are re-hashed and only
+    re-verified/analyzed when their content differs.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        self.last_run = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = data.get('entries', {})
+            self.last_run = data.get('last_run')
+        self.run_started = time.time()
+
+    def scan(self, folder_path, workers=8):
+        """Valid image paths under ``folder_path``, verifying only new or changed files"""
+        start_time = time.perf_counter()
+        paths = sorted(
+            os.path.join(root, file)
+            for root, _, files in os.walk(folder_path)
+            for file in files if file.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            inspected = list(pool.map(lambda p: _inspect(p, self.entries.get(p)), paths))
+
+        changed = 0
+        for path, entry, was_changed in inspected:
+            self.entries[path] = entry
+            changed += was_changed
+            if was_changed and not entry['valid']:
+                print(f"Invalid or corrupted image {path}: {entry['error']}")
+
+        # Forget files that were removed from the folder
+        prefix = os.path.join(os.path.normpath(folder_path), '')
+        seen = set(paths)
+        for path in [p for p in self.entries if p.startswith(prefix) and p not in seen]:
+            del self.entries[path]
+
+        valid = [path for path in paths if self.entries[path]['valid']]
+        print(f"Scanned {len(paths)} files in {time.perf_counter() - start_time:.2f}s: "
+              f"{changed} new or changed, {len(valid)} valid")
+        return valid
+
+    def pending(self, paths, since=None):
+        """Paths without a stored result, optionally only those modified after ``since``"""
+        return [
+            path for path in paths
+            if self.entries[path].get('result') is None
+            and (since is None or self.entries[path]['mtime'] > since)
+        ]
+
+    def result(self, path):
+        entry = self.entries.get(path)
+        return dict(entry['result']) if entry and entry.get('result') else None
+
+    def record(self, path, result):
+        if path in self.entries and result is not None:
+            self.entries[path]['result'] = {key: value for key, value in result.items()
+                                            if key not in ('dataset', 'category')}
+
+    def save(self):
+        """Atomic write; the run start becomes ``last_run`` for ``--since last``"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_run': self.run_started, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,180 @@
+import time
+import queue
+import threading
+import numpy as np
+import pandas as pd
+import torch
+from PIL import Image
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+# Set in each decode worker by _init_worker
+_WORKER = {}
+
+def _init_worker(image_processor, shm_name, slots_shape):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['image_processor'] = image_processor
+    _WORKER['shm'] = shm
+    _WORKER['slots'] = np.ndarray(slots_shape, dtype=np.float32, buffer=shm.buf)
+
+def _decode_into_slot(image_path, slot):
+    """Decode, convert and preprocess one image straight into its shared-memory slot"""
+    start_time = time.perf_counter()
+    try:
+        image = Image.open(image_path).convert('RGB')
+        pixel_values = _WORKER['image_processor'](images=image, return_tensors='np')['pixel_values'][0]
+        _WORKER['slots'][slot] = pixel_values
+        error = None
+    except Exception as e:
+        error = str(e)
+    return image_path, slot, time.perf_counter() - start_time, error
+
+class PipelineStats:
+    """Busy and blocked time per stage, to show which one limits throughput"""
+
+    def __init__(self, decode_workers):
+        self.decode_workers = decode_workers
+        self.stages = {stage: {'items': 0, 'busy': 0.0, 'blocked': 0.0} for stage in ['decode', 'infer', 'persist']}
+        self.lock = threading.Lock()
+        self.wall = 0.0
+
+    def add(self, stage, items=0, busy=0.0, blocked=0.0):
+        with self.lock:
+            self.stages[stage]['items'] += items
+            self.stages[stage]['busy'] += busy
+            self.stages[stage]['blocked'] += blocked
+
+    def report(self):
+        rows = []
+        for stage, stats in self.stages.items():
+            # Decode runs on several processes, so its wall-clock share is busy / workers
+            parallel = self.decode_workers if stage == 'decode' else 1
+            rows.append({
+                'stage': stage,
+                'items': stats['items'],
+                'busy_seconds': stats['busy'] / parallel,
+                'blocked_seconds': stats['blocked'],
+                'utilization': stats['busy'] / parallel / max(self.wall, 1e-9),
+            })
+        report = pd.DataFrame(rows)
+        print(report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        bottleneck = report.loc[report['busy_seconds'].idxmax(), 'stage']
+        print(f"Bottleneck stage: {bottleneck} ({self.wall:.1f}s wall)")
+        return report
+
+def run_pipeline(analyzer, image_paths, persist, batch_size=8, decode_workers=4, queue_size=32, write_queue_size=4):
+    """Decode -> infer -> persist with bounded queues between the stages.
+
+    - decode: a process pool turns paths into preprocessed pixel values in a
+      ring of ``queue_size`` shared-memory slots; when all slots are taken the
+      feeder blocks, which bounds memory and applies backpressure;
+    - infer: the calling thread gathers full batches of decoded slots, frees
+      them and runs one ``caption_pixel_values`` call per batch;
+    - persist: a writer thread calls ``persist(path, result)`` for each
+      result, fed through a queue of at most ``write_queue_size`` batches.
+
+    Returns ``(results, stats)`` with results in input order (None for images
+    that failed to decode).
+    """
+    slot_count = max(queue_size, batch_size)
+    image_processor = analyzer.processor.image_processor
+    sample = image_processor(images=Image.new('RGB', (32, 32)), return_tensors='np')['pixel_values'][0]
+    slots_shape = (slot_count,) + sample.shape
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(slots_shape)) * 4)
+    slots = np.ndarray(slots_shape, dtype=np.float32, buffer=shm.buf)
+
+    stats = PipelineStats(decode_workers)
+    free_slots = queue.Queue()
+    for slot in range(slot_count):
+        free_slots.put(slot)
+    decoded = queue.Queue(maxsize=slot_count)
+    to_write = queue.Queue(maxsize=write_queue_size)
+    results = [None] * len(image_paths)
+    start_time = time.perf_counter()
+
+    def feed(pool):
+        for i, image_path in enumerate(image_paths):
+            wait_start = time.perf_counter()
+            slot = free_slots.get()
+            stats.add('decode', blocked=time.perf_counter() - wait_start)
+            decoded.put((i, pool.submit(_decode_into_slot, image_path, slot)))
+        decoded.put(None)
+
+    def write():
+        while True:
+            batch = to_write.get()
+            if batch is None:
+                return
+            busy_start = time.perf_counter()
+            for i, result in batch:
+                try:
+                    persist(image_paths[i], result)
+                except Exception as e:
+                    print(f"Error saving {image_paths[i]}: {str(e)}")
+            stats.add('persist', items=len(batch), busy=time.perf_counter() - busy_start)
+
+    def infer(batch):
+        busy_start = time.perf_counter()
+        indices = [i for i, _ in batch]
+        pixel_values = torch.from_numpy(np.stack([slots[slot] for _, slot in batch]))
+        for _, slot in batch:
+            free_slots.put(slot)
+        written = []
+        try:
+            captions = analyzer.caption_pixel_values(pixel_values)
+        except Exception as e:
+            # Like the serial path: skip the batch (its results stay None) and keep going
+            print(f"Error captioning batch starting at {image_paths[indices[0]]}: {str(e)}")
+            captions = []
+        for i, caption in zip(indices, captions):
+            try:
+                results[i] = analyzer._build_result(image_paths[i], caption)
+                written.append((i, results[i]))
+            except Exception as e:
+                print(f"Error analyzing image {image_paths[i]}: {str(e)}")
+        stats.add('infer', items=len(batch), busy=time.perf_counter() - busy_start)
+        if not written:
+            return
+
+        wait_start = time.perf_counter()
+        to_write.put(written)
+        stats.add('infer', blocked=time.perf_counter() - wait_start)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        with ProcessPoolExecutor(max_workers=decode_workers, initializer=_init_worker,
+                                 initargs=(image_processor, shm.name, slots_shape)) as pool:
+            feeder = threading.Thread(target=feed, args=(pool,), daemon=True)
+            feeder.start()
+
+            batch = []
+            while True:
+                wait_start = time.perf_counter()
+                item = decoded.get()
+                if item is None:
+                    break
+                i, future = item
+                image_path, slot, seconds, error = future.result()
+                stats.add('infer', blocked=time.perf_counter() - wait_start)
+                stats.add('decode', items=1, busy=seconds)
+                if error:
+                    print(f"Error analyzing image {image_path}: {error}")
+                    free_slots.put(slot)
+                    continue
+                batch.append((i, slot))
+                if len(batch) == batch_size:
+                    infer(batch)
+                    batch = []
+            if batch:
+                infer(batch)
+            feeder.join()
+    finally:
+        to_write.put(None)
+        writer.join()
+        slots = None  # Drop the view into the buffer, or close() raises BufferError
+        shm.close()
+        shm.unlink()
+
+    stats.wall = time.perf_counter() - start_time
+    return results, stats
@@ -1,3 +1,4 @@
+import time
 import torch
 from transformers import VisionEncoderDecoderModel, ViTFeatureExtractor, AutoTokenizer, ViTForImageClassification
 from PIL import Image
@@ -7,10 +8,16 @@ from tqdm import tqdm
 import json
 import numpy as np
 from datetime import datetime
+from image_hashes import PerceptualHashIndex
+
+# ViT-GPT2 captions differ from BLIP's, so this analyzer keeps its own index
+HASH_INDEX_DIR = 'E:/ML/GrievanceProofs/results/phash_index_vitgpt2'
 
 class GrievanceAnalyzer:
-    def __init__(self):
+    def __init__(self, hash_index=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # Optional PerceptualHashIndex; copies of indexed images skip captioning
+        self.hash_index = hash_index
         self.cache_dir = self._setup_cache()
         self._load_models()
         self._setup_severity_rules()
@@ -65,19 +72,72 @@ class GrievanceAnalyzer:
             'rural': 1
         }
 
-    def analyze_image(self, image_path):
-        try:
-            # Load and verify image
-            image = Image.open(image_path).convert('RGB')
+    def analyze_images(self, image_paths, batch_size=8):
+        """Analyze images in batches with one ``generate`` call per batch.
+
+        Returns one result (or None on error) per path, in order.
+        """
+        results = [None] * len(image_paths)
+        for start in range(0, len(image_paths), batch_size):
+            images, indices = [], []
+            for i in range(start, min(start + batch_size, len(image_paths))):
+                try:
+                    images.append(Image.open(image_paths[i]).convert('RGB'))
+                    indices.append(i)
+                except Exception as e:
+                    print(f"Error analyzing {image_paths[i]}: {str(e)}")
             
-            # Generate caption
-            caption = self._generate_caption(image)
+            # Copies of indexed images reuse the stored caption, category and severity
+            hashes, matches = {}, {}
+            if self.hash_index is not None:
+                for i, image in zip(indices, images):
+                    try:
+                        hashes[i] = self.hash_index.hashes(image)
+                        matches[i] = self.hash_index.find_match(hashes[i])
+                    except Exception as e:
+                        print(f"Error hashing {image_paths[i]}: {str(e)}")
+                reusable = {i for i, match in matches.items() if match and match[2]['result'] is not None}
+                for i, image in zip(indices, images):
+                    if i in reusable:
+                        results[i] = self._build_result(image_paths[i], image, None, matches[i])
+                        if results[i] and matches[i][2]['image_path'] != image_paths[i]:
+                            self.hash_index.insert(image_paths[i], hashes[i], matches[i][2]['result'])
+                remaining = [k for k, i in enumerate(indices) if i not in reusable]
+                images = [images[k] for k in remaining]
+                indices = [indices[k] for k in remaining]
+            if not images:
+                continue
             
-            # Determine category
-            category = self._determine_category(caption)
+            try:
+                captions = self._generate_captions(images)
+            except Exception as e:
+                print(f"Error captioning batch starting at {image_paths[indices[0]]}: {str(e)}")
+                continue
             
-            # Analyze severity
-            severity, severity_factors = self._analyze_severity(caption, category)
+            for i, image, caption in zip(indices, images, captions):
+                results[i] = self._build_result(image_paths[i], image, caption, matches.get(i))
+                if results[i] and i in hashes:
+                    self.hash_index.record_analysis(image_paths[i], hashes[i], matches.get(i), {
+                        key: results[i][key] for key in ['caption', 'category', 'severity', 'severity_factors']
+                    })
+        return results
+
+    def analyze_image(self, image_path):
+        return self.analyze_images([image_path], batch_size=1)[0]
+
+    def _build_result(self, image_path, image, caption, match=None):
+        try:
+            if match and match[2]['result'] is not None:
+                # Reuse the analysis stored for the matching image
+                stored = match[2]['result']
+                caption, category = stored['caption'], stored['category']
+                severity, severity_factors = stored['severity'], stored['severity_factors']
+            else:
+                # Determine category
+                category = self._determine_category(caption)
+                
+                # Analyze severity
+                severity, severity_factors = self._analyze_severity(caption, category)
             
             # Generate detailed description
             description = self._generate_detailed_description(caption, category, severity, severity_factors)
@@ -93,6 +153,7 @@ class GrievanceAnalyzer:
                 'severity_factors': severity_factors,
                 'detailed_description': description,
                 'authenticity': authenticity,
+                'duplicate_of': self._describe_match(match, image_path),
                 'analysis_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
@@ -130,8 +191,8 @@ class GrievanceAnalyzer:
         
         return ' '.join(caption_parts)
 
-    def _generate_caption(self, image):
-        pixel_values = self.feature_extractor(image, return_tensors="pt").pixel_values.to(self.device)
+    def _generate_captions(self, images):
+        pixel_values = self.feature_extractor(images, return_tensors="pt").pixel_values.to(self.device)
         
         with torch.no_grad():
             output_ids = self.caption_model.generate(
@@ -141,9 +202,11 @@ class GrievanceAnalyzer:
                 num_return_sequences=1
             )
         
-        basic_caption = self.tokenizer.decode(output_ids[0], skip_special_tokens=True)
-        enhanced_caption = self._enhance_caption_with_context(basic_caption)
-        return enhanced_caption
+        basic_captions = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        return [self._enhance_caption_with_context(caption) for caption in basic_captions]
+
+    def _generate_caption(self, image):
+        return self._generate_captions([image])[0]
 
     def _determine_category(self, caption):
         caption_lower = caption.lower()
@@ -206,6 +269,13 @@ class GrievanceAnalyzer:
         
         return description
 
+    def _describe_match(self, match, image_path):
+        """Earlier upload this image copies, reported next to the authenticity check"""
+        if not match or match[2]['image_path'] == image_path:
+            return None
+        entry_id, distance, entry = match
+        return {'image_path': entry['image_path'], 'hash_distance': distance}
+
     def _check_image_authenticity(self, image):
         # Basic image authenticity checks
         authenticity_score = 100
@@ -228,18 +298,20 @@ class GrievanceAnalyzer:
             'status': 'Likely Authentic' if authenticity_score > 70 else 'Possible Manipulation'
         }
 
-    def process_folder(self, input_folder, output_file):
+    def process_folder(self, input_folder, output_file, batch_size=8):
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         results = []
         
         image_files = [f for f in os.listdir(input_folder) 
                       if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
+        image_paths = [os.path.join(input_folder, image_file) for image_file in image_files]
         
-        for image_file in tqdm(image_files):
-            image_path = os.path.join(input_folder, image_file)
-            result = self.analyze_image(image_path)
-            if result:
-                results.append(result)
+        start_time = time.perf_counter()
+        for start in tqdm(range(0, len(image_paths), batch_size)):
+            batch_results = self.analyze_images(image_paths[start:start + batch_size], batch_size)
+            results.extend(result for result in batch_results if result)
+        elapsed = time.perf_counter() - start_time
+        print(f"Analyzed {len(image_paths)} images at {len(image_paths) / max(elapsed, 1e-9):.2f} images/sec")
         
         # Save results
         df = pd.DataFrame(results)
@@ -248,7 +320,7 @@ class GrievanceAnalyzer:
         return df
 
 if __name__ == "__main__":
-    analyzer = GrievanceAnalyzer()
+    analyzer = GrievanceAnalyzer(hash_index=PerceptualHashIndex(HASH_INDEX_DIR))
     
     # Use correct train/test folders
     train_folder = "E:/ML/GrievanceProofs/Images/Train"
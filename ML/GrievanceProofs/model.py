@@ -1,6 +1,6 @@
 import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
+from model_registry import load_blip
 import os
 from tqdm import tqdm
 import pandas as pd
@@ -48,27 +48,9 @@ class DetailedImageAnalyzer:
         if cache_dir is None:
             cache_dir = 'E:/ML/ModelCache'
         
-        # Load BLIP model and processor
+        # Load BLIP model and processor; the local snapshot is written once and shared per process
         print("Loading BLIP model and processor...")
-        self.processor = BlipProcessor.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            local_files_only=False
-        )
-        
-        self.model = BlipForConditionalGeneration.from_pretrained(
-            model_name,
-            cache_dir=cache_dir,
-            local_files_only=False
-        ).to(self.device)
-        
-        # Save models locally to E drive
-        save_dir = 'E:/ML/GrievanceProofs/saved_models'
-        os.makedirs(save_dir, exist_ok=True)
-        
-        print("Saving models locally...")
-        self.model.save_pretrained(os.path.join(save_dir, 'blip_model'))
-        self.processor.save_pretrained(os.path.join(save_dir, 'blip_processor'))
+        self.processor, self.model = load_blip(model_name, cache_dir, self.device)
         
         # Description templates
         self.description_templates = {
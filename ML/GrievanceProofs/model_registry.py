@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import threading
+import subprocess
+import torch
+from transformers import BlipProcessor, BlipForConditionalGeneration
+
+DEFAULT_MODEL = "Salesforce/blip-image-captioning-base"
+SNAPSHOT_DIR = 'E:/ML/GrievanceProofs/saved_models'
+CACHE_DIR = 'E:/ML/ModelCache'
+
+# (model_name, device) -> (processor, model), shared by every analyzer in the process
+_REGISTRY = {}
+_LOCK = threading.Lock()
+
+def snapshot_paths(model_name=DEFAULT_MODEL, snapshot_dir=SNAPSHOT_DIR):
+    """Model and processor snapshot directories; the default model keeps the original layout"""
+    suffix = '' if model_name == DEFAULT_MODEL else '--' + model_name.replace('/', '--')
+    return (os.path.join(snapshot_dir, 'blip_model' + suffix),
+            os.path.join(snapshot_dir, 'blip_processor' + suffix))
+
+def has_snapshot(model_name=DEFAULT_MODEL, snapshot_dir=SNAPSHOT_DIR):
+    """True when a safetensors model snapshot and its processor are saved locally"""
+    model_dir, processor_dir = snapshot_paths(model_name, snapshot_dir)
+    return (os.path.exists(os.path.join(model_dir, 'config.json'))
+            and os.path.exists(os.path.join(model_dir, 'model.safetensors'))
+            and os.path.isdir(processor_dir) and bool(os.listdir(processor_dir)))
+
+def _load(model_name, cache_dir, snapshot_dir, device):
+    model_dir, processor_dir = snapshot_paths(model_name, snapshot_dir)
+    if has_snapshot(model_name, snapshot_dir):
+        print(f"Loading BLIP snapshot from {model_dir}...")
+        processor = BlipProcessor.from_pretrained(processor_dir, local_files_only=True)
+        # safetensors weights are memory-mapped and loaded without a random init pass
+        model = BlipForConditionalGeneration.from_pretrained(
+            model_dir, local_files_only=True, use_safetensors=True, low_cpu_mem_usage=True
+        )
+    else:
+        # Older snapshots saved .bin weights; convert them instead of going to the cache
+        legacy = os.path.exists(os.path.join(model_dir, 'config.json')) and os.path.isdir(processor_dir)
+        print("Converting BLIP snapshot to safetensors..." if legacy else "No local snapshot, loading BLIP from the model cache...")
+        try:
+            processor = BlipProcessor.from_pretrained(processor_dir if legacy else model_name,
+                                                      cache_dir=cache_dir, local_files_only=True)
+            model = BlipForConditionalGeneration.from_pretrained(
+                model_dir if legacy else model_name, cache_dir=cache_dir, local_files_only=True, low_cpu_mem_usage=True
+            )
+        except OSError as e:
+            raise OSError(f"{model_name} is not in {cache_dir}; run: python model_registry.py --download") from e
+
+        # First run only: write the snapshot once
+        print(f"Saving snapshot to {model_dir}...")
+        os.makedirs(snapshot_dir, exist_ok=True)
+        model.save_pretrained(model_dir, safe_serialization=True)
+        processor.save_pretrained(processor_dir)
+    return processor, model.to(device).eval()
+
+def load_blip(model_name=DEFAULT_MODEL, cache_dir=CACHE_DIR, device=None, snapshot_dir=SNAPSHOT_DIR):
+    """Shared ``(processor, model)`` for a BLIP checkpoint; never touches the network"""
+    device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    key = (model_name, str(device))
+    with _LOCK:
+        if key not in _REGISTRY:
+            _REGISTRY[key] = _load(model_name, cache_dir, snapshot_dir, device)
+        return _REGISTRY[key]
+
+def download_blip(model_name=DEFAULT_MODEL, cache_dir=CACHE_DIR):
+    """Explicit network step: fetch the checkpoint into the model cache"""
+    BlipProcessor.from_pretrained(model_name, cache_dir=cache_dir)
+    BlipForConditionalGeneration.from_pretrained(model_name, cache_dir=cache_dir)
+    print(f"{model_name} downloaded to {cache_dir}")
+
+# Each strategy runs in a fresh interpreter so nothing is warm
+_LEGACY = r'''
+import os, sys, time, tempfile
+start = time.perf_counter()
+from transformers import BlipProcessor, BlipForConditionalGeneration
+processor = BlipProcessor.from_pretrained(sys.argv[1], cache_dir=sys.argv[2], local_files_only=True)
+model = BlipForConditionalGeneration.from_pretrained(sys.argv[1], cache_dir=sys.argv[2], local_files_only=True)
+with tempfile.TemporaryDirectory() as save_dir:
+    model.save_pretrained(os.path.join(save_dir, 'blip_model'))
+    processor.save_pretrained(os.path.join(save_dir, 'blip_processor'))
+    print(time.perf_counter() - start)
+'''
+
+_SNAPSHOT = r'''
+import sys, time
+start = time.perf_counter()
+from model_registry import load_blip
+first = load_blip(sys.argv[1], sys.argv[2])
+second = load_blip(sys.argv[1], sys.argv[2])
+assert first[1] is second[1]
+print(time.perf_counter() - start)
+'''
+
+def benchmark_cold_start(model_name=DEFAULT_MODEL, cache_dir=CACHE_DIR, repeats=3):
+    """Seconds to a ready model: load + save_pretrained every start vs the snapshot registry"""
+    if not has_snapshot(model_name):
+        load_blip(model_name, cache_dir)
+    env = dict(os.environ, HF_HUB_OFFLINE='1', TRANSFORMERS_OFFLINE='1')
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, script in [('load_and_save', _LEGACY), ('snapshot_registry', _SNAPSHOT)]:
+        times = []
+        for _ in range(repeats):
+            proc = subprocess.run([sys.executable, '-c', script, model_name, cache_dir],
+                                  cwd=here, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(f"{name} failed: {proc.stderr.strip().splitlines()[-1:]}")
+            times.append(float(proc.stdout.strip().splitlines()[-1]))
+        results[name] = min(times)
+        print(f"{name}: {results[name]:.2f}s (best of {repeats})")
+    print(f"Speedup: {results['load_and_save'] / results['snapshot_registry']:.1f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BLIP snapshot loading and cold-start benchmark")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--download', action='store_true', help='Fetch the checkpoint (network) and write the snapshot')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.download:
+        download_blip(args.model, args.cache_dir)
+        load_blip(args.model, args.cache_dir)
+    if args.benchmark:
+        print(json.dumps(benchmark_cold_start(args.model, args.cache_dir), indent=2))
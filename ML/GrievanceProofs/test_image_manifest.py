@@ -0,0 +1,33 @@
+import os
+from PIL import Image
+import image_manifest
+from image_manifest import ImageManifest
+
+def test_rescan_after_stat_failure(tmp_path, monkeypatch):
+    folder = tmp_path / 'images'
+    folder.mkdir()
+    image_path = str(folder / 'proof.png')
+    Image.new('RGB', (16, 16), color='red').save(image_path)
+    manifest_path = str(tmp_path / 'manifest.json')
+
+    manifest = ImageManifest(manifest_path)
+    assert manifest.scan(str(folder)) == [image_path]
+    manifest.save()
+
+    # The file is listed but cannot be stat'ed (e.g. removed mid-scan)
+    real_stat = os.stat
+    def failing_stat(path, *args, **kwargs):
+        if path == image_path:
+            raise OSError("stat failed")
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(image_manifest.os, 'stat', failing_stat)
+    manifest = ImageManifest(manifest_path)
+    assert manifest.scan(str(folder)) == []
+    assert manifest.entries[image_path]['valid'] is False
+    manifest.save()
+
+    # The next incremental run must not break and re-verifies the file
+    monkeypatch.setattr(image_manifest.os, 'stat', real_stat)
+    manifest = ImageManifest(manifest_path)
+    assert manifest.scan(str(folder)) == [image_path]
+    assert manifest.pending([image_path]) == [image_path]
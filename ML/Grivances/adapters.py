@@ -0,0 +1,253 @@
+import os
+import json
+import math
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from sklearn.model_selection import train_test_split
+from transformers import AutoModel, AutoTokenizer, Trainer, TrainingArguments
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+
+BASE_ENCODER = 'bert-base-multilingual-cased'
+ADAPTER_DIR = 'E:/ML/Grivances/impact_models/adapters'
+
+class LoRALinear(nn.Module):
+    """Frozen ``nn.Linear`` plus any number of named low-rank updates.
+
+    Only the adapters listed in ``active`` contribute, so one base layer can
+    serve many targets and several adapters can be stacked.
+    """
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+        for param in self.base.parameters():
+            param.requires_grad = False
+        self.lora_A = nn.ParameterDict()
+        self.lora_B = nn.ParameterDict()
+        self.scaling = {}
+        self.active = []
+
+    def add_adapter(self, name, r=8, alpha=16):
+        self.lora_A[name] = nn.Parameter(torch.empty(r, self.base.in_features))
+        self.lora_B[name] = nn.Parameter(torch.zeros(self.base.out_features, r))
+        nn.init.kaiming_uniform_(self.lora_A[name], a=math.sqrt(5))
+        self.scaling[name] = alpha / r
+
+    def forward(self, x):
+        result = self.base(x)
+        for name in self.active:
+            result = result + (x @ self.lora_A[name].t() @ self.lora_B[name].t()) * self.scaling[name]
+        return result
+
+def inject_lora(encoder, target_modules=('query', 'value')):
+    """Replace attention projections in ``encoder`` with LoRALinear wrappers"""
+    wrapped = {}
+    for module_name, module in list(encoder.named_modules()):
+        for child_name, child in list(module.named_children()):
+            if child_name in target_modules and isinstance(child, nn.Linear):
+                lora = LoRALinear(child)
+                setattr(module, child_name, lora)
+                wrapped[f"{module_name}.{child_name}"] = lora
+    return wrapped
+
+class SharedEncoderClassifier(nn.Module):
+    """One frozen encoder shared by per-target LoRA adapters and heads"""
+
+    def __init__(self, encoder_name=BASE_ENCODER, target_modules=('query', 'value')):
+        super().__init__()
+        self.encoder_name = encoder_name
+        self.encoder = AutoModel.from_pretrained(encoder_name)
+        for param in self.encoder.parameters():
+            param.requires_grad = False
+        self.lora_layers = inject_lora(self.encoder, target_modules)
+        self.heads = nn.ModuleDict()
+        self.adapter_config = {}
+        self.active_head = None
+
+    def add_adapter(self, name, num_labels, r=8, alpha=16):
+        for layer in self.lora_layers.values():
+            layer.add_adapter(name, r, alpha)
+        self.heads[name] = nn.Linear(self.encoder.config.hidden_size, num_labels)
+        self.adapter_config[name] = {'num_labels': num_labels, 'r': r, 'alpha': alpha}
+        self.to(next(self.encoder.parameters()).device)
+
+    def set_adapter(self, names, head=None):
+        """Activate one adapter, or stack several; the head defaults to the last"""
+        names = [names] if isinstance(names, str) else list(names)
+        for layer in self.lora_layers.values():
+            layer.active = names
+        self.active_head = head or names[-1]
+
+    def adapter_parameters(self, name):
+        params = [layer.lora_A[name] for layer in self.lora_layers.values()]
+        params += [layer.lora_B[name] for layer in self.lora_layers.values()]
+        return params + list(self.heads[name].parameters())
+
+    def forward(self, input_ids, attention_mask=None, labels=None):
+        outputs = self.encoder(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
+        logits = self.heads[self.active_head](outputs.pooler_output)
+        if labels is not None:
+            loss = nn.functional.cross_entropy(logits, labels)
+            return {'loss': loss, 'logits': logits}
+        return {'logits': logits}
+
+    def save_adapter(self, name, path, label_encoder=None):
+        """Save only the LoRA weights and head for ``name`` (a few MB)"""
+        os.makedirs(path, exist_ok=True)
+        state = {
+            'lora_A': {key: layer.lora_A[name].detach().cpu() for key, layer in self.lora_layers.items()},
+            'lora_B': {key: layer.lora_B[name].detach().cpu() for key, layer in self.lora_layers.items()},
+            'head': {k: v.detach().cpu() for k, v in self.heads[name].state_dict().items()},
+        }
+        torch.save(state, os.path.join(path, 'adapter.pt'))
+        with open(os.path.join(path, 'adapter_config.json'), 'w') as f:
+            json.dump({'name': name, 'base_encoder': self.encoder_name, **self.adapter_config[name]}, f, indent=2)
+        if label_encoder is not None:
+            with open(os.path.join(path, 'label_encoder.pkl'), 'wb') as f:
+                pickle.dump(label_encoder, f)
+
+    def load_adapter(self, path):
+        """Load an adapter saved by ``save_adapter``; returns its label encoder"""
+        with open(os.path.join(path, 'adapter_config.json')) as f:
+            config = json.load(f)
+        if config['base_encoder'] != self.encoder_name:
+            raise ValueError(f"Adapter {path} was trained on {config['base_encoder']}, not {self.encoder_name}")
+        name = config['name']
+        self.add_adapter(name, config['num_labels'], config['r'], config['alpha'])
+        state = torch.load(os.path.join(path, 'adapter.pt'), map_location='cpu')
+        with torch.no_grad():
+            for key, layer in self.lora_layers.items():
+                layer.lora_A[name].copy_(state['lora_A'][key])
+                layer.lora_B[name].copy_(state['lora_B'][key])
+        self.heads[name].load_state_dict(state['head'])
+
+        label_encoder = None
+        le_path = os.path.join(path, 'label_encoder.pkl')
+        if os.path.exists(le_path):
+            with open(le_path, 'rb') as f:
+                label_encoder = pickle.load(f)
+        return name, label_encoder
+
+class AdapterPredictor:
+    """Serves every saved adapter from a single in-memory encoder"""
+
+    def __init__(self, adapter_dir=ADAPTER_DIR, encoder_name=BASE_ENCODER):
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = SharedEncoderClassifier(encoder_name).to(self.device).eval()
+        self.tokenizer = AutoTokenizer.from_pretrained(encoder_name)
+        self.label_lookup = {}
+        if os.path.exists(adapter_dir):
+            for entry in sorted(os.listdir(adapter_dir)):
+                path = os.path.join(adapter_dir, entry)
+                if os.path.exists(os.path.join(path, 'adapter_config.json')):
+                    name, label_encoder = self.model.load_adapter(path)
+                    self.label_lookup[name] = np.asarray(label_encoder.classes_, dtype=object)
+        self.model.to(self.device).eval()
+
+    @property
+    def targets(self):
+        return list(self.label_lookup.keys())
+
+    def predict_many(self, texts, targets=None, batch_size=32, max_length=256):
+        """Predict each target for every text by switching adapters per batch"""
+        texts = [str(text) for text in texts]
+        targets = targets or self.targets
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        results = [{} for _ in texts]
+        with torch.no_grad():
+            for start in range(0, len(texts), batch_size):
+                batch_idx = order[start:start + batch_size]
+                inputs = self.tokenizer(
+                    [texts[i] for i in batch_idx], return_tensors="pt",
+                    padding=True, truncation=True, max_length=max_length
+                ).to(self.device)
+                for target in targets:
+                    self.model.set_adapter(target)
+                    logits = self.model(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'])['logits']
+                    labels = self.label_lookup[target][logits.argmax(dim=-1).cpu().numpy()]
+                    for i, label in zip(batch_idx, labels):
+                        results[i][target] = label
+        return results
+
+def train_adapter(target_column, adapter_dir=ADAPTER_DIR, data_path='gen_datasets/combined_data.csv',
+                  r=8, alpha=16, num_epochs=3):
+    """Train a LoRA adapter and head for one target on the shared frozen encoder"""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+
+    # Load and prepare data
+    df = pd.read_csv(data_path)
+    text_columns = ['complaint', 'title', 'description']
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+
+    tokenizer = AutoTokenizer.from_pretrained(BASE_ENCODER)
+    label_encoders = fit_label_encoders(df, [target_column])
+    label_encoder = label_encoders[target_column]
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=256,
+        labels=encode_labels(df, label_encoders)
+    )
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = PretokenizedDataset(token_cache, train_idx, label_column=0)
+    test_dataset = PretokenizedDataset(token_cache, test_idx, label_column=0)
+
+    model = SharedEncoderClassifier(BASE_ENCODER).to(device)
+    model.add_adapter(target_column, len(label_encoder.classes_), r=r, alpha=alpha)
+    model.set_adapter(target_column)
+    trainable = sum(p.numel() for p in model.adapter_parameters(target_column))
+    print(f"Trainable adapter parameters for {target_column}: {trainable:,}")
+
+    training_args = TrainingArguments(
+        output_dir=os.path.join(adapter_dir, target_column, 'checkpoints'),
+        num_train_epochs=num_epochs,
+        per_device_train_batch_size=16,
+        learning_rate=5e-4,
+        evaluation_strategy="epoch",
+        save_strategy="no",
+        load_best_model_at_end=False,
+        logging_steps=50,
+        remove_unused_columns=False,
+        report_to="none",
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=test_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id)
+    )
+
+    print(f"Training adapter for {target_column}...")
+    trainer.train()
+
+    path = os.path.join(adapter_dir, target_column)
+    model.save_adapter(target_column, path, label_encoder)
+    print(f"Adapter saved to {path}")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="LoRA adapters on a shared frozen encoder")
+    parser.add_argument('--train', help='Target column to train an adapter for')
+    parser.add_argument('--predict', action='store_true', help='Predict with every saved adapter')
+    parser.add_argument('--text', type=str, help='Text to predict for')
+    parser.add_argument('--rank', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.train:
+        train_adapter(args.train, r=args.rank, alpha=2 * args.rank)
+
+    if args.predict:
+        if not args.text:
+            print("Please provide text to predict using --text")
+            return
+        predictor = AdapterPredictor()
+        for target, prediction in predictor.predict_many([args.text])[0].items():
+            print(f"{target}: {prediction}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import random
+import hashlib
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import torch
+from tqdm import tqdm
+from transformers import MarianMTModel, MarianTokenizer
+from token_cache import build_token_cache
+from setup_nltk import nltk_resource_available
+
+# Default on-disk store for precomputed variants
+AUGMENTATION_STORE_PATH = 'cache/augmentations.json'
+
+def augmentation_available():
+    """WordNet is loaded from the local NLTK cache on first use (see setup_nltk.py)"""
+    return nltk_resource_available('wordnet')
+
+@lru_cache(maxsize=None)
+def _wordnet_synonyms(word):
+    """Memoized WordNet lookup; each distinct word is queried only once"""
+    from nltk.corpus import wordnet
+    synonyms = set()
+    for syn in wordnet.synsets(word):
+        for lemma in syn.lemmas():
+            if lemma.name() != word:
+                synonyms.add(lemma.name())
+    return tuple(sorted(synonyms))
+
+class SimpleAugmenter:
+    def __init__(self):
+        self.enabled = augmentation_available()
+        if not self.enabled:
+            print("NLTK WordNet not available. Running without synonym augmentation...")
+            print("Download it once using: python setup_nltk.py")
+
+    def get_synonyms(self, word):
+        return list(_wordnet_synonyms(word))
+
+    def augment_text(self, text):
+        if not self.enabled:
+            return text
+
+        words = text.split()
+        num_to_replace = max(1, len(words) // 10)  # Replace 10% of words
+        indices = random.sample(range(len(words)), min(num_to_replace, len(words)))
+
+        for idx in indices:
+            word = words[idx]
+            synonyms = self.get_synonyms(word)
+            if synonyms:
+                words[idx] = random.choice(synonyms)
+
+        return ' '.join(words)
+
+class TextTranslator:
+    def __init__(self):
+        try:
+            # Initialize MarianMT models
+            self.en_es_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-en-es')
+            self.en_es_tokenizer = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-en-es')
+            self.es_en_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-es-en')
+            self.es_en_tokenizer = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-es-en')
+
+            # Move models to GPU if available
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.en_es_model = self.en_es_model.to(device).eval()
+            self.es_en_model = self.es_en_model.to(device).eval()
+            self.device = device
+            self.available = True
+        except Exception as e:
+            print(f"Translation models initialization failed: {e}")
+            self.available = False
+
+    def _select(self, source_lang, target_lang):
+        if source_lang == "en" and target_lang == "es":
+            return self.en_es_model, self.en_es_tokenizer
+        if source_lang == "es" and target_lang == "en":
+            return self.es_en_model, self.es_en_tokenizer
+        return None, None
+
+    def translate_batch(self, texts, source_lang="en", target_lang="es", batch_size=32):
+        """Translate a list of texts with one ``generate`` call per batch"""
+        texts = [str(text) for text in texts]
+        if not self.available or not texts:
+            return texts
+
+        model, tokenizer = self._select(source_lang, target_lang)
+        if model is None:
+            return texts
+
+        # Sort by length so each batch pads as little as possible
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results = list(texts)
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            try:
+                inputs = tokenizer(
+                    [texts[i] for i in batch_idx],
+                    return_tensors="pt",
+                    padding=True,
+                    max_length=512,
+                    truncation=True
+                ).to(self.device)
+                with torch.no_grad():
+                    translated = model.generate(**inputs)
+                decoded = tokenizer.batch_decode(translated, skip_special_tokens=True)
+                for i, result in zip(batch_idx, decoded):
+                    results[i] = result
+            except Exception as e:
+                print(f"Translation error: {e}")
+        return results
+
+    def translate(self, text, source_lang="en", target_lang="es"):
+        if not self.available or not text:
+            return text
+        return self.translate_batch([text], source_lang, target_lang, batch_size=1)[0]
+
+def text_key(text):
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+class AugmentationStore:
+    """On-disk map from text hash to its precomputed augmented variants"""
+
+    def __init__(self, path=AUGMENTATION_STORE_PATH):
+        self.path = path
+        self.variants = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.variants = json.load(f)
+
+    def __contains__(self, text):
+        return text_key(text) in self.variants
+
+    def __len__(self):
+        return len(self.variants)
+
+    def get(self, text):
+        return self.variants.get(text_key(text), [])
+
+    def add(self, text, variants):
+        self.variants[text_key(text)] = variants
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.variants, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+def build_augmentations(texts, store_path=AUGMENTATION_STORE_PATH, batch_size=32,
+                        num_synonym_variants=2, chunk_size=1024):
+    """Precompute augmented variants for every text not yet in the store.
+
+    Back-translation (en -> es -> en) runs in large batches and synonym
+    replacement uses memoized WordNet lookups. The store is saved after each
+    chunk, so an interrupted run resumes where it stopped.
+    """
+    store = AugmentationStore(store_path)
+    pending = list(dict.fromkeys(str(text) for text in texts if str(text) not in store))
+    if not pending:
+        print(f"All {len(store)} texts already augmented in {store_path}")
+        return store
+
+    print(f"Augmenting {len(pending)} new texts...")
+    augmenter = SimpleAugmenter()
+    translator = TextTranslator()
+
+    for start in tqdm(range(0, len(pending), chunk_size), desc="Augmenting"):
+        chunk = pending[start:start + chunk_size]
+        spanish = translator.translate_batch(chunk, "en", "es", batch_size=batch_size)
+        back_translated = translator.translate_batch(spanish, "es", "en", batch_size=batch_size)
+
+        for text, back in zip(chunk, back_translated):
+            variants = []
+            if augmenter.enabled:
+                variants.extend(augmenter.augment_text(text) for _ in range(num_synonym_variants))
+            if translator.available and back:
+                variants.append(back)
+            # Keep unique variants that differ from the original
+            store.add(text, [v for v in dict.fromkeys(variants) if v and v != text])
+        store.save()
+
+    return store
+
+def build_variant_cache(texts, store, tokenizer, max_len, cache_dir=None):
+    """Tokenize every stored variant of ``texts`` once.
+
+    Returns the variant token cache path and an offsets array where row ``i``
+    owns variant rows ``offsets[i]:offsets[i + 1]``.
+    """
+    variant_texts = []
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    for i, text in enumerate(texts):
+        variants = store.get(str(text))
+        variant_texts.extend(variants)
+        offsets[i + 1] = offsets[i] + len(variants)
+
+    kwargs = {'cache_dir': cache_dir} if cache_dir else {}
+    return build_token_cache(variant_texts, tokenizer, max_len, **kwargs), offsets
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute training augmentations")
+    parser.add_argument('--data', default='gen_datasets/combined_data.csv')
+    parser.add_argument('--store', default=AUGMENTATION_STORE_PATH)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    text_columns = ['complaint', 'title', 'description']
+    texts = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+    store = build_augmentations(texts.tolist(), store_path=args.store, batch_size=args.batch_size)
+    print(f"Augmentation store contains {len(store)} texts: {args.store}")
@@ -0,0 +1,175 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, Sampler
+from transformers import Trainer, AutoTokenizer
+from token_cache import build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+
+class LengthBucketSampler(Sampler):
+    """Batch sampler that groups similar lengths inside shuffled windows.
+
+    Indices are shuffled, cut into windows of ``batch_size * window_batches``,
+    sorted by length inside each window and split into batches; the batch
+    order is shuffled again. Every epoch draws a new permutation.
+    """
+
+    def __init__(self, lengths, batch_size, window_batches=50, shuffle=True, drop_last=False, seed=42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.window = batch_size * window_batches
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+
+        batches = []
+        for start in range(0, len(indices), self.window):
+            window = indices[start:start + self.window]
+            window = window[np.argsort(self.lengths[window], kind='stable')]
+            for b in range(0, len(window), self.batch_size):
+                batch = window[b:b + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+
+        if self.shuffle:
+            rng.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return -(-len(self.lengths) // self.batch_size)
+
+class BucketingTrainer(Trainer):
+    """Trainer whose train loader uses LengthBucketSampler.
+
+    The train dataset must expose per-example ``lengths`` (e.g.
+    PretokenizedDataset) and ``data_collator`` should pad dynamically.
+    """
+
+    def __init__(self, *args, window_batches=50, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.window_batches = window_batches
+
+    def get_train_dataloader(self):
+        if self.train_dataset is None:
+            raise ValueError("Trainer: training requires a train_dataset.")
+        batch_sampler = LengthBucketSampler(
+            self.train_dataset.lengths,
+            self._train_batch_size,
+            window_batches=self.window_batches,
+            drop_last=self.args.dataloader_drop_last,
+            seed=self.args.seed,
+        )
+        dataloader = DataLoader(
+            self.train_dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+        return self.accelerator.prepare(dataloader)
+
+def _padding_stats(batches, lengths, max_length=None):
+    real = sum(int(lengths[b].sum()) for b in batches)
+    if max_length:
+        padded = sum(len(b) * max_length for b in batches)
+    else:
+        padded = sum(len(b) * int(lengths[b].max()) for b in batches)
+    return real, padded
+
+def benchmark_bucketing(dataset, batch_size=16, max_length=256, model=None, max_batches=20):
+    """Compare fixed max-length padding, dynamic padding and length bucketing.
+
+    Reports real/padded tokens per epoch. When ``model`` is given, a
+    forward+backward pass is timed on up to ``max_batches`` batches of each
+    strategy to estimate tokens/sec and wall-clock time per epoch.
+    """
+    lengths = np.asarray(dataset.lengths)
+    rng = np.random.default_rng(0)
+    random_order = rng.permutation(len(lengths))
+    random_batches = [random_order[i:i + batch_size] for i in range(0, len(lengths), batch_size)]
+    bucket_batches = [np.asarray(b) for b in LengthBucketSampler(lengths, batch_size)]
+
+    strategies = {
+        'max_length': (random_batches, max_length),
+        'dynamic': (random_batches, None),
+        'bucketed': (bucket_batches, None),
+    }
+
+    collator = DynamicPaddingCollator(dataset.meta['pad_token_id'])
+    rows = []
+    for name, (batches, fixed_length) in strategies.items():
+        real, padded = _padding_stats(batches, lengths, fixed_length)
+        row = {
+            'strategy': name,
+            'real_tokens': real,
+            'padded_tokens': padded,
+            'pad_fraction': 1 - real / max(padded, 1),
+        }
+
+        if model is not None:
+            device = next(model.parameters()).device
+            model.train()
+            sample = batches[:max_batches]
+            start_time = time.perf_counter()
+            for batch_rows in sample:
+                features = [dataset[i] for i in batch_rows]
+                batch = collator(features)
+                if fixed_length:
+                    pad = fixed_length - batch['input_ids'].shape[1]
+                    batch['input_ids'] = torch.nn.functional.pad(batch['input_ids'], (0, pad), value=collator.pad_token_id)
+                    batch['attention_mask'] = torch.nn.functional.pad(batch['attention_mask'], (0, pad), value=0)
+                batch = {k: v.to(device) for k, v in batch.items()}
+                outputs = model(**batch)
+                outputs['loss'].backward()
+                model.zero_grad(set_to_none=True)
+            elapsed = time.perf_counter() - start_time
+            sample_real, _ = _padding_stats(sample, lengths, fixed_length)
+            row['tokens_per_sec'] = sample_real / max(elapsed, 1e-9)
+            row['epoch_seconds'] = elapsed / max(len(sample), 1) * len(batches)
+
+        rows.append(row)
+
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure padding waste and throughput with length bucketing")
+    parser.add_argument('--data', default='gen_datasets/combined_data.csv')
+    parser.add_argument('--tokenizer', default='xlm-roberta-large')
+    parser.add_argument('--max-length', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--time-model', action='store_true', help='Also time forward+backward of the unified model')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    text_columns = ['complaint', 'title', 'description']
+    texts = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+    model = None
+    labels = None
+    if args.time_model:
+        from unified_model import HighAccuracyClassifier, ALL_TARGETS
+        from token_cache import fit_label_encoders, encode_labels
+        label_encoders = fit_label_encoders(df, ALL_TARGETS)
+        labels = encode_labels(df, label_encoders)
+        model = HighAccuracyClassifier.from_pretrained(
+            'xlm-roberta-base',
+            num_labels_per_task=[len(label_encoders[t].classes_) for t in ALL_TARGETS]
+        )
+
+    dataset = PretokenizedDataset(build_token_cache(texts.tolist(), tokenizer, args.max_length, labels=labels))
+    benchmark_bucketing(dataset, args.batch_size, args.max_length, model=model)
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+import torch
+from sklearn.model_selection import train_test_split
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from unified_model import load_model_artifacts, predict_proba_many
+
+CASCADE_TARGETS = ['category', 'departmentAssigned', 'urgencyLevel']
+CASCADE_DIR = 'E:/ML/Grivances/cascade'
+
+class FastPathClassifier:
+    """TF-IDF features with one sparse classifier per target.
+
+    Same stack as ``GrievancePredictor`` in SentimentAnalysis (TF-IDF +
+    RandomForest), or a logistic regression with ``kind='linear'``.
+    """
+
+    def __init__(self, targets=CASCADE_TARGETS, kind='forest', max_features=1500):
+        self.targets = list(targets)
+        self.kind = kind
+        self.tfidf = TfidfVectorizer(max_features=max_features)
+        self.classifiers = {}
+
+    def _new_classifier(self):
+        if self.kind == 'linear':
+            return LogisticRegression(max_iter=1000)
+        return RandomForestClassifier(n_estimators=200, n_jobs=-1, random_state=42)
+
+    def fit(self, texts, label_frame):
+        X = self.tfidf.fit_transform(texts)
+        for target in self.targets:
+            print(f"Training fast {self.kind} classifier for {target}...")
+            classifier = self._new_classifier()
+            classifier.fit(X, label_frame[target].fillna('unknown').astype(str).values)
+            self.classifiers[target] = classifier
+        return self
+
+    def predict_proba_many(self, texts):
+        """Top label and its probability per target: ``{target: (labels, confidence)}``"""
+        X = self.tfidf.transform([str(text) for text in texts])
+        results = {}
+        for target in self.targets:
+            classifier = self.classifiers[target]
+            proba = classifier.predict_proba(X)
+            best = proba.argmax(axis=1)
+            results[target] = (classifier.classes_[best], proba[np.arange(len(best)), best])
+        return results
+
+def calibrate_threshold(confidence, fast_correct, slow_correct, target_accuracy):
+    """Lowest confidence threshold whose cascade accuracy reaches ``target_accuracy``.
+
+    Rows with confidence >= threshold keep the fast answer; the rest take the
+    transformer's. Returns ``inf`` (always escalate) when no threshold reaches
+    the target.
+    """
+    order = np.argsort(-confidence, kind='stable')
+    conf_sorted = confidence[order]
+    fast_cum = np.concatenate([[0], np.cumsum(fast_correct[order])])
+    slow_suffix = np.concatenate([np.cumsum(slow_correct[order][::-1])[::-1], [0]])
+
+    # Only cut where confidence changes, so ties fall on the same side
+    cuts = np.concatenate([[0], np.flatnonzero(np.diff(conf_sorted)) + 1, [len(conf_sorted)]])
+    accuracy = (fast_cum[cuts] + slow_suffix[cuts]) / max(len(confidence), 1)
+    passing = cuts[accuracy >= target_accuracy]
+    if len(passing) == 0 or passing.max() == 0:
+        return float('inf')
+    return float(conf_sorted[passing.max() - 1])
+
+class GrievanceCascade:
+    """Fast TF-IDF model first, HighAccuracyClassifier only for uncertain targets.
+
+    A target escalates when the fast model's top-class probability is below
+    its threshold; the transformer then runs once for every escalated row.
+    Targets the transformer was not trained on are always answered by the
+    fast path. ``stats`` counts traffic so ``escalation_report`` can show
+    the accuracy/throughput trade-off.
+    """
+
+    def __init__(self, fast_model, models=None, tokenizer=None, label_encoders=None, thresholds=None):
+        self.fast_model = fast_model
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.models = [model.to(device) for model in (models or [])]
+        self.tokenizer = tokenizer
+        self.label_encoders = label_encoders or {}
+        self.thresholds = thresholds or {target: 0.0 for target in fast_model.targets}
+        self.slow_heads = {target: i for i, target in enumerate(self.label_encoders) if target in fast_model.targets}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            'rows': 0,
+            'escalated_rows': 0,
+            'escalated': {target: 0 for target in self.fast_model.targets},
+            'fast_seconds': 0.0,
+            'slow_seconds': 0.0,
+        }
+
+    def _slow_predict(self, texts, targets, batch_size):
+        head_probs = predict_proba_many(texts, self.models, self.tokenizer, batch_size=batch_size)
+        return {
+            target: self.label_encoders[target].classes_[head_probs[self.slow_heads[target]].argmax(axis=1)]
+            for target in targets
+        }
+
+    def predict_many(self, texts, batch_size=32):
+        texts = [str(text) for text in texts]
+        if not texts:
+            return []
+
+        start_time = time.perf_counter()
+        fast = self.fast_model.predict_proba_many(texts)
+        predictions = {target: labels.astype(object) for target, (labels, _) in fast.items()}
+        escalate = {
+            target: confidence < self.thresholds.get(target, 0.0)
+            for target, (_, confidence) in fast.items()
+            if target in self.slow_heads
+        }
+        self.stats['fast_seconds'] += time.perf_counter() - start_time
+
+        rows = np.flatnonzero(np.any(list(escalate.values()), axis=0)) if escalate else np.array([], dtype=int)
+        if len(rows) and self.models:
+            start_time = time.perf_counter()
+            slow = self._slow_predict([texts[i] for i in rows], list(escalate), batch_size)
+            for target, mask in escalate.items():
+                # Only targets below their own threshold take the transformer's answer
+                keep = mask[rows]
+                predictions[target][rows[keep]] = slow[target][keep]
+                self.stats['escalated'][target] += int(mask.sum())
+            self.stats['slow_seconds'] += time.perf_counter() - start_time
+            self.stats['escalated_rows'] += len(rows)
+        self.stats['rows'] += len(texts)
+
+        return [{target: predictions[target][i] for target in predictions} for i in range(len(texts))]
+
+    def escalation_report(self):
+        rows = max(self.stats['rows'], 1)
+        report = {
+            'rows': self.stats['rows'],
+            'escalated_fraction': self.stats['escalated_rows'] / rows,
+            'per_target': {t: n / rows for t, n in self.stats['escalated'].items()},
+            'fast_seconds': self.stats['fast_seconds'],
+            'slow_seconds': self.stats['slow_seconds'],
+        }
+        print(f"Escalated to transformer: {report['escalated_fraction']:.1%} of {report['rows']} rows")
+        for target, fraction in report['per_target'].items():
+            threshold = self.thresholds.get(target, 0.0)
+            print(f"  {target}: {fraction:.1%} escalated (threshold {threshold:.3f})")
+        print(f"  Fast path: {report['fast_seconds']:.2f}s, transformer: {report['slow_seconds']:.2f}s")
+        return report
+
+    def calibrate(self, texts, label_frame, target_accuracy=0.9, batch_size=32):
+        """Tune one threshold per target on rows none of the transformer models trained on"""
+        texts = [str(text) for text in texts]
+        fast = self.fast_model.predict_proba_many(texts)
+        slow = self._slow_predict(texts, list(self.slow_heads), batch_size) if self.models else {}
+
+        for target, (labels, confidence) in fast.items():
+            truth = label_frame[target].fillna('unknown').astype(str).values
+            fast_correct = labels == truth
+            if target not in slow:
+                print(f"{target}: not predicted by the transformer, fast path only "
+                      f"(accuracy {fast_correct.mean():.3f})")
+                self.thresholds[target] = 0.0
+                continue
+            slow_correct = slow[target] == truth
+            threshold = calibrate_threshold(confidence, fast_correct, slow_correct, target_accuracy)
+            self.thresholds[target] = threshold
+            escalated = confidence < threshold
+            cascade_correct = np.where(escalated, slow_correct, fast_correct)
+            print(f"{target}: threshold {threshold:.3f}, escalates {escalated.mean():.1%}, "
+                  f"accuracy fast {fast_correct.mean():.3f} / transformer {slow_correct.mean():.3f} "
+                  f"/ cascade {cascade_correct.mean():.3f}")
+        return self.thresholds
+
+    def save(self, output_dir=CASCADE_DIR):
+        os.makedirs(output_dir, exist_ok=True)
+        joblib.dump(self.fast_model, os.path.join(output_dir, 'fast_model.joblib'))
+        with open(os.path.join(output_dir, 'thresholds.json'), 'w') as f:
+            json.dump(self.thresholds, f, indent=2)
+        print(f"Cascade saved to {output_dir}")
+
+    @classmethod
+    def load(cls, cascade_dir=CASCADE_DIR, model_path='E:/ML/Grivances/saved_model'):
+        fast_model = joblib.load(os.path.join(cascade_dir, 'fast_model.joblib'))
+        with open(os.path.join(cascade_dir, 'thresholds.json')) as f:
+            thresholds = json.load(f)
+        models, tokenizer, label_encoders = load_model_artifacts(model_path)
+        return cls(fast_model, models, tokenizer, label_encoders, thresholds)
+
+def _load_rows(path):
+    df = pd.read_csv(path)
+    text_columns = ['complaint', 'title', 'description']
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+    return df
+
+def build_cascade(heldout_path, data_path='gen_datasets/combined_data.csv', model_path='E:/ML/Grivances/saved_model',
+                  target_accuracy=0.9, kind='forest', output_dir=CASCADE_DIR):
+    """Train the fast path, calibrate thresholds and report on held-out rows.
+
+    ``train_unified_model`` trains its KFold ensemble on every row of
+    ``data_path``, so calibration needs rows from outside it:
+    ``heldout_path`` (same columns) is halved into calibration and
+    evaluation sets. The fast path trains on ``data_path``, like the
+    transformer.
+    """
+    df = _load_rows(data_path)
+    heldout_df = _load_rows(heldout_path)
+    targets = [target for target in CASCADE_TARGETS if target in df.columns]
+    missing = [target for target in targets if target not in heldout_df.columns]
+    if missing:
+        raise ValueError(f"{heldout_path} has no label columns {missing}")
+
+    calib_idx, eval_idx = train_test_split(np.arange(len(heldout_df)), test_size=0.5, random_state=42)
+
+    fast_model = FastPathClassifier(targets, kind=kind).fit(df['input_text'], df)
+    models, tokenizer, label_encoders = load_model_artifacts(model_path)
+    cascade = GrievanceCascade(fast_model, models, tokenizer, label_encoders)
+
+    print(f"\nCalibrating thresholds for {target_accuracy:.0%} accuracy...")
+    calib_df = heldout_df.iloc[calib_idx]
+    cascade.calibrate(calib_df['input_text'].tolist(), calib_df, target_accuracy)
+    cascade.save(output_dir)
+
+    print("\nEvaluating cascade on held-out rows...")
+    eval_df = heldout_df.iloc[eval_idx]
+    predictions = cascade.predict_many(eval_df['input_text'].tolist())
+    for target in targets:
+        truth = eval_df[target].fillna('unknown').astype(str).values
+        predicted = np.array([p[target] for p in predictions], dtype=object)
+        print(f"{target}: accuracy {np.mean(predicted == truth):.3f}")
+    cascade.escalation_report()
+    return cascade
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confidence-gated TF-IDF -> transformer cascade")
+    parser.add_argument('--data', default='gen_datasets/combined_data.csv')
+    parser.add_argument('--heldout', required=True,
+                        help='Labelled CSV the transformer was not trained on, for calibration and evaluation')
+    parser.add_argument('--model', default='E:/ML/Grivances/saved_model')
+    parser.add_argument('--output', default=CASCADE_DIR)
+    parser.add_argument('--target-accuracy', type=float, default=0.9)
+    parser.add_argument('--kind', choices=['forest', 'linear'], default='forest')
+    args = parser.parse_args()
+
+    build_cascade(args.heldout, args.data, args.model, args.target_accuracy, args.kind, args.output)
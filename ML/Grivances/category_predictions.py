@@ -11,6 +11,9 @@ from torch.nn.parallel import DistributedDataParallel as DDP
 import torch.distributed as dist
 import shutil
 import psutil
+import numpy as np
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+from bucketing import BucketingTrainer
 
 # Configure device and CUDA settings
 def setup_device():
@@ -45,15 +48,15 @@ BATCH_SIZE = 12  # Increased from 8
 MAX_LENGTH = 256
 GRADIENT_ACCUMULATION = 2  # Reduced from 4
 
-# Load the dataset
-df = pd.read_csv('gen_datasets/combined_data.csv')
-
 # Define the target columns for prediction
 target_columns = ['category', 'departmentAssigned']
-
-# Concatenate the text columns into one input_text column
 text_columns = ['complaint', 'title', 'description']
-df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+
+def load_dataset(path='gen_datasets/combined_data.csv'):
+    """Load the dataset and concatenate the text columns into one input_text column"""
+    df = pd.read_csv(path)
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+    return df
 
 # Custom Dataset class for grievance data
 class GrievanceDataset(Dataset):
@@ -103,16 +106,6 @@ class GrievanceDataset(Dataset):
             print(f"Error processing index {index}: {str(e)}")
             return None
 
-# Load tokenizer
-tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
-
-# Split the dataset into train and test sets
-train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
-
-# Create datasets for training and testing
-train_dataset = GrievanceDataset(train_df, tokenizer, max_len=MAX_LENGTH)
-test_dataset = GrievanceDataset(test_df, tokenizer, max_len=MAX_LENGTH)
-
 def create_model(num_labels, device):
     model = AutoModelForSequenceClassification.from_pretrained(
         'bert-base-multilingual-cased',
@@ -168,26 +161,28 @@ def main():
         bf16=True if torch.cuda.is_available() else False,
         gradient_accumulation_steps=4,
         dataloader_num_workers=0,
-        remove_unused_columns=True,
+        remove_unused_columns=False,
         report_to="none",
         no_cuda=False,
     )
     
-    # Create datasets with memory-optimized settings
-    train_dataset = GrievanceDataset(
-        train_df, 
-        tokenizer, 
-        max_len=MAX_LENGTH
-    )
-    test_dataset = GrievanceDataset(
-        test_df, 
-        tokenizer, 
-        max_len=MAX_LENGTH
+    # Load data and tokenizer
+    df = load_dataset()
+    tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
+    
+    # Tokenize the corpus once into a memory-mapped cache
+    label_encoders = fit_label_encoders(df, target_columns)
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=MAX_LENGTH,
+        labels=encode_labels(df, label_encoders)
     )
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = PretokenizedDataset(token_cache, train_idx, label_column=0)
+    test_dataset = PretokenizedDataset(token_cache, test_idx, label_column=0)
     
     # Initialize model with half precision
     model = create_model(
-        len(train_dataset.label_encoders[target_columns[0]].classes_),
+        len(label_encoders[target_columns[0]].classes_),
         device
     )
     
@@ -195,12 +190,13 @@ def main():
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
         
-    # Initialize trainer
-    trainer = Trainer(
+    # Initialize trainer with length-bucketed batches
+    trainer = BucketingTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=test_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id),
     )
     
     # Add memory optimization callback
@@ -223,7 +219,7 @@ def main():
         
         # Save label encoders with the model
         with open(os.path.join(model_dir, 'label_encoders.pkl'), 'wb') as f:
-            pickle.dump(train_dataset.label_encoders, f)
+            pickle.dump(label_encoders, f)
             
         print(f"Model and label encoders saved to {model_dir}")
         
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+GRIEVANCES_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_DETECTION_DIR = os.path.join(os.path.dirname(GRIEVANCES_DIR), 'FakeGrivienceDetection')
+
+# Seconds allowed for module-level code, excluding third-party imports
+IMPORT_BUDGET = 0.5
+
+# (directory, module) pairs that must import without side effects
+MODULES = [
+    (GRIEVANCES_DIR, 'unified_model'),
+    (GRIEVANCES_DIR, 'augmentation'),
+    (GRIEVANCES_DIR, 'category_predictions'),
+    (GRIEVANCES_DIR, 'model'),
+    (GRIEVANCES_DIR, 'run_test'),
+    (FAKE_DETECTION_DIR, 'model'),
+]
+
+# Runs in a fresh interpreter: sockets raise, so any download attempt is recorded
+_PROBE = r'''
+import sys, time, json, socket
+attempts = []
+def _blocked(self, address, *args, **kwargs):
+    attempts.append(str(address))
+    raise OSError("network access during import")
+socket.socket.connect = _blocked
+socket.socket.connect_ex = _blocked
+start = time.perf_counter()
+error = None
+try:
+    __import__(sys.argv[1])  # Plain import statement path, so -X importtime records it
+except Exception as e:
+    error = f"{type(e).__name__}: {e}"
+print("\n" + json.dumps({"seconds": time.perf_counter() - start, "network": attempts, "error": error}))
+'''
+
+def _snapshot(directory):
+    return {os.path.join(root, name) for root, _, files in os.walk(directory) for name in files
+            if '__pycache__' not in root}
+
+def _own_import_time(stderr, local_names):
+    """Sum of ``-X importtime`` self times for modules defined in this repo (seconds).
+
+    Self time excludes children, so torch/transformers are not counted; module
+    level work such as CSV reads, downloads or training is.
+    """
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        name = parts[2].strip()
+        if name in local_names:
+            try:
+                total_us += int(parts[0])
+            except ValueError:
+                continue
+    return total_us / 1e6
+
+def check_module(directory, module, budget=IMPORT_BUDGET):
+    local_names = {f[:-3] for f in os.listdir(directory) if f.endswith('.py')}
+    env = dict(os.environ, HF_HUB_OFFLINE='1', TRANSFORMERS_OFFLINE='1', PYTHONDONTWRITEBYTECODE='1')
+    before = _snapshot(directory)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE, module],
+        cwd=directory, env=env, capture_output=True, text=True
+    )
+    created = sorted(_snapshot(directory) - before)
+
+    try:
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {'seconds': float('nan'), 'network': [], 'error': proc.stderr.strip().splitlines()[-1:]}
+    result['own_seconds'] = _own_import_time(proc.stderr, local_names)
+    result['created_files'] = created
+
+    problems = []
+    if result['error']:
+        problems.append(f"import failed ({result['error']})")
+    if result['network']:
+        problems.append(f"network access: {result['network']}")
+    if created:
+        problems.append(f"created files: {created[:5]}")
+    if result['own_seconds'] > budget:
+        problems.append(f"own import time {result['own_seconds']:.3f}s > budget {budget:.3f}s")
+    result['problems'] = problems
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that module imports are fast and side-effect free")
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET,
+                        help='Seconds allowed for module-level code, excluding third-party imports')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'Module':<45} {'Own (s)':>8} {'Total (s)':>10}  Status")
+    print("-" * 80)
+    for directory, module in MODULES:
+        result = check_module(directory, module, args.budget)
+        label = f"{os.path.basename(directory)}/{module}.py"
+        status = 'OK' if not result['problems'] else '; '.join(result['problems'])
+        print(f"{label:<45} {result['own_seconds']:>8.3f} {result['seconds']:>10.3f}  {status}")
+        failed = failed or bool(result['problems'])
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
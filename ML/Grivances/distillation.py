@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import Dataset
+from sklearn.model_selection import train_test_split
+from transformers import AutoModel, AutoTokenizer, Trainer, TrainingArguments
+from token_cache import encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+from unified_model import load_model_artifacts, predict_proba_many, predict_many
+
+# Default 6-layer multilingual student; it shares the XLM-R vocabulary
+STUDENT_ENCODER = 'nreimers/mMiniLMv2-L6-H384-distilled-from-XLMR-Large'
+STUDENT_CONFIG = 'student_config.json'
+
+class DistilledClassifier(nn.Module):
+    """Small encoder with one linear head per task, trained on teacher soft labels"""
+
+    def __init__(self, encoder, num_labels_per_task, dropout=0.1):
+        super().__init__()
+        self.transformer = encoder
+        self.num_labels_per_task = list(num_labels_per_task)
+        hidden_size = encoder.config.hidden_size
+        self.dropout = nn.Dropout(dropout)
+        self.classifiers = nn.ModuleList([
+            nn.Linear(hidden_size, num_labels) for num_labels in self.num_labels_per_task
+        ])
+
+    def forward(self, input_ids, attention_mask=None, labels=None, teacher_logits=None):
+        outputs = self.transformer(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
+
+        # Mean pooling over non-pad tokens
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        mask = attention_mask.unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+        pooled_output = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-6)
+        pooled_output = self.dropout(pooled_output)
+
+        logits = [classifier(pooled_output) for classifier in self.classifiers]
+        return {'logits': logits}
+
+    def save_pretrained(self, path, tokenizer=None, label_encoders=None):
+        os.makedirs(path, exist_ok=True)
+        self.transformer.save_pretrained(os.path.join(path, 'encoder'))
+        torch.save(self.classifiers.state_dict(), os.path.join(path, 'heads.pt'))
+        with open(os.path.join(path, STUDENT_CONFIG), 'w') as f:
+            json.dump({'num_labels_per_task': self.num_labels_per_task}, f, indent=2)
+        if tokenizer is not None:
+            tokenizer.save_pretrained(path)
+        if label_encoders is not None:
+            with open(os.path.join(path, 'label_encoders.pkl'), 'wb') as f:
+                pickle.dump(label_encoders, f)
+
+    @classmethod
+    def from_pretrained(cls, path):
+        with open(os.path.join(path, STUDENT_CONFIG)) as f:
+            config = json.load(f)
+        encoder = AutoModel.from_pretrained(os.path.join(path, 'encoder'))
+        model = cls(encoder, config['num_labels_per_task'])
+        model.classifiers.load_state_dict(torch.load(os.path.join(path, 'heads.pt'), map_location='cpu'))
+        return model
+
+def is_student_artifact(path):
+    return os.path.exists(os.path.join(path, STUDENT_CONFIG))
+
+def load_student(path):
+    """Load a distilled student and its tokenizer from ``path``"""
+    return DistilledClassifier.from_pretrained(path), AutoTokenizer.from_pretrained(path)
+
+class DistillationDataset(Dataset):
+    """Pretokenized rows paired with the teacher's flattened log-probabilities"""
+
+    def __init__(self, token_dataset, teacher_logits):
+        self.token_dataset = token_dataset
+        self.teacher_logits = teacher_logits
+
+    def __len__(self):
+        return len(self.token_dataset)
+
+    def __getitem__(self, index):
+        item = self.token_dataset[index]
+        row = self.token_dataset.indices[index]
+        item['teacher_logits'] = torch.from_numpy(self.teacher_logits[row])
+        return item
+
+class DistillationTrainer(Trainer):
+    """Trainer whose loss mixes KL to the teacher with hard-label cross entropy"""
+
+    def __init__(self, *args, temperature=2.0, alpha=0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        labels = inputs.pop('labels')
+        teacher_logits = inputs.pop('teacher_logits')
+        outputs = model(**inputs)
+
+        loss = 0
+        t = self.temperature
+        teacher_heads = torch.split(teacher_logits, model.num_labels_per_task, dim=-1)
+        for i, (student, teacher) in enumerate(zip(outputs['logits'], teacher_heads)):
+            soft_loss = F.kl_div(
+                F.log_softmax(student / t, dim=-1),
+                F.softmax(teacher / t, dim=-1),
+                reduction='batchmean'
+            ) * (t * t)
+            hard_loss = F.cross_entropy(student, labels[:, i])
+            loss = loss + self.alpha * soft_loss + (1 - self.alpha) * hard_loss
+
+        return (loss, outputs) if return_outputs else loss
+
+def compute_teacher_logits(texts, teacher_models, teacher_tokenizer, batch_size=32):
+    """Ensemble log-probabilities for all heads, concatenated per row"""
+    head_probs = predict_proba_many(texts, teacher_models, teacher_tokenizer, batch_size=batch_size)
+    return np.log(np.concatenate(head_probs, axis=1).clip(min=1e-8)).astype(np.float32)
+
+def _time_predictions(texts, models, tokenizer, label_encoders, batch_size, device=None):
+    start_time = time.perf_counter()
+    predictions = predict_many(texts, models, tokenizer, label_encoders, batch_size=batch_size, device=device)
+    return predictions, time.perf_counter() - start_time
+
+def distillation_report(eval_df, teacher, student, label_encoders, output_path=None, latency_rows=64):
+    """Compare per-head accuracy and CPU latency of teacher and student"""
+    texts = eval_df['input_text'].tolist()
+    targets = list(label_encoders.keys())
+    rows = []
+    timings = {}
+    cpu = torch.device('cpu')
+
+    for name, (models, tokenizer) in (('teacher', teacher), ('student', student)):
+        models = [model.to(cpu) for model in models]
+        predictions, elapsed = _time_predictions(texts, models, tokenizer, label_encoders, batch_size=32, device=cpu)
+        single_texts = texts[:latency_rows]
+        _, single_elapsed = _time_predictions(single_texts, models, tokenizer, label_encoders, batch_size=1, device=cpu)
+        timings[name] = {
+            'rows_per_sec': len(texts) / max(elapsed, 1e-9),
+            'ms_per_row_batch1': 1000 * single_elapsed / max(len(single_texts), 1),
+        }
+        for target in targets:
+            truth = eval_df[target].fillna('unknown').astype(str).values if target in eval_df.columns else None
+            accuracy = float(np.mean(np.asarray([p[target] for p in predictions]) == truth)) if truth is not None else float('nan')
+            rows.append({'model': name, 'target': target, 'accuracy': accuracy})
+
+    accuracy_df = pd.DataFrame(rows).pivot(index='target', columns='model', values='accuracy')
+    accuracy_df['delta'] = accuracy_df['student'] - accuracy_df['teacher']
+
+    lines = [
+        "# Distillation Report",
+        "",
+        f"Evaluated on {len(texts)} held-out grievances (CPU).",
+        "",
+        "## Per-head accuracy",
+        "",
+        "| Target | Teacher | Student | Delta |",
+        "|---|---|---|---|",
+    ]
+    for target, row in accuracy_df.loc[targets].iterrows():
+        lines.append(f"| {target} | {row['teacher']:.4f} | {row['student']:.4f} | {row['delta']:+.4f} |")
+    lines += [
+        "",
+        "## Latency",
+        "",
+        "| Model | Rows/sec (batch 32) | ms/row (batch 1) |",
+        "|---|---|---|",
+    ]
+    for name, timing in timings.items():
+        lines.append(f"| {name} | {timing['rows_per_sec']:.1f} | {timing['ms_per_row_batch1']:.1f} |")
+    report = '\n'.join(lines) + '\n'
+
+    print(report)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(report)
+    return accuracy_df, timings
+
+def train_student(teacher_path='E:/ML/Grivances/saved_model', output_dir='E:/ML/Grivances/student_model',
+                  data_path='gen_datasets/combined_data.csv', student_encoder=STUDENT_ENCODER,
+                  temperature=2.0, alpha=0.7, num_epochs=5):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+
+    # Load teacher ensemble
+    teacher_models, teacher_tokenizer, label_encoders = load_model_artifacts(teacher_path)
+    teacher_models = [model.to(device) for model in teacher_models]
+    targets = list(label_encoders.keys())
+
+    # Load and prepare data
+    df = pd.read_csv(data_path)
+    text_columns = ['complaint', 'title', 'description']
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+    texts = df['input_text'].tolist()
+
+    # Soft targets from the teacher for every row, computed once
+    print("Computing teacher soft labels...")
+    teacher_logits = compute_teacher_logits(texts, teacher_models, teacher_tokenizer)
+
+    # Tokenize once with the student tokenizer
+    student_tokenizer = AutoTokenizer.from_pretrained(student_encoder)
+    token_cache = build_token_cache(
+        texts, student_tokenizer, max_len=256,
+        labels=encode_labels(df, label_encoders),
+        cache_dir='E:/ML/Grivances/cache/tokenized'
+    )
+
+    train_idx, eval_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = DistillationDataset(PretokenizedDataset(token_cache, train_idx), teacher_logits)
+    eval_dataset = DistillationDataset(PretokenizedDataset(token_cache, eval_idx), teacher_logits)
+
+    student = DistilledClassifier(
+        AutoModel.from_pretrained(student_encoder),
+        [len(label_encoders[target].classes_) for target in targets]
+    ).to(device)
+
+    training_args = TrainingArguments(
+        output_dir=os.path.join(output_dir, 'checkpoints'),
+        num_train_epochs=num_epochs,
+        per_device_train_batch_size=32,
+        per_device_eval_batch_size=64,
+        evaluation_strategy="epoch",
+        save_strategy="no",
+        learning_rate=5e-5,
+        warmup_ratio=0.1,
+        weight_decay=0.01,
+        logging_steps=50,
+        remove_unused_columns=False,
+        report_to="none",
+    )
+
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset,
+        data_collator=DynamicPaddingCollator(student_tokenizer.pad_token_id),
+        temperature=temperature,
+        alpha=alpha,
+    )
+
+    print("Training student...")
+    trainer.train()
+
+    student.save_pretrained(output_dir, tokenizer=student_tokenizer, label_encoders=label_encoders)
+    print(f"Student saved to {output_dir}")
+
+    # Compare teacher and student on the held-out rows
+    distillation_report(
+        df.iloc[eval_idx],
+        (teacher_models, teacher_tokenizer),
+        ([student], student_tokenizer),
+        label_encoders,
+        output_path=os.path.join(output_dir, 'distillation_report.md')
+    )
+    return student, student_tokenizer, label_encoders
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill the unified ensemble into a single small student")
+    parser.add_argument('--teacher', default='E:/ML/Grivances/saved_model')
+    parser.add_argument('--output', default='E:/ML/Grivances/student_model')
+    parser.add_argument('--data', default='gen_datasets/combined_data.csv')
+    parser.add_argument('--student-encoder', default=STUDENT_ENCODER)
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--alpha', type=float, default=0.7)
+    parser.add_argument('--epochs', type=int, default=5)
+    args = parser.parse_args()
+
+    train_student(args.teacher, args.output, args.data, args.student_encoder,
+                  args.temperature, args.alpha, args.epochs)
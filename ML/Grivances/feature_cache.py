@@ -0,0 +1,203 @@
+import os
+import json
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from tqdm import tqdm
+from sklearn.model_selection import train_test_split
+from transformers import AutoTokenizer
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+
+# Default location for cached pooled embeddings
+FEATURE_CACHE_DIR = 'cache/features'
+
+def build_feature_cache(encode_fn, token_cache_path, encoder_name, cache_dir=FEATURE_CACHE_DIR, batch_size=64):
+    """Run a frozen encoder once over a token cache and store pooled embeddings.
+
+    ``encode_fn(input_ids, attention_mask)`` returns a ``(batch, hidden)``
+    tensor. Embeddings are written to a float16 ``embeddings.npy`` memmap keyed
+    by encoder name and token cache, so later calls reuse it.
+    """
+    safe_name = encoder_name.replace('/', '_').replace('\\', '_').replace(':', '_')
+    path = os.path.join(cache_dir, f"{safe_name}-{os.path.basename(os.path.normpath(token_cache_path))}")
+    embeddings_path = os.path.join(path, 'embeddings.npy')
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        print(f"Using cached features: {path}")
+        return np.load(embeddings_path, mmap_mode='r')
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    dataset = PretokenizedDataset(token_cache_path)
+    collator = DynamicPaddingCollator(dataset.meta['pad_token_id'])
+    order = np.argsort(dataset.lengths, kind='stable')  # Length-sorted for minimal padding
+
+    os.makedirs(path, exist_ok=True)
+    embeddings = None
+    with torch.no_grad():
+        for start in tqdm(range(0, len(order), batch_size), desc="Encoding"):
+            rows = order[start:start + batch_size]
+            batch = collator([{'input_ids': dataset.token_ids(row)} for row in rows])
+            pooled = encode_fn(batch['input_ids'].to(device), batch['attention_mask'].to(device))
+            if embeddings is None:
+                embeddings = np.lib.format.open_memmap(
+                    embeddings_path, mode='w+', dtype=np.float16, shape=(len(dataset), pooled.shape[-1])
+                )
+            embeddings[rows] = pooled.float().cpu().numpy().astype(np.float16)
+
+    if embeddings is None:
+        raise ValueError(f"Token cache {token_cache_path} is empty, nothing to encode")
+    embeddings.flush()
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'encoder': encoder_name, 'token_cache': token_cache_path, 'shape': list(embeddings.shape)}, f, indent=2)
+    del embeddings
+    return np.load(embeddings_path, mmap_mode='r')
+
+def train_heads(logits_fn, parameters, embeddings, labels, train_idx, eval_idx=None,
+                epochs=20, batch_size=256, learning_rate=1e-3, label_smoothing=0.1, modules=()):
+    """Train task heads on cached embeddings; the encoder is never run.
+
+    ``logits_fn(pooled)`` returns a list of logits (one per column of
+    ``labels``) and ``parameters`` are the head parameters to optimize.
+    ``modules`` are the head modules, switched to eval mode (no dropout)
+    for the per-epoch evaluation.
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    optimizer = torch.optim.AdamW(parameters, lr=learning_rate, weight_decay=0.01)
+    loss_fct = nn.CrossEntropyLoss(label_smoothing=label_smoothing)
+    labels = np.asarray(labels)
+    if labels.ndim == 1:
+        labels = labels[:, None]
+
+    def batches(indices):
+        for start in range(0, len(indices), batch_size):
+            rows = np.sort(indices[start:start + batch_size])  # Sorted reads from the memmap
+            x = torch.from_numpy(np.asarray(embeddings[rows], dtype=np.float32)).to(device)
+            y = torch.from_numpy(labels[rows]).to(device)
+            yield x, y
+
+    for epoch in range(epochs):
+        total_loss = 0.0
+        for x, y in batches(np.random.permutation(train_idx)):
+            logits = logits_fn(x)
+            loss = sum(loss_fct(logit, y[:, i]) for i, logit in enumerate(logits))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(x)
+
+        message = f"Epoch {epoch + 1}/{epochs} - loss: {total_loss / len(train_idx):.4f}"
+        if eval_idx is not None and len(eval_idx):
+            accuracy = evaluate_heads(logits_fn, embeddings, labels, eval_idx, batch_size, modules)
+            message += " - accuracy: " + ", ".join(f"{a:.3f}" for a in accuracy)
+        print(message)
+
+def evaluate_heads(logits_fn, embeddings, labels, indices, batch_size=1024, modules=()):
+    """Per-head accuracy on cached embeddings, with ``modules`` in eval mode"""
+    modes = [module.training for module in modules]
+    for module in modules:
+        module.eval()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    labels = np.asarray(labels)
+    if labels.ndim == 1:
+        labels = labels[:, None]
+    correct = np.zeros(labels.shape[1])
+    indices = np.sort(indices)
+    with torch.no_grad():
+        for start in range(0, len(indices), batch_size):
+            rows = indices[start:start + batch_size]
+            x = torch.from_numpy(np.asarray(embeddings[rows], dtype=np.float32)).to(device)
+            for i, logit in enumerate(logits_fn(x)):
+                correct[i] += (logit.argmax(dim=-1).cpu().numpy() == labels[rows, i]).sum()
+    for module, training in zip(modules, modes):
+        module.train(training)
+    return correct / max(len(indices), 1)
+
+def add_target_head(model, embeddings, labels, num_labels, train_idx, eval_idx=None, **kwargs):
+    """Append a new head (e.g. a new relatedPolicies taxonomy) to a trained
+    HighAccuracyClassifier, training only that head on cached embeddings.
+
+    Add the new target's LabelEncoder last in ``label_encoders.pkl`` so
+    ``load_model_artifacts`` sizes the heads in the same order.
+    """
+    hidden_size = model.intermediate[-2].normalized_shape[0]
+    head = nn.Sequential(
+        nn.Linear(hidden_size, hidden_size),
+        nn.LayerNorm(hidden_size),
+        nn.Dropout(0.2),
+        nn.GELU(),
+        nn.Linear(hidden_size, hidden_size // 2),
+        nn.LayerNorm(hidden_size // 2),
+        nn.Dropout(0.1),
+        nn.GELU(),
+        nn.Linear(hidden_size // 2, num_labels)
+    ).to(next(model.parameters()).device)
+
+    model.intermediate.eval()
+    def logits_fn(pooled):
+        with torch.no_grad():
+            intermediate_output = model.intermediate(pooled)
+        return [head(intermediate_output)]
+
+    head.train()
+    train_heads(logits_fn, head.parameters(), embeddings, labels, train_idx, eval_idx, modules=[head], **kwargs)
+    head.eval()
+    model.classifiers.append(head)
+    return model
+
+def train_unified_heads(data_path='gen_datasets/combined_data.csv', output_dir='E:/ML/Grivances/saved_model',
+                        base_model='xlm-roberta-base', epochs=20):
+    """Head-only training mode for the unified classifier.
+
+    The encoder runs once to fill the feature cache; the intermediate block
+    and all task heads are then trained on the cached embeddings. The saved
+    artifacts load with ``load_model_artifacts``.
+    """
+    # Imported here so impact_predictions can use this module without the unified model stack
+    from unified_model import HighAccuracyClassifier, ALL_TARGETS
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    df = pd.read_csv(data_path)
+    text_columns = ['complaint', 'title', 'description']
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+
+    label_encoders = fit_label_encoders(df, ALL_TARGETS)
+    labels = encode_labels(df, label_encoders)
+    tokenizer = AutoTokenizer.from_pretrained('xlm-roberta-large')
+    token_cache = build_token_cache(df['input_text'].tolist(), tokenizer, max_len=256, labels=labels)
+
+    model = HighAccuracyClassifier.from_pretrained(
+        base_model,
+        num_labels_per_task=[len(label_encoders[target].classes_) for target in ALL_TARGETS]
+    ).to(device)
+    model.transformer.eval()
+    for param in model.transformer.parameters():
+        param.requires_grad = False
+
+    embeddings = build_feature_cache(model.pool, token_cache, model.transformer.config._name_or_path)
+
+    train_idx, eval_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    model.intermediate.train()
+    model.classifiers.train()
+    head_params = list(model.intermediate.parameters()) + list(model.classifiers.parameters())
+    train_heads(model.head_logits, head_params, embeddings, labels, train_idx, eval_idx, epochs=epochs,
+                modules=[model.intermediate, model.classifiers])
+    model.eval()
+
+    os.makedirs(output_dir, exist_ok=True)
+    model.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'label_encoders.pkl'), 'wb') as f:
+        pickle.dump(label_encoders, f)
+    print(f"Head-only model saved to {output_dir}")
+    return model, label_encoders
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train unified task heads on a frozen-encoder feature cache")
+    parser.add_argument('--data', default='gen_datasets/combined_data.csv')
+    parser.add_argument('--output', default='E:/ML/Grivances/saved_model')
+    parser.add_argument('--base-model', default='xlm-roberta-base')
+    parser.add_argument('--epochs', type=int, default=20)
+    args = parser.parse_args()
+
+    train_unified_heads(args.data, args.output, args.base_model, args.epochs)
@@ -7,6 +7,12 @@ import os
 import pickle
 from sklearn.preprocessing import LabelEncoder
 import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+from feature_cache import build_feature_cache, train_heads
+from adapters import train_adapter, AdapterPredictor, ADAPTER_DIR
 
 # Available prediction targets
 PREDICTION_TARGETS = [
@@ -65,20 +71,27 @@ def train_impact_model(target_column):
     text_columns = ['complaint', 'title', 'description']
     df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
     
-    # Split data
-    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
-    
     # Initialize tokenizer
     tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
     
-    # Create datasets
-    train_dataset = ImpactDataset(train_df, tokenizer, max_len=256, target_column=target_column)
-    test_dataset = ImpactDataset(test_df, tokenizer, max_len=256, target_column=target_column)
+    # Tokenize once for all targets; the label matrix holds every target column
+    label_encoders = fit_label_encoders(df, PREDICTION_TARGETS)
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=256,
+        labels=encode_labels(df, label_encoders)
+    )
+    label_encoder = label_encoders[target_column]
+    label_column = PREDICTION_TARGETS.index(target_column)
+    
+    # Split data and create datasets
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = PretokenizedDataset(token_cache, train_idx, label_column=label_column)
+    test_dataset = PretokenizedDataset(token_cache, test_idx, label_column=label_column)
     
     # Initialize model
     model = AutoModelForSequenceClassification.from_pretrained(
         'bert-base-multilingual-cased',
-        num_labels=train_dataset.num_labels
+        num_labels=len(label_encoder.classes_)
     ).to(device)
     
     # Setup training arguments
@@ -92,7 +105,8 @@ def train_impact_model(target_column):
         evaluation_strategy="epoch",
         save_strategy="no",
         load_best_model_at_end=False,
-        logging_steps=50
+        logging_steps=50,
+        remove_unused_columns=False
     )
     
     # Initialize trainer
@@ -100,7 +114,8 @@ def train_impact_model(target_column):
         model=model,
         args=training_args,
         train_dataset=train_dataset,
-        eval_dataset=test_dataset
+        eval_dataset=test_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id)
     )
     
     # Train and save
@@ -110,57 +125,217 @@ def train_impact_model(target_column):
     # Save model and label encoder
     trainer.save_model(model_dir)
     with open(os.path.join(model_dir, 'label_encoder.pkl'), 'wb') as f:
-        pickle.dump(train_dataset.label_encoder, f)
+        pickle.dump(label_encoder, f)
     
     print(f"Model saved to {model_dir}")
     return model_dir
 
-def predict_impact(text, target_column, model_dir):
+def train_impact_head(target_column, epochs=20):
+    """Head-only mode: train just the classifier layer on cached encoder features.
+
+    The encoder runs once over the corpus and its pooled outputs are shared by
+    every target. The result is saved as a regular sequence classification
+    model, so ``predict_impact`` loads it unchanged.
+    """
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+    
+    # Load and prepare data
+    df = pd.read_csv('gen_datasets/combined_data.csv')
+    text_columns = ['complaint', 'title', 'description']
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
     
-    # Load model and tokenizer
-    model = AutoModelForSequenceClassification.from_pretrained(model_dir).to(device)
     tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
+    label_encoders = fit_label_encoders(df, PREDICTION_TARGETS)
+    labels = encode_labels(df, label_encoders)
+    token_cache = build_token_cache(df['input_text'].tolist(), tokenizer, max_len=256, labels=labels)
+    label_encoder = label_encoders[target_column]
     
-    # Load label encoder
-    with open(os.path.join(model_dir, 'label_encoder.pkl'), 'rb') as f:
-        label_encoder = pickle.load(f)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        'bert-base-multilingual-cased',
+        num_labels=len(label_encoder.classes_)
+    ).to(device)
+    model.eval()
+    
+    # Pooled BERT output is exactly what the classifier layer consumes
+    embeddings = build_feature_cache(
+        lambda input_ids, attention_mask: model.bert(input_ids=input_ids, attention_mask=attention_mask).pooler_output,
+        token_cache,
+        'bert-base-multilingual-cased'
+    )
+    
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    model.classifier.train()
+    train_heads(
+        lambda pooled: [model.classifier(pooled)],
+        model.classifier.parameters(),
+        embeddings,
+        labels[:, PREDICTION_TARGETS.index(target_column)],
+        train_idx,
+        test_idx,
+        epochs=epochs,
+        label_smoothing=0.0,
+        modules=[model.classifier]
+    )
+    model.eval()
+    
+    model_dir = f'E:/ML/Grivances/impact_models/{target_column}'
+    os.makedirs(model_dir, exist_ok=True)
+    model.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, 'label_encoder.pkl'), 'wb') as f:
+        pickle.dump(label_encoder, f)
+    
+    print(f"Model saved to {model_dir}")
+    return model_dir
+
+class ImpactModelRegistry:
+    """Process-wide cache of per-target impact models.
+
+    Each target's model and label encoder is loaded from disk once and kept
+    in an LRU bounded by ``memory_budget_mb``; every target shares one
+    tokenizer.
+    """
+
+    def __init__(self, model_root='E:/ML/Grivances/impact_models', memory_budget_mb=4096,
+                 tokenizer_name='bert-base-multilingual-cased'):
+        self.model_root = model_root
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.tokenizer_name = tokenizer_name
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._tokenizer = None
+        self._models = OrderedDict()  # model_dir -> (model, label_lookup, size_bytes)
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+        return self._tokenizer
+
+    def model_dir(self, target_column):
+        return os.path.join(self.model_root, target_column)
+
+    def memory_used(self):
+        return sum(size for _, _, size in self._models.values())
+
+    def get(self, target_column, model_dir=None):
+        """Return ``(model, label_lookup)``, loading and evicting as needed"""
+        model_dir = model_dir or self.model_dir(target_column)
+        with self._lock:
+            if model_dir in self._models:
+                self._models.move_to_end(model_dir)
+                model, label_lookup, _ = self._models[model_dir]
+                return model, label_lookup
+
+            print(f"Loading impact model for {target_column} from {model_dir}")
+            model = AutoModelForSequenceClassification.from_pretrained(model_dir).to(self.device)
+            model.eval()
+            with open(os.path.join(model_dir, 'label_encoder.pkl'), 'rb') as f:
+                label_encoder = pickle.load(f)
+            label_lookup = np.asarray(label_encoder.classes_, dtype=object)
+            size = sum(p.numel() * p.element_size() for p in model.parameters())
+
+            # Evict least recently used models until the new one fits
+            while self._models and self.memory_used() + size > self.memory_budget:
+                evicted_dir, _ = self._models.popitem(last=False)
+                print(f"Evicting impact model: {evicted_dir}")
+            self._models[model_dir] = (model, label_lookup, size)
+            return model, label_lookup
+
+    def predict_impacts(self, texts, targets=None, batch_size=32, max_length=256):
+        """Predict the selected targets for a batch of texts.
+
+        Texts are tokenized once, in length-sorted batches, and every target
+        model runs on the same padded batches. Models are fetched one target
+        at a time, so the LRU can evict them under the memory budget.
+        """
+        texts = [str(text) for text in texts]
+        if targets is None:
+            targets = [t for t in PREDICTION_TARGETS if os.path.exists(self.model_dir(t))]
+        results = [{} for _ in texts]
+        order = np.argsort([len(text) for text in texts], kind='stable')
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [texts[i] for i in batch_idx], return_tensors="pt",
+                padding=True, truncation=True, max_length=max_length
+            )
+            batches.append((batch_idx, inputs))
+
+        with torch.no_grad():
+            for target in targets:
+                model, label_lookup = self.get(target)
+                for batch_idx, inputs in batches:
+                    inputs = {k: v.to(self.device) for k, v in inputs.items()}
+                    predictions = model(**inputs).logits.argmax(dim=1).cpu().numpy()
+                    for i, label in zip(batch_idx, label_lookup[predictions]):
+                        results[i][target] = label
+                del model
+        return results
+
+_REGISTRY = None
+
+def get_registry(**kwargs):
+    """Shared registry for this process; kwargs only apply on first call"""
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = ImpactModelRegistry(**kwargs)
+    return _REGISTRY
+
+def predict_impacts(texts, targets=None, batch_size=32):
+    return get_registry().predict_impacts(texts, targets, batch_size=batch_size)
+
+def predict_impact(text, target_column, model_dir):
+    registry = get_registry()
+    model, label_lookup = registry.get(target_column, model_dir)
     
     # Prepare input
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=256)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
+    inputs = registry.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=256)
+    inputs = {k: v.to(registry.device) for k, v in inputs.items()}
     
     # Get prediction
-    model.eval()
     with torch.no_grad():
         outputs = model(**inputs)
         prediction = outputs.logits.argmax(dim=1)
     
     # Convert to label
-    predicted_label = label_encoder.inverse_transform([prediction.item()])[0]
-    return predicted_label
+    return label_lookup[prediction.item()]
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--train', choices=PREDICTION_TARGETS, help='Target column to train model for')
+    parser.add_argument('--head-only', action='store_true', help='Train only the classifier on cached encoder features')
+    parser.add_argument('--adapter', action='store_true', help='Train/serve LoRA adapters on one shared frozen encoder')
     parser.add_argument('--predict', action='store_true', help='Make predictions using trained model')
     parser.add_argument('--text', type=str, help='Text to predict for')
     args = parser.parse_args()
     
     if args.train:
-        model_dir = train_impact_model(args.train)
+        if args.adapter:
+            train_adapter(args.train)
+        elif args.head_only:
+            train_impact_head(args.train)
+        else:
+            train_impact_model(args.train)
         print(f"Training completed for {args.train}")
     
     if args.predict:
         if not args.text:
             print("Please provide text to predict using --text")
             return
-            
-        for target in PREDICTION_TARGETS:
-            model_dir = f'E:/ML/Grivances/impact_models/{target}'
-            if os.path.exists(model_dir):
-                prediction = predict_impact(args.text, target, model_dir)
+        
+        if args.adapter:
+            # One encoder in memory, adapters switched per target
+            predictor = AdapterPredictor(ADAPTER_DIR)
+            targets = [t for t in PREDICTION_TARGETS if t in predictor.targets]
+            for target, prediction in predictor.predict_many([args.text], targets)[0].items():
                 print(f"{target}: {prediction}")
+            return
+            
+        for target, prediction in predict_impacts([args.text])[0].items():
+            print(f"{target}: {prediction}")
 
 if __name__ == "__main__":
     main()
@@ -9,8 +9,8 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
 import os
-
-df = pd.read_csv('gen_datasets/combined_data.csv')
+import pickle
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
 
 target_columns = [
     'category',           
@@ -23,12 +23,9 @@ target_columns = [
     'environmentalImpact'  
 ]
 
-print("Available columns:", df.columns.tolist())
-print("Target columns present:", [col for col in target_columns if col in df.columns])
-
 text_columns = ['complaint', 'title', 'description']
 
-df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+GRIEVANCE_MODEL_DIR = './grievance_model'
 
 class GrievanceDataset(Dataset):
     def __init__(self, dataframe, tokenizer, max_len):
@@ -77,83 +74,120 @@ class GrievanceDataset(Dataset):
             'labels': labels
         }
 
-tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
-
-train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
-
-train_dataset = GrievanceDataset(train_df, tokenizer, max_len=512)
-test_dataset = GrievanceDataset(test_df, tokenizer, max_len=512)
-
-model = AutoModelForSequenceClassification.from_pretrained(
-    'bert-base-multilingual-cased',
-    num_labels=len(train_dataset.label_encoders[target_columns[0]].classes_),  # Use first target's classes
-    problem_type="single_label_classification"
-)
-
-# Create checkpoints directory if it doesn't exist
-os.makedirs('checkpoints', exist_ok=True)
-
-# Modify training arguments to save checkpoints more frequently and handle interruptions
-training_args = TrainingArguments(
-    output_dir='./checkpoints',
-    num_train_epochs=3,
-    per_device_train_batch_size=4,
-    per_device_eval_batch_size=4,
-    warmup_steps=500,
-    weight_decay=0.01,
-    logging_dir='./logs',
-    logging_steps=10,
-    save_strategy="steps",
-    save_steps=50,
-    evaluation_strategy="steps",
-    eval_steps=50,
-    save_total_limit=3,  # Keep only last 3 checkpoints
-    load_best_model_at_end=True,
-    # Add fp16 for memory efficiency
-    fp16=True if torch.cuda.is_available() else False,
-)
-
-# Try to resume from checkpoint
-last_checkpoint = None
-if os.path.exists('checkpoints'):
-    checkpoints = [f for f in os.listdir('checkpoints') if f.startswith('checkpoint-')]
-    if checkpoints:
-        last_checkpoint = os.path.join('checkpoints', sorted(checkpoints)[-1])
-
-# Initialize trainer with checkpoint handling
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=train_dataset,
-    eval_dataset=test_dataset,
-)
-
-# Train with error handling
-try:
-    trainer.train(resume_from_checkpoint=last_checkpoint)
-    # Save final model
-    trainer.save_model('final_model')
-except Exception as e:
-    print(f"Training was interrupted: {e}")
-    # Save checkpoint even on error
-    trainer.save_model('interrupted_model')
-    raise e
-
-model.save_pretrained('./grievance_model')
-tokenizer.save_pretrained('./grievance_model')
+def train_grievance_model(data_path='gen_datasets/combined_data.csv', output_dir=GRIEVANCE_MODEL_DIR):
+    """Fine-tune the classifier; only runs when called explicitly"""
+    df = pd.read_csv(data_path)
+
+    print("Available columns:", df.columns.tolist())
+    print("Target columns present:", [col for col in target_columns if col in df.columns])
+
+    df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
+
+    tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
+
+    present_targets = [col for col in target_columns if col in df.columns]
+    label_encoders = fit_label_encoders(df, present_targets)
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=512,
+        labels=encode_labels(df, label_encoders)
+    )
+
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+
+    train_dataset = PretokenizedDataset(token_cache, train_idx, label_column=0)  # Take first target for now
+    test_dataset = PretokenizedDataset(token_cache, test_idx, label_column=0)
+
+    model = AutoModelForSequenceClassification.from_pretrained(
+        'bert-base-multilingual-cased',
+        num_labels=len(label_encoders[present_targets[0]].classes_),  # Use first target's classes
+        problem_type="single_label_classification"
+    )
+
+    # Create checkpoints directory if it doesn't exist
+    os.makedirs('checkpoints', exist_ok=True)
+
+    # Modify training arguments to save checkpoints more frequently and handle interruptions
+    training_args = TrainingArguments(
+        output_dir='./checkpoints',
+        num_train_epochs=3,
+        per_device_train_batch_size=4,
+        per_device_eval_batch_size=4,
+        warmup_steps=500,
+        weight_decay=0.01,
+        logging_dir='./logs',
+        logging_steps=10,
+        save_strategy="steps",
+        save_steps=50,
+        evaluation_strategy="steps",
+        eval_steps=50,
+        save_total_limit=3,  # Keep only last 3 checkpoints
+        load_best_model_at_end=True,
+        # Add fp16 for memory efficiency
+        fp16=True if torch.cuda.is_available() else False,
+        remove_unused_columns=False,
+    )
+
+    # Try to resume from checkpoint
+    last_checkpoint = None
+    if os.path.exists('checkpoints'):
+        checkpoints = [f for f in os.listdir('checkpoints') if f.startswith('checkpoint-')]
+        if checkpoints:
+            last_checkpoint = os.path.join('checkpoints', sorted(checkpoints)[-1])
+
+    # Initialize trainer with checkpoint handling
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_dataset,
+        eval_dataset=test_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id),
+    )
+
+    # Train with error handling
+    try:
+        trainer.train(resume_from_checkpoint=last_checkpoint)
+        # Save final model
+        trainer.save_model('final_model')
+    except Exception as e:
+        print(f"Training was interrupted: {e}")
+        # Save checkpoint even on error
+        trainer.save_model('interrupted_model')
+        raise e
+
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'label_encoders.pkl'), 'wb') as f:
+        pickle.dump(label_encoders, f)
+
+    print(f"Model training complete and saved to '{output_dir}'")
+    return model, tokenizer, label_encoders
+
+_grievance_model = None
+
+def load_grievance_model(model_dir=GRIEVANCE_MODEL_DIR):
+    """Load the saved classifier on first use and reuse it afterwards"""
+    global _grievance_model
+    if _grievance_model is None:
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        model.eval()
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, 'label_encoders.pkl'), 'rb') as f:
+            label_encoders = pickle.load(f)
+        _grievance_model = (model, tokenizer, label_encoders)
+    return _grievance_model
 
 def predict_grievance(text):
+    model, tokenizer, label_encoders = load_grievance_model()
     inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
     outputs = model(**inputs)
     
     predictions = {}
     for i, col in enumerate(target_columns):
         pred = outputs.logits[0][i].argmax().item()
-        predictions[col] = train_dataset.label_encoders[col][pred]
+        predictions[col] = label_encoders[col].classes_[pred]
     
     return predictions
 
-print("Model training complete and saved to './grievance_model'")
 
 class GrievancePriorityPredictor:
     def __init__(self):
@@ -300,4 +334,5 @@ def main():
     predictor.save_model('grievance_priority_model.joblib')
 
 if __name__ == "__main__":
+    train_grievance_model()
     main()
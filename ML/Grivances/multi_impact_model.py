@@ -7,6 +7,9 @@ from torch.utils.data import Dataset
 import os
 import pickle
 from sklearn.preprocessing import LabelEncoder
+import numpy as np
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+from bucketing import BucketingTrainer
 
 # Define all targets to predict
 PREDICTION_TARGETS = [
@@ -91,19 +94,24 @@ def train_model():
     text_columns = ['complaint', 'title', 'description']
     df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
     
-    # Split data
-    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
-    
     # Initialize tokenizer
     tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
     
-    # Create datasets
-    train_dataset = MultiTargetDataset(train_df, tokenizer, max_len=256)
-    test_dataset = MultiTargetDataset(test_df, tokenizer, max_len=256)
+    # Tokenize the corpus once into a memory-mapped cache
+    label_encoders = fit_label_encoders(df, PREDICTION_TARGETS)
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=256,
+        labels=encode_labels(df, label_encoders)
+    )
+    
+    # Split data and create datasets
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = PretokenizedDataset(token_cache, train_idx)
+    test_dataset = PretokenizedDataset(token_cache, test_idx)
     
     # Get number of labels for each target
     num_labels_per_task = [
-        len(train_dataset.label_encoders[target].classes_)
+        len(label_encoders[target].classes_)
         for target in PREDICTION_TARGETS
     ]
 
@@ -124,15 +132,17 @@ def train_model():
         evaluation_strategy="epoch",
         save_strategy="no",
         load_best_model_at_end=False,
-        logging_steps=50
+        logging_steps=50,
+        remove_unused_columns=False
     )
     
-    # Initialize trainer
-    trainer = Trainer(
+    # Initialize trainer with length-bucketed batches
+    trainer = BucketingTrainer(
         model=model,
         args=training_args,
         train_dataset=train_dataset,
-        eval_dataset=test_dataset
+        eval_dataset=test_dataset,
+        data_collator=DynamicPaddingCollator(tokenizer.pad_token_id)
     )
     
     # Train and save
@@ -142,7 +152,7 @@ def train_model():
     # Save model and label encoders
     trainer.save_model(model_dir)
     with open(os.path.join(model_dir, 'label_encoders.pkl'), 'wb') as f:
-        pickle.dump(train_dataset.label_encoders, f)
+        pickle.dump(label_encoders, f)
     
     print(f"Model and label encoders saved to {model_dir}")
     return model_dir
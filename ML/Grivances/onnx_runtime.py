@@ -0,0 +1,201 @@
+import os
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from transformers import AutoTokenizer
+from unified_model import load_model_artifacts, iter_length_batches, predict_proba_many, build_label_lookup
+
+# ONNX Runtime is optional; export still works without it
+ONNXRUNTIME_AVAILABLE = False
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    print("onnxruntime not installed. Install using: pip install onnxruntime")
+
+class _LogitsWrapper(nn.Module):
+    """Returns task logits as a flat tuple so the graph has one output per head"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return tuple(self.model(input_ids=input_ids, attention_mask=attention_mask)['logits'])
+
+def export_onnx(model, tokenizer, label_encoders, output_dir, opset=14):
+    """Export the encoder, intermediate block and all heads to ``model.onnx``.
+
+    Batch and sequence axes are dynamic. The tokenizer and label encoders are
+    saved next to the graph so the runtime directory is self-contained.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    onnx_path = os.path.join(output_dir, 'model.onnx')
+    output_names = [f'logits_{target}' for target in label_encoders]
+
+    model = model.to('cpu').eval()
+    dummy = tokenizer(["dummy grievance text", "a second, slightly longer dummy grievance"],
+                      padding=True, return_tensors='pt')
+    dynamic_axes = {
+        'input_ids': {0: 'batch', 1: 'sequence'},
+        'attention_mask': {0: 'batch', 1: 'sequence'},
+    }
+    dynamic_axes.update({name: {0: 'batch'} for name in output_names})
+
+    print(f"Exporting ONNX graph to {onnx_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsWrapper(model),
+            (dummy['input_ids'], dummy['attention_mask']),
+            onnx_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, 'label_encoders.pkl'), 'wb') as f:
+        pickle.dump(label_encoders, f)
+    return onnx_path
+
+def quantize_onnx(onnx_path, quantized_path=None):
+    """Write a dynamic int8-quantized copy of an exported graph"""
+    if not ONNXRUNTIME_AVAILABLE:
+        raise RuntimeError("onnxruntime is required for quantization")
+    if quantized_path is None:
+        quantized_path = onnx_path.replace('.onnx', '.int8.onnx')
+    print(f"Quantizing {onnx_path} -> {quantized_path}")
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+class OnnxGrievanceClassifier:
+    """CPU runtime for an exported classifier with the same ``predict_many`` output"""
+
+    def __init__(self, model_dir, quantized=False, num_threads=None):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise RuntimeError("onnxruntime is required for OnnxGrievanceClassifier")
+        graph = 'model.int8.onnx' if quantized else 'model.onnx'
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, graph), options, providers=['CPUExecutionProvider']
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, 'label_encoders.pkl'), 'rb') as f:
+            self.label_encoders = pickle.load(f)
+        self.label_lookup = build_label_lookup(self.label_encoders)
+        self.targets = list(self.label_encoders.keys())
+
+    def predict_logits_many(self, texts, batch_size=32, max_length=256):
+        """Raw logits per head, one ``(len(texts), num_labels)`` array each"""
+        texts = [str(text) for text in texts]
+        head_logits = None
+        for batch_idx, batch in iter_length_batches(texts, self.tokenizer, batch_size, max_length, return_tensors='np'):
+            outputs = self.session.run(None, {
+                'input_ids': batch['input_ids'].astype(np.int64),
+                'attention_mask': batch['attention_mask'].astype(np.int64),
+            })
+            if head_logits is None:
+                head_logits = [np.zeros((len(texts), out.shape[-1]), dtype=np.float32) for out in outputs]
+            for i, out in enumerate(outputs):
+                head_logits[i][batch_idx] = out
+        return head_logits or []
+
+    def predict_many(self, texts, batch_size=32, max_length=256):
+        texts = [str(text) for text in texts]
+        if not texts:
+            return []
+        head_logits = self.predict_logits_many(texts, batch_size, max_length)
+        decoded = {
+            target: self.label_lookup[target][head_logits[i].argmax(axis=1)]
+            for i, target in enumerate(self.targets)
+        }
+        return [{target: decoded[target][row] for target in self.targets} for row in range(len(texts))]
+
+def check_parity(model, tokenizer, runtime, texts, threshold=0.99, batch_size=32):
+    """Argmax agreement per head between the eager model and an ONNX runtime.
+
+    Raises RuntimeError if any head falls below ``threshold``.
+    """
+    eager = predict_proba_many(texts, [model.to('cpu')], tokenizer, batch_size=batch_size, device='cpu')
+    onnx = runtime.predict_logits_many(texts, batch_size=batch_size)
+    agreement = {
+        target: float(np.mean(eager[i].argmax(axis=1) == onnx[i].argmax(axis=1)))
+        for i, target in enumerate(runtime.targets)
+    }
+    for target, value in agreement.items():
+        print(f"{target}: {value:.4f} argmax agreement")
+
+    failing = {t: v for t, v in agreement.items() if v < threshold}
+    if failing:
+        raise RuntimeError(f"ONNX parity below {threshold}: {failing}")
+    return agreement
+
+def benchmark(runners, texts, batch_sizes=(1, 8, 32)):
+    """Time each ``runner(texts, batch_size)`` and report latency/throughput"""
+    rows = []
+    for name, runner in runners.items():
+        runner(texts[:batch_sizes[-1]], batch_sizes[-1])  # Warm-up
+        for batch_size in batch_sizes:
+            start_time = time.perf_counter()
+            runner(texts, batch_size)
+            elapsed = time.perf_counter() - start_time
+            rows.append({
+                'runtime': name,
+                'batch_size': batch_size,
+                'ms_per_batch': 1000 * elapsed / max(1, -(-len(texts) // batch_size)),
+                'rows_per_sec': len(texts) / max(elapsed, 1e-9),
+            })
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Export HighAccuracyClassifier to ONNX and compare runtimes")
+    parser.add_argument('--model', default='E:/ML/Grivances/saved_model')
+    parser.add_argument('--output', default='E:/ML/Grivances/onnx_model')
+    parser.add_argument('--data', default='E:/ML/Grivances/test.csv')
+    parser.add_argument('--threshold', type=float, default=0.99, help='Minimum per-head argmax agreement')
+    parser.add_argument('--int8-threshold', type=float, default=0.95,
+                        help='Minimum per-head argmax agreement for the int8 graph (quantization shifts some argmaxes)')
+    parser.add_argument('--samples', type=int, default=256)
+    args = parser.parse_args()
+
+    models, tokenizer, label_encoders = load_model_artifacts(args.model)
+    model = models[0].to('cpu').eval()
+
+    onnx_path = export_onnx(model, tokenizer, label_encoders, args.output)
+    quantize_onnx(onnx_path)
+
+    test_df = pd.read_csv(args.data)
+    texts = test_df.apply(
+        lambda row: ' '.join([str(row[col]) for col in ['Complaint', 'Title'] if col in row and pd.notna(row[col])]),
+        axis=1
+    ).tolist()[:args.samples]
+
+    fp32_runtime = OnnxGrievanceClassifier(args.output)
+    int8_runtime = OnnxGrievanceClassifier(args.output, quantized=True)
+
+    print("\nParity (fp32 ONNX vs eager):")
+    check_parity(model, tokenizer, fp32_runtime, texts, args.threshold)
+    print("\nParity (int8 ONNX vs eager):")
+    check_parity(model, tokenizer, int8_runtime, texts, args.int8_threshold)
+
+    print("\nLatency / throughput on CPU:")
+    benchmark({
+        'eager_fp32': lambda t, b: predict_proba_many(t, [model], tokenizer, batch_size=b, device='cpu'),
+        'onnx_fp32': lambda t, b: fp32_runtime.predict_logits_many(t, batch_size=b),
+        'onnx_int8': lambda t, b: int8_runtime.predict_logits_many(t, batch_size=b),
+    }, texts)
+
+if __name__ == "__main__":
+    main()
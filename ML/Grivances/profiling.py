@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import torch
+from transformers import TrainerCallback
+
+# psutil gives RSS on every platform (resource is POSIX only)
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+    print("psutil not installed. Peak RSS will not be recorded. Install using: pip install psutil")
+
+PHASES = ['data', 'forward', 'loss', 'backward', 'optimizer']
+
+def _called_children(module):
+    """Direct children that run in forward, looking inside ModuleList/ModuleDict containers"""
+    for child in module.children():
+        if isinstance(child, (torch.nn.ModuleList, torch.nn.ModuleDict)):
+            yield from _called_children(child)
+        else:
+            yield child
+
+class StepProfilerCallback(TrainerCallback):
+    """Per-step timing of data loading, forward, loss, backward and optimizer.
+
+    Forward time comes from hooks on the model and its direct children
+    (ModuleList/ModuleDict children are never called, so their members are
+    hooked instead, e.g. each task head in ``classifiers``): time after the
+    last child finishes until the model returns is counted as loss
+    (e.g. the cross entropy and L2 term in HighAccuracyClassifier.forward).
+    Backward is the gap between forward end and the next substep/optimizer
+    event. Each step is appended to ``trace.jsonl``; ``summary.md`` is
+    written at the end of training. Steps in ``profile_steps`` (inclusive
+    range) are also wrapped in ``torch.profiler`` and exported as a Chrome
+    trace.
+    """
+
+    def __init__(self, output_dir='profile', profile_steps=None):
+        self.output_dir = output_dir
+        self.profile_steps = profile_steps
+        self.trace_path = os.path.join(output_dir, 'trace.jsonl')
+        self.records = []
+        self._hooks = []
+        self._profiler = None
+        self._process = psutil.Process() if PSUTIL_AVAILABLE else None
+        self._peak_rss = 0
+        self._reset_step()
+        self._last_marker = None
+
+    def _reset_step(self):
+        self._step = {phase: 0.0 for phase in PHASES}
+        self._step['tokens'] = 0
+        self._forward_start = None
+        self._forward_end = None
+        self._last_child_end = None
+        self._step_start = None
+
+    # Model hooks
+    def _on_forward_pre(self, module, args, kwargs):
+        now = time.perf_counter()
+        if not module.training:
+            return
+        self._forward_start = now
+        self._last_child_end = None
+        if self._last_marker is not None:
+            self._step['data'] += now - self._last_marker
+            self._last_marker = None
+        attention_mask = kwargs.get('attention_mask')
+        if attention_mask is not None:
+            self._step['tokens'] += int(attention_mask.sum().item())
+        elif kwargs.get('input_ids') is not None:
+            self._step['tokens'] += kwargs['input_ids'].numel()
+
+    def _on_child_forward(self, module, args, output):
+        self._last_child_end = time.perf_counter()
+
+    def _on_forward(self, module, args, kwargs, output):
+        now = time.perf_counter()
+        if not module.training or self._forward_start is None:
+            return
+        compute_end = self._last_child_end or now
+        self._step['forward'] += compute_end - self._forward_start
+        self._step['loss'] += now - compute_end
+        self._forward_end = now
+
+    def _close_backward(self, now):
+        if self._forward_end is not None:
+            self._step['backward'] += now - self._forward_end
+            self._forward_end = None
+
+    # Trainer events
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        os.makedirs(self.output_dir, exist_ok=True)
+        open(self.trace_path, 'w').close()
+        self.records = []
+        if model is not None:
+            self._hooks.append(model.register_forward_pre_hook(self._on_forward_pre, with_kwargs=True))
+            self._hooks.append(model.register_forward_hook(self._on_forward, with_kwargs=True))
+            for child in _called_children(model):
+                self._hooks.append(child.register_forward_hook(self._on_child_forward))
+        self._last_marker = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self._step_start = self._last_marker or time.perf_counter()
+        if self.profile_steps and state.global_step == self.profile_steps[0] and self._profiler is None:
+            self._profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+                record_shapes=True,
+                profile_memory=True,
+            )
+            self._profiler.__enter__()
+
+    def on_substep_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        self._close_backward(now)
+        self._last_marker = now
+
+    def on_pre_optimizer_step(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        self._close_backward(now)
+        self._optimizer_start = now
+
+    def on_optimizer_step(self, args, state, control, **kwargs):
+        if getattr(self, '_optimizer_start', None) is not None:
+            self._step['optimizer'] += time.perf_counter() - self._optimizer_start
+            self._optimizer_start = None
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        # Older transformers have no optimizer events; count the rest as backward
+        self._close_backward(now)
+
+        if self._process is not None:
+            self._peak_rss = max(self._peak_rss, self._process.memory_info().rss)
+
+        total = now - (self._step_start or now)
+        record = {
+            'step': state.global_step,
+            **{f'{phase}_s': round(self._step[phase], 6) for phase in PHASES},
+            'total_s': round(total, 6),
+            'tokens': self._step['tokens'],
+            'tokens_per_sec': round(self._step['tokens'] / total, 2) if total > 0 else 0.0,
+            'peak_rss_mb': round(self._peak_rss / 2**20, 1),
+        }
+        self.records.append(record)
+        with open(self.trace_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        if self._profiler is not None and state.global_step >= self.profile_steps[1]:
+            self._profiler.__exit__(None, None, None)
+            chrome_path = os.path.join(self.output_dir, f'chrome_trace_steps_{self.profile_steps[0]}-{self.profile_steps[1]}.json')
+            self._profiler.export_chrome_trace(chrome_path)
+            print(f"Chrome trace written to {chrome_path}")
+            self._profiler = None
+
+        self._reset_step()
+        self._last_marker = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+        if self._profiler is not None:
+            self._profiler.__exit__(None, None, None)
+            self._profiler = None
+        if self.records:
+            summary = summarize_trace(self.records)
+            with open(os.path.join(self.output_dir, 'summary.md'), 'w') as f:
+                f.write(summary)
+            print(summary)
+
+def summarize_trace(records):
+    """Summary table (mean/p50/p95 and share of step time) for each phase"""
+    df = pd.DataFrame(records)
+    total = df['total_s'].sum()
+    lines = [
+        "| Phase | Mean (ms) | p50 (ms) | p95 (ms) | Share |",
+        "|---|---|---|---|---|",
+    ]
+    for phase in PHASES:
+        values = df[f'{phase}_s'] * 1000
+        share = df[f'{phase}_s'].sum() / total if total > 0 else 0.0
+        lines.append(
+            f"| {phase} | {values.mean():.1f} | {np.percentile(values, 50):.1f} | "
+            f"{np.percentile(values, 95):.1f} | {share:.1%} |"
+        )
+    lines += [
+        "",
+        f"Steps: {len(df)}, mean step: {df['total_s'].mean() * 1000:.1f} ms, "
+        f"tokens/sec: {df['tokens'].sum() / total if total > 0 else 0:.1f}, "
+        f"peak RSS: {df['peak_rss_mb'].max():.1f} MB",
+    ]
+    return '\n'.join(lines) + '\n'
+
+def load_trace(path):
+    """Read a ``trace.jsonl`` written by StepProfilerCallback"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Summarize a step profiler trace")
+    parser.add_argument('trace', help='Path to trace.jsonl')
+    args = parser.parse_args()
+    print(summarize_trace(load_trace(args.trace)))
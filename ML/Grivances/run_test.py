@@ -1,7 +1,7 @@
 import pandas as pd
 import torch
-from tqdm import tqdm
-from unified_model import load_model_artifacts, predict_all, ALL_TARGETS, HighAccuracyClassifier
+import time
+from unified_model import load_model_artifacts, predict_many, ALL_TARGETS, HighAccuracyClassifier
 import os
 import pickle
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
@@ -48,16 +48,18 @@ def run_testing():
     )
     
     # Make predictions
-    all_predictions = []
     print("\nRunning predictions...")
     
-    for idx, row in tqdm(test_df.iterrows(), total=len(test_df)):
-        try:
-            predictions = predict_all(row['input_text'], models, tokenizer, label_encoders)
-            all_predictions.append(predictions)
-        except Exception as e:
-            print(f"Error predicting row {idx}: {e}")
-            all_predictions.append({target: 'unknown' for target in label_encoders.keys()})
+    start_time = time.perf_counter()
+    try:
+        all_predictions = predict_many(
+            test_df['input_text'].tolist(), models, tokenizer, label_encoders, batch_size=32
+        )
+    except Exception as e:
+        print(f"Error running batched predictions: {e}")
+        all_predictions = [{target: 'unknown' for target in label_encoders.keys()} for _ in range(len(test_df))]
+    elapsed = time.perf_counter() - start_time
+    print(f"Predicted {len(test_df)} rows in {elapsed:.2f}s ({len(test_df) / max(elapsed, 1e-9):.1f} rows/sec on {device})")
     
     # Ensure we have predictions before continuing
     if not all_predictions:
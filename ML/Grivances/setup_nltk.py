@@ -1,14 +1,42 @@
-import nltk
+import os
+from functools import lru_cache
 
-def download_nltk_data():
-    """Download required NLTK data"""
+# Local NLTK data cache. Importing modules never downloads; run this script once instead.
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+
+NLTK_RESOURCES = {
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+}
+
+def _add_data_path(nltk):
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+@lru_cache(maxsize=None)
+def nltk_resource_available(name):
+    """Check the local cache (and NLTK's default paths) for a resource; never downloads"""
+    import nltk
+    _add_data_path(nltk)
+    try:
+        nltk.data.find(NLTK_RESOURCES.get(name, name))
+        return True
+    except LookupError:
+        return False
+
+def download_nltk_data(resources=tuple(NLTK_RESOURCES)):
+    """Download required NLTK data into the local cache"""
+    import nltk
+    _add_data_path(nltk)
     try:
-        nltk.download('wordnet')
-        nltk.download('averaged_perceptron_tagger')
-        nltk.download('omw-1.4')
-        print("NLTK data downloaded successfully")
+        os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+        for resource in resources:
+            nltk.download(resource, download_dir=NLTK_DATA_DIR)
+        print(f"NLTK data downloaded successfully to {NLTK_DATA_DIR}")
     except Exception as e:
         print(f"Error downloading NLTK data: {e}")
+    nltk_resource_available.cache_clear()
 
 if __name__ == "__main__":
     download_nltk_data()
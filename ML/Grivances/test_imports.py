@@ -0,0 +1,9 @@
+import os
+import pytest
+from check_imports import MODULES, IMPORT_BUDGET, check_module
+
+@pytest.mark.parametrize('directory, module', MODULES,
+                         ids=[f"{os.path.basename(d)}/{m}" for d, m in MODULES])
+def test_import_is_fast_and_side_effect_free(directory, module):
+    result = check_module(directory, module, IMPORT_BUDGET)
+    assert result['problems'] == []
@@ -1,12 +1,11 @@
 import pandas as pd
 import torch
 import os
-import numpy as np
-from tqdm import tqdm
+import time
 from sklearn.metrics import classification_report, accuracy_score, f1_score
-from unified_model import load_model_artifacts, ALL_TARGETS, EnhancedDataset
+from unified_model import load_model_artifacts, ALL_TARGETS, predict_many
 
-def test_saved_model(test_csv_path='E:/ML/Grivances/test.csv', batch_size=8):
+def test_saved_model(test_csv_path='E:/ML/Grivances/test.csv', batch_size=32):
     # Set up device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
@@ -29,48 +28,22 @@ def test_saved_model(test_csv_path='E:/ML/Grivances/test.csv', batch_size=8):
         axis=1
     )
     
-    # Create test dataset
-    test_dataset = EnhancedDataset(test_df, tokenizer, max_len=256, augment=False)
-    
-    # Prepare DataLoader
-    from torch.utils.data import DataLoader
-    test_loader = DataLoader(
-        test_dataset,
-        batch_size=batch_size,
-        shuffle=False,
-        num_workers=0
-    )
-    
-    # Initialize metrics storage
-    all_predictions = {target: [] for target in ALL_TARGETS}
-    all_labels = {target: [] for target in ALL_TARGETS}
-    
-    # Evaluation loop
+    # Get batched ensemble predictions
     print("Starting evaluation...")
-    for model in models:
-        model.eval()
+    start_time = time.perf_counter()
+    predictions = predict_many(
+        test_df['input_text'].tolist(), models, tokenizer, label_encoders, batch_size=batch_size
+    )
+    elapsed = time.perf_counter() - start_time
+    print(f"Predicted {len(test_df)} rows in {elapsed:.2f}s ({len(test_df) / max(elapsed, 1e-9):.1f} rows/sec on {device})")
     
-    with torch.no_grad():
-        for batch in tqdm(test_loader, desc="Testing"):
-            # Move batch to device
-            input_ids = batch['input_ids'].to(device)
-            attention_mask = batch['attention_mask'].to(device)
-            labels = batch['labels'].to(device)
-            
-            # Get ensemble predictions
-            batch_predictions = []
-            for model in models:
-                outputs = model(input_ids=input_ids, attention_mask=attention_mask)
-                batch_predictions.append([logits.argmax(dim=-1) for logits in outputs['logits']])
-            
-            # Average ensemble predictions
-            averaged_preds = torch.stack([torch.stack(model_preds) for model_preds in batch_predictions]).mean(0)
-            final_preds = averaged_preds.argmax(dim=-1)
-            
-            # Store predictions and labels
-            for i, target in enumerate(ALL_TARGETS):
-                all_predictions[target].extend(final_preds[i].cpu().numpy())
-                all_labels[target].extend(labels[:, i].cpu().numpy())
+    # Collect predictions and labels per target
+    all_predictions = {target: [pred[target] for pred in predictions] for target in ALL_TARGETS}
+    all_labels = {
+        target: test_df[target].fillna('unknown').astype(str).tolist() if target in test_df.columns
+        else ['unknown'] * len(test_df)
+        for target in ALL_TARGETS
+    }
     
     # Calculate and print metrics
     print("\nEvaluation Results:")
@@ -83,9 +56,8 @@ def test_saved_model(test_csv_path='E:/ML/Grivances/test.csv', batch_size=8):
         print(f"\nMetrics for {target}:")
         print("-" * 30)
         
-        # Convert numeric predictions back to labels
-        pred_labels = label_encoders[target].inverse_transform(all_predictions[target])
-        true_labels = label_encoders[target].inverse_transform(all_labels[target])
+        pred_labels = all_predictions[target]
+        true_labels = all_labels[target]
         
         # Calculate metrics
         accuracy = accuracy_score(true_labels, pred_labels)
@@ -0,0 +1,192 @@
+import os
+import json
+import random
+import hashlib
+import shutil
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from sklearn.preprocessing import LabelEncoder
+
+# Default location for tokenized corpora
+TOKEN_CACHE_DIR = 'cache/tokenized'
+
+def fit_label_encoders(df, targets):
+    """Fit one LabelEncoder per target on the full dataframe"""
+    label_encoders = {}
+    for target in targets:
+        values = df[target].fillna('unknown').astype(str) if target in df.columns else ['unknown'] * len(df)
+        le = LabelEncoder()
+        le.fit(values)
+        label_encoders[target] = le
+    return label_encoders
+
+def encode_labels(df, label_encoders):
+    """Encode every target column into an (n_rows, n_targets) int64 matrix"""
+    columns = []
+    for target, le in label_encoders.items():
+        values = df[target].fillna('unknown').astype(str) if target in df.columns else ['unknown'] * len(df)
+        columns.append(le.transform(values))
+    return np.stack(columns, axis=1).astype(np.int64)
+
+def _cache_key(texts, labels, tokenizer_name, max_len):
+    digest = hashlib.sha1()
+    digest.update(f"{tokenizer_name}|{max_len}".encode('utf-8'))
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    if labels is not None:
+        digest.update(np.ascontiguousarray(labels).tobytes())
+    safe_name = tokenizer_name.replace('/', '_').replace('\\', '_').replace(':', '_')
+    return f"{safe_name}-len{max_len}-{digest.hexdigest()[:16]}"
+
+def build_token_cache(texts, tokenizer, max_len, labels=None, cache_dir=TOKEN_CACHE_DIR, chunk_size=1024):
+    """Tokenize ``texts`` once and store them as flat memory-mappable arrays.
+
+    Writes ``input_ids.npy`` (all token ids back to back), ``offsets.npy``,
+    ``lengths.npy`` and optionally ``labels.npy`` into a directory keyed by
+    tokenizer name, max length and content hash. Returns the directory path;
+    an existing cache with the same key is reused as is.
+    """
+    texts = [str(text) for text in texts]
+    tokenizer_name = getattr(tokenizer, 'name_or_path', type(tokenizer).__name__)
+    path = os.path.join(cache_dir, _cache_key(texts, labels, tokenizer_name, max_len))
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        print(f"Using tokenized corpus: {path}")
+        return path
+
+    print(f"Tokenizing {len(texts)} texts into {path}")
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    chunks = []
+    for start in range(0, len(texts), chunk_size):
+        encoded = tokenizer(
+            texts[start:start + chunk_size],
+            add_special_tokens=True,
+            max_length=max_len,
+            truncation=True
+        )['input_ids']
+        for i, ids in enumerate(encoded):
+            lengths[start + i] = len(ids)
+        chunks.append(np.fromiter((t for ids in encoded for t in ids), dtype=np.int32))
+
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    # Write into a temporary directory first so a crash never leaves a half cache
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'input_ids.npy'), np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_path, 'lengths.npy'), lengths)
+    if labels is not None:
+        np.save(os.path.join(tmp_path, 'labels.npy'), np.asarray(labels, dtype=np.int64))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({
+            'tokenizer': tokenizer_name,
+            'max_len': max_len,
+            'num_rows': len(texts),
+            'num_tokens': int(offsets[-1]),
+            'pad_token_id': tokenizer.pad_token_id,
+        }, f, indent=2)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return path
+
+class PretokenizedDataset(Dataset):
+    """Reads token id slices from a cache written by ``build_token_cache``.
+
+    Arrays are opened with ``mmap_mode='r'`` lazily in each process, so
+    DataLoader workers share the page cache instead of a copied DataFrame.
+    ``indices`` selects a subset of rows (e.g. one fold). When a variant cache
+    from ``augmentation.build_variant_cache`` is given, a row is swapped for
+    one of its precomputed variants with probability ``augment_prob``.
+    """
+
+    def __init__(self, cache_path, indices=None, label_column=None,
+                 variant_cache=None, variant_offsets=None, augment_prob=0.0):
+        self.cache_path = cache_path
+        self.label_column = label_column
+        self.variants = PretokenizedDataset(variant_cache) if variant_cache else None
+        self.variant_offsets = variant_offsets
+        self.augment_prob = augment_prob if variant_cache else 0.0
+        with open(os.path.join(cache_path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if indices is None:
+            indices = np.arange(self.meta['num_rows'])
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self._arrays = None
+
+    def _load(self):
+        if self._arrays is None:
+            arrays = {}
+            for name in ('input_ids', 'offsets', 'lengths', 'labels'):
+                file_path = os.path.join(self.cache_path, f'{name}.npy')
+                if os.path.exists(file_path):
+                    arrays[name] = np.load(file_path, mmap_mode='r')
+            self._arrays = arrays
+        return self._arrays
+
+    def __getstate__(self):
+        # Do not pickle open memory maps into DataLoader workers
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    @property
+    def lengths(self):
+        return np.asarray(self._load()['lengths'])[self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def token_ids(self, row):
+        arrays = self._load()
+        start, end = arrays['offsets'][row], arrays['offsets'][row + 1]
+        return torch.from_numpy(np.array(arrays['input_ids'][start:end], dtype=np.int64))
+
+    def __getitem__(self, index):
+        arrays = self._load()
+        row = self.indices[index]
+        input_ids = None
+        if self.augment_prob and random.random() < self.augment_prob:
+            first, last = self.variant_offsets[row], self.variant_offsets[row + 1]
+            if last > first:
+                input_ids = self.variants.token_ids(random.randrange(first, last))
+        if input_ids is None:
+            input_ids = self.token_ids(row)
+        item = {'input_ids': input_ids}
+        if 'labels' in arrays:
+            labels = np.array(arrays['labels'][row], dtype=np.int64)
+            if self.label_column is not None:
+                labels = labels[self.label_column]
+            item['labels'] = torch.from_numpy(np.asarray(labels))
+        return item
+
+class DynamicPaddingCollator:
+    """Pads each batch only to its own longest sequence"""
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=None):
+        self.pad_token_id = pad_token_id if pad_token_id is not None else 0
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        max_len = max(len(f['input_ids']) for f in features)
+        if self.pad_to_multiple_of:
+            max_len = -(-max_len // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        input_ids = torch.full((len(features), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), max_len), dtype=torch.long)
+        for i, f in enumerate(features):
+            length = len(f['input_ids'])
+            input_ids[i, :length] = f['input_ids']
+            attention_mask[i, :length] = 1
+
+        batch = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        # Fixed-size per-example tensors (labels, teacher logits, ...) are stacked as is
+        for key in features[0]:
+            if key != 'input_ids':
+                batch[key] = torch.stack([f[key] for f in features])
+        return batch
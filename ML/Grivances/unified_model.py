@@ -3,16 +3,12 @@ from transformers import (
     AutoTokenizer, 
     AutoModel,
     BertPreTrainedModel, 
-    Trainer, 
     TrainingArguments,
     EarlyStoppingCallback,
     TrainerCallback,  # Added TrainerCallback
-    MarianMTModel,  # Added for translation
-    MarianTokenizer,  # Added for translation
 )
 # ...existing imports...
 from sklearn.model_selection import KFold, train_test_split
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from tqdm import tqdm
 import torch
@@ -23,55 +19,15 @@ import os
 import pickle
 from sklearn.preprocessing import LabelEncoder
 import random
-from nltk.corpus import wordnet
-import nltk
 import shutil
 from glob import glob  # Added glob import
-
-# Simple augmentation setup
-AUGMENTATION_AVAILABLE = False
-try:
-    nltk.download('wordnet')
-    nltk.download('averaged_perceptron_tagger')
-    AUGMENTATION_AVAILABLE = True
-except:
-    print("NLTK WordNet not available. Running without augmentation...")
-
-# Add deep-translator with proper error handling
-TRANSLATOR_AVAILABLE = False
-try:
-    TRANSLATOR_AVAILABLE = True
-except ImportError:
-    print("deep-translator not installed. Install using: pip install deep-translator")
-    print("Running without translation augmentation...")
-
-class SimpleAugmenter:
-    def __init__(self):
-        self.enabled = AUGMENTATION_AVAILABLE
-    
-    def get_synonyms(self, word):
-        synonyms = []
-        for syn in wordnet.synsets(word):
-            for lemma in syn.lemmas():
-                if lemma.name() != word:
-                    synonyms.append(lemma.name())
-        return list(set(synonyms))
-    
-    def augment_text(self, text):
-        if not self.enabled:
-            return text
-        
-        words = text.split()
-        num_to_replace = max(1, len(words) // 10)  # Replace 10% of words
-        indices = random.sample(range(len(words)), min(num_to_replace, len(words)))
-        
-        for idx in indices:
-            word = words[idx]
-            synonyms = self.get_synonyms(word)
-            if synonyms:
-                words[idx] = random.choice(synonyms)
-        
-        return ' '.join(words)
+from token_cache import fit_label_encoders, encode_labels, build_token_cache, PretokenizedDataset, DynamicPaddingCollator
+from bucketing import BucketingTrainer
+from profiling import StepProfilerCallback
+from augmentation import (
+    build_augmentations,
+    build_variant_cache,
+)
 
 # Combined prediction targets
 ALL_TARGETS = [
@@ -121,7 +77,8 @@ class HighAccuracyClassifier(BertPreTrainedModel):
             for num_labels in num_labels_per_task
         ])
 
-    def forward(self, input_ids, attention_mask=None, labels=None):
+    def pool(self, input_ids, attention_mask=None):
+        """Pooled encoder output; this is what the feature cache stores"""
         # Get transformer outputs
         outputs = self.transformer(
             input_ids=input_ids,
@@ -131,15 +88,20 @@ class HighAccuracyClassifier(BertPreTrainedModel):
         
         # Use pooler output if available, else use last hidden state mean
         if hasattr(outputs, 'pooler_output'):
-            pooled_output = outputs.pooler_output
-        else:
-            pooled_output = torch.mean(outputs.last_hidden_state, dim=1)
-        
+            return outputs.pooler_output
+        return torch.mean(outputs.last_hidden_state, dim=1)
+
+    def head_logits(self, pooled_output):
+        """Intermediate block plus every task head, applied to pooled output"""
         # Process through intermediate layer
         intermediate_output = self.intermediate(pooled_output)
         
         # Get predictions from each classifier
-        logits = [classifier(intermediate_output) for classifier in self.classifiers]
+        return [classifier(intermediate_output) for classifier in self.classifiers]
+
+    def forward(self, input_ids, attention_mask=None, labels=None):
+        pooled_output = self.pool(input_ids, attention_mask)
+        logits = self.head_logits(pooled_output)
         
         # Handle loss calculation if labels provided
         loss = None
@@ -156,63 +118,15 @@ class HighAccuracyClassifier(BertPreTrainedModel):
 
         return {'loss': loss, 'logits': logits} if loss is not None else {'logits': logits}
 
-# Add memory management environment variable
-os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'expandable_segments:True'
-
-# Add the TextTranslator class definition before EnhancedDataset
-class TextTranslator:
-    def __init__(self):
-        try:
-            # Initialize MarianMT models
-            self.en_es_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-en-es')
-            self.en_es_tokenizer = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-en-es')
-            self.es_en_model = MarianMTModel.from_pretrained('Helsinki-NLP/opus-mt-es-en')
-            self.es_en_tokenizer = MarianTokenizer.from_pretrained('Helsinki-NLP/opus-mt-es-en')
-            
-            # Move models to GPU if available
-            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-            self.en_es_model = self.en_es_model.to(device)
-            self.es_en_model = self.es_en_model.to(device)
-            self.device = device
-            self.available = True
-        except Exception as e:
-            print(f"Translation models initialization failed: {e}")
-            self.available = False
-    
-    def translate(self, text, source_lang="en", target_lang="es"):
-        if not self.available or not text:
-            return text
-            
-        try:
-            # Select appropriate model and tokenizer
-            if source_lang == "en" and target_lang == "es":
-                model = self.en_es_model
-                tokenizer = self.en_es_tokenizer
-            elif source_lang == "es" and target_lang == "en":
-                model = self.es_en_model
-                tokenizer = self.es_en_tokenizer
-            else:
-                return text
-            
-            # Tokenize and translate
-            inputs = tokenizer(text, return_tensors="pt", max_length=512, truncation=True).to(self.device)
-            translated = model.generate(**inputs)
-            result = tokenizer.batch_decode(translated, skip_special_tokens=True)[0]
-            
-            return result
-        except Exception as e:
-            print(f"Translation error: {e}")
-            return text
-
 class EnhancedDataset(Dataset):
-    def __init__(self, dataframe, tokenizer, max_len, augment=False):
+    def __init__(self, dataframe, tokenizer, max_len, augment=False, augmentation_store=None):
         # Create a copy of the dataframe to avoid warnings
         self.data = dataframe.copy()
         self.tokenizer = tokenizer
         self.max_len = max_len
-        self.augment = augment and AUGMENTATION_AVAILABLE
-        self.augmenter = SimpleAugmenter() if augment else None
-        self.translator = TextTranslator() if augment else None
+        # Augmentation only samples precomputed variants (see augmentation.py)
+        self.augment = augment and augmentation_store is not None
+        self.augmentation_store = augmentation_store
         
         # Create label encoders for all target columns
         self.label_encoders = {}
@@ -223,38 +137,12 @@ class EnhancedDataset(Dataset):
             le = LabelEncoder()
             self.data.loc[:, f'{target}_encoded'] = le.fit_transform(self.data[target])
             self.label_encoders[target] = le
-        
-        # Add semantic sentence embeddings for better augmentation
-        if augment:
-            self.st_model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
 
     def augment_text(self, text):
         if not self.augment:
             return text
-            
-        augmented_texts = []
-        
-        # 1. Synonym replacement
-        if hasattr(self, 'augmenter'):
-            augmented_texts.append(self.augmenter.augment_text(text))
-            
-        # 2. Back translation using MarianMT
-        if hasattr(self, 'translator') and self.translator.available:
-            try:
-                spanish = self.translator.translate(text, "en", "es")
-                back_translated = self.translator.translate(spanish, "es", "en")
-                if back_translated and back_translated != text:
-                    augmented_texts.append(back_translated)
-            except Exception as e:
-                print(f"Translation augmentation error: {e}")
-                
-        # 3. Semantic similarity-based augmentation
-        if hasattr(self, 'st_model'):
-            embeddings = self.st_model.encode([text])[0]
-            # Use embeddings to find similar sentences in training data
-            # ...
-
-        return random.choice(augmented_texts) if augmented_texts else text
+        variants = self.augmentation_store.get(text)
+        return random.choice(variants) if variants else text
 
     def __len__(self):
         return len(self.data)
@@ -315,6 +203,9 @@ def cleanup_cuda_memory():
         torch.cuda.synchronize()
 
 def train_unified_model():
+    # Memory management setting; must be set before the first CUDA allocation
+    os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
+
     # Check disk space first
     if not check_disk_space():
         raise RuntimeError("Not enough disk space on E drive (need at least 10GB)")
@@ -327,17 +218,40 @@ def train_unified_model():
     text_columns = ['complaint', 'title', 'description']
     df['input_text'] = df.apply(lambda row: ' '.join([str(row[col]) for col in text_columns if col in df.columns]), axis=1)
     
-    # Split data
-    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    # Fit label encoders once on the full data so every fold shares them
+    label_encoders = fit_label_encoders(df, ALL_TARGETS)
     
-    # Initialize tokenizer and datasets
+    # Tokenize the whole corpus once; every split and fold reads slices of it
     tokenizer = AutoTokenizer.from_pretrained('xlm-roberta-large')
-    train_dataset = EnhancedDataset(train_df, tokenizer, max_len=256, augment=True)
-    test_dataset = EnhancedDataset(test_df, tokenizer, max_len=256, augment=False)
+    token_cache = build_token_cache(
+        df['input_text'].tolist(), tokenizer, max_len=256,
+        labels=encode_labels(df, label_encoders),
+        cache_dir='E:/ML/Grivances/cache/tokenized'
+    )
+    collator = DynamicPaddingCollator(tokenizer.pad_token_id, pad_to_multiple_of=8)
+    
+    # Back-translate and synonym-augment the corpus once, then tokenize the variants
+    augmentation_store = build_augmentations(
+        df['input_text'].tolist(), store_path='E:/ML/Grivances/cache/augmentations.json'
+    )
+    variant_cache, variant_offsets = build_variant_cache(
+        df['input_text'].tolist(), augmentation_store, tokenizer, max_len=256,
+        cache_dir='E:/ML/Grivances/cache/tokenized'
+    )
+    augment_kwargs = {
+        'variant_cache': variant_cache,
+        'variant_offsets': variant_offsets,
+        'augment_prob': 0.3,  # 30% chance of augmentation
+    }
+    
+    # Split data
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    train_dataset = PretokenizedDataset(token_cache, train_idx, **augment_kwargs)
+    test_dataset = PretokenizedDataset(token_cache, test_idx)
     
     # Get number of labels for each target
     num_labels_per_task = [
-        len(train_dataset.label_encoders[target].classes_)
+        len(label_encoders[target].classes_)
         for target in ALL_TARGETS
     ]
 
@@ -381,8 +295,8 @@ def train_unified_model():
         weight_decay=0.01,
         gradient_accumulation_steps=16,  # Increased from 8
         fp16=True,
-        dataloader_num_workers=0,
-        remove_unused_columns=True,
+        dataloader_num_workers=2,  # Memory-mapped datasets are cheap to share
+        remove_unused_columns=False,
         report_to="none",
         logging_steps=50,
         hub_token=None,
@@ -402,7 +316,7 @@ def train_unified_model():
             cleanup_cuda_memory()
     
     # Define MemoryEfficientTrainer class
-    class MemoryEfficientTrainer(Trainer):
+    class MemoryEfficientTrainer(BucketingTrainer):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
             
@@ -426,9 +340,11 @@ def train_unified_model():
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=test_dataset,
+        data_collator=collator,
         callbacks=[
             EarlyStoppingCallback(early_stopping_patience=3),
-            CleanupCallback()
+            CleanupCallback(),
+            StepProfilerCallback(os.path.join(model_dir, 'profile'))
         ]
     )
     
@@ -442,19 +358,20 @@ def train_unified_model():
         print(f"\nTraining fold {fold + 1}/{n_splits}")
         
         # Prepare train and validation datasets for the current fold
-        train_fold_df = df.iloc[train_idx]
-        val_fold_df = df.iloc[val_idx]
+        train_fold_dataset = PretokenizedDataset(token_cache, train_idx, **augment_kwargs)
+        val_fold_dataset = PretokenizedDataset(token_cache, val_idx)
         
-        train_fold_dataset = EnhancedDataset(train_fold_df, tokenizer, max_len=256, augment=True)
-        val_fold_dataset = EnhancedDataset(val_fold_df, tokenizer, max_len=256, augment=False)
-        
-        # Initialize Trainer
-        trainer = Trainer(
+        # Initialize Trainer with length-bucketed batches
+        trainer = BucketingTrainer(
             model=model,
             args=training_args,
             train_dataset=train_fold_dataset,
             eval_dataset=val_fold_dataset,
-            callbacks=[EarlyStoppingCallback(early_stopping_patience=3)]
+            data_collator=collator,
+            callbacks=[
+                EarlyStoppingCallback(early_stopping_patience=3),
+                StepProfilerCallback(os.path.join(model_dir, 'profile', f'fold_{fold + 1}'))
+            ]
         )
         
         # Train the model
@@ -464,7 +381,7 @@ def train_unified_model():
         trained_model = model
         models.append(trained_model)
     
-    return models, tokenizer, train_dataset.label_encoders
+    return models, tokenizer, label_encoders
 
 def cleanup_old_checkpoints(output_dir):
     """Clean up old checkpoints while keeping the best one"""
@@ -480,39 +397,92 @@ def cleanup_old_checkpoints(output_dir):
     except Exception as e:
         print(f"Error cleaning checkpoints: {e}")
 
-def predict_all(text, models, tokenizer, label_encoders):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    
-    # Prepare input
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=256)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    
-    # Ensemble prediction
-    all_predictions = []
+def build_label_lookup(label_encoders):
+    """Precompute index -> label arrays so decoding is a plain array lookup"""
+    return {
+        target: np.asarray(encoder.classes_, dtype=object)
+        for target, encoder in label_encoders.items()
+    }
+
+def iter_length_batches(texts, tokenizer, batch_size=32, max_length=256, return_tensors='pt'):
+    """Yield ``(row_indices, padded_batch)`` with texts grouped by token length.
+
+    Texts are tokenized once without padding, sorted by length, and each batch
+    is padded only to its own longest sequence.
+    """
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)['input_ids']
+    order = np.argsort([len(ids) for ids in encodings], kind='stable')
+    for start in range(0, len(texts), batch_size):
+        batch_idx = order[start:start + batch_size]
+        batch = tokenizer.pad(
+            {'input_ids': [encodings[i] for i in batch_idx]},
+            padding='longest',
+            return_tensors=return_tensors
+        )
+        yield batch_idx, batch
+
+def predict_proba_many(texts, models, tokenizer, batch_size=32, max_length=256, device=None):
+    """Ensemble class probabilities for a list of texts.
+
+    Every ensemble model runs once per length-grouped batch. Returns one
+    ``(len(texts), num_labels)`` array per task head, in input order.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    texts = [str(text) for text in texts]
+    if not texts:
+        return []
     
     for model in models:
-        # Get predictions from each model
         model.eval()
-        with torch.no_grad():
-            outputs = model(**inputs)
-            # Move logits to CPU before converting to numpy
-            predictions = [logits.cpu().argmax(dim=-1).numpy() for logits in outputs['logits']]
-            all_predictions.append(predictions)
     
-    # Convert predictions to numpy arrays
-    all_predictions = np.array(all_predictions)
-    final_predictions = np.mean(all_predictions, axis=0)
+    head_probs = None
+    with torch.no_grad():
+        for batch_idx, batch in iter_length_batches(texts, tokenizer, batch_size, max_length):
+            batch = {k: v.to(device) for k, v in batch.items()}
+            
+            # Ensemble prediction: average class probabilities over models
+            summed_probs = None
+            for model in models:
+                outputs = model(input_ids=batch['input_ids'], attention_mask=batch['attention_mask'])
+                probs = [F.softmax(logits.float(), dim=-1) for logits in outputs['logits']]
+                if summed_probs is None:
+                    summed_probs = probs
+                else:
+                    summed_probs = [acc + p for acc, p in zip(summed_probs, probs)]
+            
+            if head_probs is None:
+                head_probs = [np.zeros((len(texts), p.shape[-1]), dtype=np.float32) for p in summed_probs]
+            for i, probs in enumerate(summed_probs):
+                head_probs[i][batch_idx] = (probs / len(models)).cpu().numpy()
+    
+    return head_probs
+
+def predict_many(texts, models, tokenizer, label_encoders, batch_size=32, max_length=256, label_lookup=None, device=None):
+    """Predict every target for a list of texts, returned in input order"""
+    texts = [str(text) for text in texts]
+    if not texts:
+        return []
     
-    # Convert to labels
-    results = {}
     available_targets = list(label_encoders.keys())  # Use actual available targets
+    if label_lookup is None:
+        label_lookup = build_label_lookup(label_encoders)
     
-    for i, target in enumerate(available_targets):
-        pred_idx = int(np.argmax(final_predictions[i]))  # Convert to int
-        predicted_label = label_encoders[target].inverse_transform([pred_idx])[0]
-        results[target] = predicted_label
+    head_probs = predict_proba_many(texts, models, tokenizer, batch_size=batch_size, max_length=max_length, device=device)
     
-    return results
+    # Convert to labels with one vectorized lookup per target
+    decoded = {
+        target: label_lookup[target][head_probs[i].argmax(axis=1)]
+        for i, target in enumerate(available_targets)
+    }
+    
+    return [
+        {target: decoded[target][row] for target in available_targets}
+        for row in range(len(texts))
+    ]
+
+def predict_all(text, models, tokenizer, label_encoders):
+    return predict_many([text], models, tokenizer, label_encoders, batch_size=1)[0]
 
 def load_model_artifacts(base_path='E:/ML/Grivances/saved_model'):
     """Load the trained model and associated artifacts"""
@@ -538,6 +508,14 @@ def load_model_artifacts(base_path='E:/ML/Grivances/saved_model'):
             print(f"{target}: {n_labels} labels")
             num_labels_per_task.append(n_labels)
         
+        # Distilled students are a drop-in replacement for the ensemble
+        from distillation import is_student_artifact, load_student
+        if is_student_artifact(base_path):
+            print(f"\nLoading distilled student from: {base_path}")
+            model, tokenizer = load_student(base_path)
+            print("Successfully loaded all artifacts")
+            return [model], tokenizer, label_encoders
+        
         # Load model
         print(f"\nLoading model from: {base_path}")
         model = HighAccuracyClassifier.from_pretrained(
@@ -0,0 +1,189 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+class CompiledForest:
+    """A fitted sklearn RandomForest flattened into contiguous NumPy arrays.
+
+    All trees share one set of ``feature``/``threshold``/``left``/``right``/
+    ``value`` arrays; leaves point to themselves, so a batch is traversed for
+    every tree at once with one gather per depth level. Inputs are cast to
+    float32 and tree outputs are summed in estimator order, the same
+    arithmetic sklearn uses, so ``predict_proba``/``predict`` are
+    bit-identical to the forest with ``n_jobs=1`` (threaded sklearn
+    prediction sums trees in completion order and can differ in the last bit).
+    """
+
+    def __init__(self, forest):
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+        self.is_classifier = isinstance(forest, RandomForestClassifier)
+        if not self.is_classifier and not isinstance(forest, RandomForestRegressor):
+            raise ValueError(f"Unsupported model type: {type(forest).__name__}")
+        self.classes_ = getattr(forest, 'classes_', None)
+        self.n_features_in_ = forest.n_features_in_
+
+        features, thresholds, lefts, rights, values, missing_left, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(n_nodes) + offset
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, own, tree.children_left + offset))
+            rights.append(np.where(is_leaf, own, tree.children_right + offset))
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_left.append(tree.missing_go_to_left.astype(bool))
+            else:
+                missing_left.append(np.zeros(n_nodes, dtype=bool))
+
+            if self.is_classifier:
+                # Same normalisation as DecisionTreeClassifier.predict_proba, done per leaf
+                proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                values.append(proba / normalizer)
+            else:
+                values.append(tree.value[:, 0, 0].astype(np.float64))
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp)
+        self.right = np.ascontiguousarray(np.concatenate(rights), dtype=np.intp)
+        self.missing_go_to_left = np.concatenate(missing_left)
+        self.value = np.ascontiguousarray(np.concatenate(values))
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+        # Sparse inputs only densify the columns some split actually uses
+        self.used_features = np.unique(self.feature[self.left != np.arange(offset)])
+        remap = np.zeros(self.n_features_in_, dtype=np.intp)
+        remap[self.used_features] = np.arange(len(self.used_features))
+        self.compact_feature = remap[self.feature]
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _dense_block(self, X):
+        """float32 values for the used features only, plus the matching feature indices"""
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, the forest expects {self.n_features_in_}")
+        if sp.issparse(X):
+            block = X.tocsc()[:, self.used_features].astype(np.float32).toarray()
+        else:
+            block = np.asarray(X, dtype=np.float32)[:, self.used_features]
+        return block, self.compact_feature
+
+    def apply(self, X, chunk_size=4096):
+        """Global leaf index per (row, tree)"""
+        n_rows = X.shape[0]
+        leaves = np.empty((n_rows, self.n_trees), dtype=np.intp)
+        for start in range(0, n_rows, chunk_size):
+            block, feature = self._dense_block(X[start:start + chunk_size])
+            rows = np.arange(block.shape[0])[:, np.newaxis]
+            nodes = np.broadcast_to(self.roots, (block.shape[0], self.n_trees)).copy()
+            for _ in range(self.max_depth):
+                x = block[rows, feature[nodes]]
+                # NaN compares False, so it goes right unless the split sends missing values left
+                go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_go_to_left[nodes])
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            leaves[start:start + chunk_size] = nodes
+        return leaves
+
+    def _accumulate(self, X):
+        leaves = self.apply(X)
+        out = np.zeros((leaves.shape[0],) + self.value.shape[1:], dtype=np.float64)
+        for t in range(self.n_trees):
+            out += self.value[leaves[:, t]]
+        out /= self.n_trees
+        return out
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._accumulate(X)
+
+    def predict(self, X):
+        if self.is_classifier:
+            return self.classes_.take(np.argmax(self._accumulate(X), axis=1), axis=0)
+        return self._accumulate(X)
+
+def compile_forest(forest):
+    return CompiledForest(forest)
+
+def _reference(forest, X):
+    # Sequential tree order, as documented on CompiledForest
+    n_jobs = forest.n_jobs
+    forest.n_jobs = 1
+    try:
+        return forest.predict_proba(X) if hasattr(forest, 'predict_proba') else forest.predict(X)
+    finally:
+        forest.n_jobs = n_jobs
+
+def check_identical(forest, compiled, X):
+    """Raise RuntimeError unless compiled outputs equal sklearn's bit for bit"""
+    expected = _reference(forest, X)
+    actual = compiled.predict_proba(X) if compiled.is_classifier else compiled.predict(X)
+    if not np.array_equal(expected, actual):
+        diff = np.abs(expected - actual).max()
+        raise RuntimeError(f"Compiled forest differs from sklearn (max abs diff {diff:.3g})")
+    return True
+
+def benchmark_forest(forest, X, name='forest', n_single=200):
+    """Single-row and batch latency of sklearn vs the compiled forest"""
+    compiled = compile_forest(forest)
+    check_identical(forest, compiled, X)
+    sk_call = forest.predict_proba if hasattr(forest, 'predict_proba') else forest.predict
+    fast_call = compiled.predict_proba if compiled.is_classifier else compiled.predict
+
+    rows = []
+    for engine, call in [('sklearn', sk_call), ('compiled', fast_call)]:
+        single = []
+        for i in range(min(n_single, X.shape[0])):
+            start_time = time.perf_counter()
+            call(X[i:i + 1])
+            single.append(time.perf_counter() - start_time)
+        start_time = time.perf_counter()
+        call(X)
+        batch_seconds = time.perf_counter() - start_time
+        rows.append({
+            'model': name,
+            'engine': engine,
+            'single_p50_ms': np.median(single) * 1000,
+            'single_p99_ms': np.percentile(single, 99) * 1000,
+            'batch_rows_per_sec': X.shape[0] / max(batch_seconds, 1e-9),
+        })
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    from sentiment_analysis import GrievancePredictor, BUNDLE_PATH
+
+    parser = argparse.ArgumentParser(description="Check and benchmark compiled forests against sklearn")
+    parser.add_argument('--bundle', default=BUNDLE_PATH)
+    parser.add_argument('--data', default='E:\\ML\\Data\\combined_data.csv')
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    predictor = GrievancePredictor.load(args.bundle)
+    texts = pd.read_csv(args.data)['complaint'].fillna('').astype(str).head(args.rows)
+    X = predictor.tfidf.transform(texts)
+
+    results = pd.concat([
+        benchmark_forest(predictor.emotion_classifier, X, 'emotion'),
+        benchmark_forest(predictor.resolution_regressor, X, 'resolution'),
+        benchmark_forest(predictor.urgency_classifier, X, 'urgency'),
+    ], ignore_index=True)
+    print("All compiled outputs are bit-identical to sklearn")
+    print(results.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
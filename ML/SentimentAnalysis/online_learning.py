@@ -0,0 +1,160 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sentiment_analysis import GrievancePredictor
+
+CHECKPOINT_PATH = 'online_predictor.joblib'
+
+def _preprocess(df):
+    """Same cleaning and Hindi/English label mapping as GrievancePredictor"""
+    return GrievancePredictor().preprocess_data(df)
+
+class IncrementalGrievancePredictor:
+    """Online counterpart of GrievancePredictor.
+
+    A stateless HashingVectorizer replaces TF-IDF, so new rows never force a
+    refit, and every model supports ``partial_fit``: logistic SGD for emotion
+    and urgency, SGD regression for resolution time. Label sets are fixed on
+    the first update; rows with labels outside them are skipped.
+    """
+
+    def __init__(self, n_features=2**18, emotion_classes=None, urgency_classes=None):
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+        self.emotion_classifier = SGDClassifier(loss='log_loss', random_state=42)
+        self.urgency_classifier = SGDClassifier(loss='log_loss', random_state=42)
+        self.resolution_regressor = SGDRegressor(random_state=42)
+        self.emotion_classes = np.asarray(sorted(emotion_classes)) if emotion_classes is not None else None
+        self.urgency_classes = np.asarray(sorted(urgency_classes)) if urgency_classes is not None else None
+        self.rows_seen = 0
+
+    def partial_fit(self, df):
+        """Update every model with a chunk of labelled rows (GrievancePredictor columns)"""
+        df = _preprocess(df.copy())
+        if self.emotion_classes is None:
+            self.emotion_classes = np.asarray(sorted(df['emotion'].unique()))
+        if self.urgency_classes is None:
+            self.urgency_classes = np.asarray(sorted(df['urgencyLevel'].unique()))
+
+        known = df['emotion'].isin(self.emotion_classes) & df['urgencyLevel'].isin(self.urgency_classes)
+        if not known.all():
+            print(f"Skipping {(~known).sum()} rows with labels outside the initial label set")
+            df = df[known]
+        if df.empty:
+            return self
+
+        X = self.vectorizer.transform(df['complaint'])
+        self.emotion_classifier.partial_fit(X, df['emotion'].values, classes=self.emotion_classes)
+        self.urgency_classifier.partial_fit(X, df['urgencyLevel'].values, classes=self.urgency_classes)
+
+        resolution = pd.to_numeric(df['ResolutionTime'], errors='coerce')
+        observed = resolution.notna().values
+        if observed.any():
+            self.resolution_regressor.partial_fit(X[observed], resolution.values[observed])
+        self.rows_seen += len(df)
+        return self
+
+    def predict_batch(self, texts):
+        X = self.vectorizer.transform([str(text) for text in texts])
+        emotions = self.emotion_classifier.predict(X)
+        urgencies = self.urgency_classifier.predict(X)
+        resolution_times = np.clip(self.resolution_regressor.predict(X), 0, None).astype(int)
+        return [
+            {'emotion': emotion, 'resolution_time_days': int(days), 'urgency_level': urgency}
+            for emotion, days, urgency in zip(emotions, resolution_times, urgencies)
+        ]
+
+    def save(self, path=CHECKPOINT_PATH):
+        """Atomic checkpoint of the full model state"""
+        tmp_path = path + '.tmp'
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_PATH):
+        return joblib.load(path)
+
+class MiniBatchUpdater:
+    """Buffers labelled rows as they arrive and applies ``partial_fit`` per mini-batch.
+
+    A checkpoint is written every ``checkpoint_every`` updates and on ``close``.
+    """
+
+    def __init__(self, model, batch_size=1000, checkpoint_path=CHECKPOINT_PATH, checkpoint_every=10):
+        self.model = model
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.buffer = []
+        self.buffered_rows = 0
+        self.updates = 0
+
+    def add(self, rows):
+        """Queue a DataFrame (or list of dicts) of labelled rows"""
+        rows = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        self.buffer.append(rows)
+        self.buffered_rows += len(rows)
+        while self.buffered_rows >= self.batch_size:
+            pending = pd.concat(self.buffer, ignore_index=True)
+            self._update(pending.iloc[:self.batch_size])
+            rest = pending.iloc[self.batch_size:]
+            self.buffer = [rest] if len(rest) else []
+            self.buffered_rows = len(rest)
+
+    def _update(self, batch):
+        self.model.partial_fit(batch)
+        self.updates += 1
+        if self.checkpoint_path and self.updates % self.checkpoint_every == 0:
+            self.model.save(self.checkpoint_path)
+
+    def flush(self):
+        if self.buffered_rows:
+            self._update(pd.concat(self.buffer, ignore_index=True))
+            self.buffer = []
+            self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        if self.checkpoint_path:
+            self.model.save(self.checkpoint_path)
+            print(f"Checkpoint saved to {self.checkpoint_path} ({self.model.rows_seen} rows seen)")
+
+def replay_csv(model, csv_path, chunksize=10000, batch_size=1000, checkpoint_path=CHECKPOINT_PATH, checkpoint_every=10):
+    """Stream a CSV through the updater in chunks; memory stays bounded by ``chunksize``"""
+    if model.emotion_classes is None or model.urgency_classes is None:
+        # Fix the label sets up front from the label columns only
+        labels = _preprocess(pd.read_csv(csv_path, usecols=['complaint', 'emotion', 'ResolutionTime', 'urgencyLevel']))
+        if model.emotion_classes is None:
+            model.emotion_classes = np.asarray(sorted(labels['emotion'].unique()))
+        if model.urgency_classes is None:
+            model.urgency_classes = np.asarray(sorted(labels['urgencyLevel'].unique()))
+
+    updater = MiniBatchUpdater(model, batch_size, checkpoint_path, checkpoint_every)
+    start_time = time.perf_counter()
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        updater.add(chunk)
+        rows += len(chunk)
+    updater.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"Replayed {rows} rows from {csv_path} in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/sec)")
+    return model
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental updates for the grievance models")
+    parser.add_argument('csv', help='CSV of labelled rows to learn from (full history or only new rows)')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if os.path.exists(args.checkpoint):
+        print(f"Resuming from {args.checkpoint}")
+        model = IncrementalGrievancePredictor.load(args.checkpoint)
+    else:
+        model = IncrementalGrievancePredictor()
+    replay_csv(model, args.csv, args.chunksize, args.batch_size, args.checkpoint)
@@ -28,15 +28,21 @@ from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import classification_report, mean_squared_error
 import joblib
+from joblib import Parallel, delayed
+from compiled_forest import compile_forest
+
+# All fitted models and encoders are saved together in one file
+BUNDLE_PATH = 'grievance_predictor.joblib'
 
 class GrievancePredictor:
     def __init__(self):
         self.tfidf = TfidfVectorizer(max_features=1500)
-        self.emotion_classifier = RandomForestClassifier(n_estimators=200)
-        self.resolution_regressor = RandomForestRegressor(n_estimators=200)
-        self.urgency_classifier = RandomForestClassifier(n_estimators=200)
+        self.emotion_classifier = RandomForestClassifier(n_estimators=200, n_jobs=-1)
+        self.resolution_regressor = RandomForestRegressor(n_estimators=200, n_jobs=-1)
+        self.urgency_classifier = RandomForestClassifier(n_estimators=200, n_jobs=-1)
         self.emotion_encoder = LabelEncoder()
         self.urgency_encoder = LabelEncoder()
+        self.compiled = None
         
     def preprocess_data(self, df):
         # Clean text data
@@ -67,7 +73,7 @@ class GrievancePredictor:
         
         return df
     
-    def train(self, data_path):
+    def train(self, data_path, bundle_path=BUNDLE_PATH):
         print("Loading and preprocessing data...")
         df = pd.read_csv(data_path)
         df = self.preprocess_data(df)
@@ -81,61 +87,95 @@ class GrievancePredictor:
         y_resolution = df['ResolutionTime'].values
         y_urgency = self.urgency_encoder.fit_transform(df['urgencyLevel'])
         
-        # Split data
-        X_train, X_test, y_emotion_train, y_emotion_test = train_test_split(X, y_emotion, test_size=0.2)
-        _, _, y_resolution_train, y_resolution_test = train_test_split(X, y_resolution, test_size=0.2)
-        _, _, y_urgency_train, y_urgency_test = train_test_split(X, y_urgency, test_size=0.2)
+        # One shared split for every target
+        train_idx, test_idx = train_test_split(np.arange(X.shape[0]), test_size=0.2, random_state=42)
+        X_train, X_test = X[train_idx], X[test_idx]
         
-        # Train models
-        print("\nTraining models...")
+        # Fit the three models concurrently; tree building releases the GIL
+        print("\nTraining emotion, resolution time and urgency models in parallel...")
+        models = [
+            (self.emotion_classifier, y_emotion),
+            (self.resolution_regressor, y_resolution),
+            (self.urgency_classifier, y_urgency),
+        ]
+        Parallel(n_jobs=len(models), prefer='threads')(
+            delayed(model.fit)(X_train, y[train_idx]) for model, y in models
+        )
         
-        print("Training emotion classifier...")
-        self.emotion_classifier.fit(X_train, y_emotion_train)
         emotion_pred = self.emotion_classifier.predict(X_test)
         print("\nEmotion Classification Report:")
-        print(classification_report(y_emotion_test, emotion_pred))
+        print(classification_report(y_emotion[test_idx], emotion_pred))
         
-        print("\nTraining resolution time predictor...")
-        self.resolution_regressor.fit(X_train, y_resolution_train)
         resolution_pred = self.resolution_regressor.predict(X_test)
-        mse = mean_squared_error(y_resolution_test, resolution_pred)
+        mse = mean_squared_error(y_resolution[test_idx], resolution_pred)
         print(f"Resolution Time MSE: {mse:.2f}")
         
-        print("\nTraining urgency classifier...")
-        self.urgency_classifier.fit(X_train, y_urgency_train)
         urgency_pred = self.urgency_classifier.predict(X_test)
         print("\nUrgency Classification Report:")
-        print(classification_report(y_urgency_test, urgency_pred))
+        print(classification_report(y_urgency[test_idx], urgency_pred))
         
         # Save models
         print("\nSaving models...")
-        joblib.dump(self.emotion_classifier, 'emotion_model.pkl')
-        joblib.dump(self.resolution_regressor, 'resolution_model.pkl')
-        joblib.dump(self.urgency_classifier, 'urgency_model.pkl')
-        joblib.dump(self.tfidf, 'tfidf.pkl')
-        joblib.dump(self.emotion_encoder, 'emotion_encoder.pkl')
-        joblib.dump(self.urgency_encoder, 'urgency_encoder.pkl')
+        self.save(bundle_path)
+        self.compile_models()
         
         return {
             'emotion_classes': self.emotion_encoder.classes_.tolist(),
             'urgency_levels': self.urgency_encoder.classes_.tolist()
         }
     
-    def predict(self, text):
-        try:
-            # Transform text
-            X = self.tfidf.transform([text])
-            
-            # Make predictions
-            emotion = self.emotion_encoder.inverse_transform([self.emotion_classifier.predict(X)[0]])[0]
-            resolution_time = int(self.resolution_regressor.predict(X)[0])
-            urgency = self.urgency_encoder.inverse_transform([self.urgency_classifier.predict(X)[0]])[0]
-            
-            return {
+    def save(self, bundle_path=BUNDLE_PATH):
+        """Save vectorizer, models and encoders as a single bundle"""
+        joblib.dump({
+            'tfidf': self.tfidf,
+            'emotion_classifier': self.emotion_classifier,
+            'resolution_regressor': self.resolution_regressor,
+            'urgency_classifier': self.urgency_classifier,
+            'emotion_encoder': self.emotion_encoder,
+            'urgency_encoder': self.urgency_encoder,
+        }, bundle_path)
+        print(f"Models saved to {bundle_path}")
+    
+    @classmethod
+    def load(cls, bundle_path=BUNDLE_PATH):
+        """Load a bundle written by ``save``"""
+        predictor = cls()
+        for name, value in joblib.load(bundle_path).items():
+            setattr(predictor, name, value)
+        predictor.compile_models()
+        return predictor
+    
+    def compile_models(self):
+        """Flatten the fitted forests into array-backed ``CompiledForest`` engines"""
+        self.compiled = {
+            'emotion_classifier': compile_forest(self.emotion_classifier),
+            'resolution_regressor': compile_forest(self.resolution_regressor),
+            'urgency_classifier': compile_forest(self.urgency_classifier),
+        }
+        return self.compiled
+    
+    def _model(self, name):
+        return self.compiled[name] if self.compiled else getattr(self, name)
+    
+    def predict_batch(self, texts):
+        """Predict every text with one transform and vectorized label decoding"""
+        X = self.tfidf.transform([str(text) for text in texts])
+        emotions = self.emotion_encoder.inverse_transform(self._model('emotion_classifier').predict(X))
+        resolution_times = self._model('resolution_regressor').predict(X).astype(int)
+        urgencies = self.urgency_encoder.inverse_transform(self._model('urgency_classifier').predict(X))
+        
+        return [
+            {
                 'emotion': emotion,
-                'resolution_time_days': resolution_time,
+                'resolution_time_days': int(resolution_time),
                 'urgency_level': urgency
             }
+            for emotion, resolution_time, urgency in zip(emotions, resolution_times, urgencies)
+        ]
+    
+    def predict(self, text):
+        try:
+            return self.predict_batch([text])[0]
         except Exception as e:
             print(f"Error in prediction: {str(e)}")
             return {
@@ -153,15 +193,9 @@ def predict_grievances(data_path, output_path=None):
     
     # Make predictions on the dataset
     df = pd.read_csv(data_path)
-    results = []
     
     print("\nMaking predictions...")
-    for text in df['complaint']:
-        result = predictor.predict(text)
-        results.append(result)
-    
-    # Create results DataFrame
-    results_df = pd.DataFrame(results)
+    results_df = pd.DataFrame(predictor.predict_batch(df['complaint'].fillna('').astype(str)))
     
     if output_path:
         results_df.to_csv(output_path, index=False)